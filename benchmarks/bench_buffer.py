@@ -0,0 +1,84 @@
+"""
+Benchmark MessageBuffer throughput in messages/sec
+
+Compares the offset scanning MessageBuffer with the original implementation
+that deleted each message from the front of the buffer as it was found
+
+Usage:
+    python -m benchmarks.bench_buffer [-n MESSAGES_PER_CHUNK] [-c CHUNKS]
+"""
+
+import argparse
+from timeit import timeit
+from typing import Callable, List
+
+from nicett6.buffer import MessageBuffer
+from nicett6.consts import RCV_EOL
+
+
+class LegacyMessageBuffer:
+    """The original implementation - one buffer shift per message"""
+
+    def __init__(self, eol: bytes) -> None:
+        self.buf: bytearray = bytearray()
+        self.eol: bytes = eol
+
+    def append_chunk(self, chunk: bytes) -> List[bytes]:
+        self.buf += chunk
+        messages: List[bytes] = []
+        while True:
+            iX = self.buf.find(self.eol)
+            if iX == -1:
+                break
+            messages.append(bytes(self.buf[: iX + len(self.eol)]))
+            del self.buf[: iX + len(self.eol)]
+        return messages
+
+
+def make_chunk(num_messages: int) -> bytes:
+    """A burst of POS messages from several moving covers with a partial tail"""
+    lines = [
+        f"POS * {2 + i % 12:02X} 04 {i % 1001:04d} FFFF FF".encode("utf-8") + RCV_EOL
+        for i in range(num_messages)
+    ]
+    return b"".join(lines) + b"POS * 02"
+
+
+def run(name: str, consume: Callable[[bytes], int], chunk: bytes, chunks: int) -> None:
+    count = 0
+
+    def body() -> None:
+        nonlocal count
+        count += consume(chunk)
+
+    secs = timeit(body, number=chunks)
+    print(f"{name:<32} {count / secs:>14,.0f} messages/sec")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--messages", type=int, default=200)
+    parser.add_argument("-c", "--chunks", type=int, default=2000)
+    args = parser.parse_args()
+    chunk = make_chunk(args.messages)
+    print(f"{args.messages} messages per chunk, {args.chunks} chunks")
+
+    legacy = LegacyMessageBuffer(RCV_EOL)
+    run(
+        "legacy append_chunk", lambda c: len(legacy.append_chunk(c)), chunk, args.chunks
+    )
+
+    buffer = MessageBuffer(RCV_EOL)
+    run("append_chunk", lambda c: len(buffer.append_chunk(c)), chunk, args.chunks)
+
+    streaming = MessageBuffer(RCV_EOL)
+    run(
+        "iter_messages (memoryview)",
+        lambda c: sum(1 for _ in streaming.iter_messages(c)),
+        chunk,
+        args.chunks,
+    )
+
+
+if __name__ == "__main__":
+    main()
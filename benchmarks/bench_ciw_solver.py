@@ -0,0 +1,68 @@
+"""
+Benchmark aspect ratio solves/sec
+
+Compares CIWSolver, which evaluates the geometry of every pair of hex
+positions once with numpy, with a brute force Python loop over
+calculate_image_height for every pair of hex positions per solve
+
+Requires numpy
+
+Usage:
+    python -m benchmarks.bench_ciw_solver [-n SOLVES]
+"""
+
+import argparse
+from time import perf_counter
+from typing import Callable, List, Optional, Tuple
+
+from nicett6.ciw_helper import calculate_image_height
+from nicett6.ciw_solver import CIWSolver
+from nicett6.image_def import ImageDef
+
+SCREEN_MAX_DROP = 2.0
+MASK_MAX_DROP = 0.8
+IMAGE_DEF = ImageDef(0.05, 1.8, 16 / 9)
+TARGETS = [2.35, 2.0, 1.85, 16 / 9, 2.4, 2.2]
+
+
+def brute_force_solve(target_aspect_ratio: float) -> Optional[Tuple[int, int]]:
+    best: Optional[Tuple[int, int]] = None
+    best_error = float("inf")
+    for screen_hex_pos in range(256):
+        screen_drop = (1000 - round(screen_hex_pos / 0.255)) * SCREEN_MAX_DROP / 1000
+        for mask_hex_pos in range(256):
+            mask_drop = (1000 - round(mask_hex_pos / 0.255)) * MASK_MAX_DROP / 1000
+            image_height = calculate_image_height(screen_drop, mask_drop, IMAGE_DEF)
+            if image_height is None:
+                continue
+            error = abs(IMAGE_DEF.width / image_height - target_aspect_ratio)
+            if error < best_error:
+                best_error = error
+                best = screen_hex_pos, mask_hex_pos
+    return best
+
+
+def bench(name: str, solve: Callable[[float], object], solves: int) -> float:
+    targets: List[float] = [TARGETS[i % len(TARGETS)] for i in range(solves)]
+    start = perf_counter()
+    for target in targets:
+        solve(target)
+    rate = solves / (perf_counter() - start)
+    print(f"{name:<24} {rate:>12,.1f} solves/sec")
+    return rate
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--solves", type=int, default=100)
+    args = parser.parse_args()
+    start = perf_counter()
+    solver = CIWSolver(SCREEN_MAX_DROP, MASK_MAX_DROP, IMAGE_DEF)
+    print(f"CIWSolver set up in {(perf_counter() - start) * 1000:.1f} ms")
+    before = bench("brute force", brute_force_solve, max(1, args.solves // 20))
+    after = bench("CIWSolver.solve", solver.solve, args.solves)
+    print(f"speed up: {after / before:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
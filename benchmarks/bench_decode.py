@@ -0,0 +1,199 @@
+"""
+Benchmark Decode.decode_line_bytes throughput in lines/sec
+
+The trace is synthetic, generated to resemble the traffic seen when WEB_ON is
+enabled and several covers are moving: mostly POS * messages with the odd
+command acknowledgement, web acknowledgement and informational message
+
+Compares the table driven decoder with the original decoder, which
+tokenised every line and validated each field with a freshly compiled
+regular expression, and with decode_line_bytes_reference, the fallback used
+for lines that are not handled by the fast path
+
+The headline figure is a single pass over the trace starting with empty
+tables, so each distinct line is decoded once by the fast path.   The
+repeated lines figure replays the trace with every line already remembered,
+which flatters the fast path and is shown for comparison only
+
+Usage:
+    python -m benchmarks.bench_decode [-r REPEAT]
+"""
+
+import argparse
+import re
+from time import perf_counter
+from typing import Callable, List, Tuple
+
+from nicett6.command_code import CommandCode
+from nicett6.decode import (
+    AckResponse,
+    Decode,
+    ErrorResponse,
+    HexPosResponse,
+    InformationalResponse,
+    InvalidResponseError,
+    PctAckResponse,
+    PctPosResponse,
+    ResponseMessageType,
+)
+
+
+class LegacyTTBusDeviceAddress:
+    """The original address class - not interned and hashed on every lookup"""
+
+    def __init__(self, address: int, node: int):
+        self.address = address
+        self.node = node
+
+    @property
+    def as_tuple(self) -> Tuple[int, int]:
+        return self.address, self.node
+
+    def __eq__(self, other: object):
+        if not isinstance(other, LegacyTTBusDeviceAddress):
+            return False
+        return self.as_tuple == other.as_tuple
+
+    def __hash__(self) -> int:
+        return hash(self.as_tuple)
+
+
+def legacy_hex_arg_to_int(arg: str, fixed_len: bool = True) -> int:
+    if fixed_len:
+        pat = re.compile("[a-fA-F0-9]{2,2}$")
+    else:
+        pat = re.compile("[a-fA-F0-9]{1,2}$")
+    m = pat.match(arg)
+    if m is None:
+        raise ValueError(f"Invalid hex string: {arg!r}")
+    return int(m.group(0), 16)
+
+
+def legacy_pct_arg_to_int(arg: str) -> int:
+    pat = re.compile("[0-9]{4,4}$")
+    m = pat.match(arg)
+    if m is None:
+        raise ValueError(f"Invalid percent string: {arg!r}")
+    pct = int(m.group(0))
+    if pct < 0 or pct > 1000:
+        raise ValueError(f"Invalid percent string: {arg!r}")
+    return pct
+
+
+def legacy_decode_line_bytes(line_bytes: bytes) -> ResponseMessageType:
+    """The original Decode.decode_line_bytes"""
+    if line_bytes.find(b"\r") != len(line_bytes) - 1:
+        raise InvalidResponseError()
+    line: str = line_bytes.decode("utf-8")
+    args: list[str] = line.split()
+    if len(args) < 1:
+        raise InvalidResponseError()
+    response_code = args.pop(0)
+    if response_code == "RSP":
+        if len(args) < 3:
+            raise InvalidResponseError()
+        tt_addr = LegacyTTBusDeviceAddress(
+            legacy_hex_arg_to_int(args[0], False),
+            legacy_hex_arg_to_int(args[1], False),
+        )
+        cmd_code = CommandCode(legacy_hex_arg_to_int(args[2], False))
+        if len(args) == 3:
+            return AckResponse(tt_addr, cmd_code)  # type: ignore[arg-type]
+        elif len(args) == 4 and cmd_code in {
+            CommandCode.READ_POS,
+            CommandCode.MOVE_POS,
+        }:
+            hex_pos = legacy_hex_arg_to_int(args[3], False)
+            return HexPosResponse(tt_addr, cmd_code, hex_pos)  # type: ignore[arg-type]
+        raise InvalidResponseError()
+    elif response_code == "POS":
+        cmd_char = args[0]
+        if cmd_char in ("*", "#"):
+            if len(args) != 6 or args[4] != "FFFF" or args[5] != "FF":
+                raise InvalidResponseError()
+            tt_addr = LegacyTTBusDeviceAddress(
+                legacy_hex_arg_to_int(args[1], False), legacy_hex_arg_to_int(args[2])
+            )
+            pos = legacy_pct_arg_to_int(args[3])
+            factory = PctPosResponse if cmd_char == "*" else PctAckResponse
+            return factory(tt_addr, pos)  # type: ignore[arg-type]
+        elif cmd_char == "!":
+            return ErrorResponse(line)
+        raise InvalidResponseError()
+    elif response_code == "WEB":
+        return InformationalResponse(line)
+    elif response_code == "ERROR":
+        return ErrorResponse(line)
+    raise InvalidResponseError()
+
+
+def make_trace() -> List[bytes]:
+    trace: List[bytes] = [b"WEB COMMANDS ON\r"]
+    for address in range(2, 14):
+        trace.append(f"RSP {address:X} 4 40 7E\r".encode("utf-8"))
+        trace.append(f"POS # {address:02X} 04 0500 FFFF FF\r".encode("utf-8"))
+    for step in range(50):
+        for address in range(2, 14):
+            pos = 1000 - step * 10
+            trace.append(f"POS * {address:02X} 04 {pos:04d} FFFF FF\r".encode("utf-8"))
+        trace.append(f"RSP {2 + step % 12:X} 4 11\r".encode("utf-8"))
+    return trace
+
+
+def run(
+    name: str,
+    decode_line: Callable[[bytes], ResponseMessageType],
+    trace: List[bytes],
+    repeat: int,
+    before_each: Callable[[], None] | None = None,
+) -> float:
+    # Each repeat decodes fresh copies of the lines, as received lines are new
+    # bytes objects that have not had their hash computed
+    copies = [[bytes(bytearray(line)) for line in trace] for _ in range(repeat)]
+    secs = 0.0
+    for lines in copies:
+        if before_each is not None:
+            before_each()
+        start = perf_counter()
+        for line in lines:
+            decode_line(line)
+        secs += perf_counter() - start
+    lines_per_sec = len(trace) * repeat / secs
+    print(f"{name:<40} {lines_per_sec:>14,.0f} lines/sec")
+    return lines_per_sec
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-r", "--repeat", type=int, default=200)
+    args = parser.parse_args()
+    trace = make_trace()
+    print(f"{len(trace)} lines in trace, {args.repeat} repeats")
+    legacy = run("original decoder", legacy_decode_line_bytes, trace, args.repeat)
+    reference = run(
+        "decode_line_bytes_reference",
+        Decode.decode_line_bytes_reference,
+        trace,
+        args.repeat,
+    )
+    single = run(
+        "decode_line_bytes (single pass)",
+        Decode.decode_line_bytes,
+        trace,
+        args.repeat,
+        Decode.cache_clear,
+    )
+    warm = run(
+        "decode_line_bytes (repeated lines)",
+        Decode.decode_line_bytes,
+        trace,
+        args.repeat,
+    )
+    print(f"speed up over original decoder: {single / legacy:.1f}x single pass")
+    print(f"                                {warm / legacy:.1f}x repeated lines")
+    print(f"speed up over reference:        {single / reference:.1f}x single pass")
+    print(f"                                {warm / reference:.1f}x repeated lines")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark decode plus dispatch throughput in messages/sec
+
+Each decoded message is looked up by address in a dict of covers, which is
+what CoverManager does for every response message.   The "before" figures use
+a copy of the original TTBusDeviceAddress, which allocated a tuple for every
+hash and equality check and was created afresh for every decoded message
+
+Usage:
+    python -m benchmarks.bench_dispatch [-r REPEAT]
+"""
+
+import argparse
+from timeit import timeit
+from typing import Dict, List, Tuple
+
+from benchmarks.bench_decode import make_trace
+from nicett6.decode import Decode
+from nicett6.ttbus_device import TTBusDeviceAddress
+
+
+class LegacyTTBusDeviceAddress:
+    """The original implementation"""
+
+    def __init__(self, address: int, node: int):
+        self.address = address
+        self.node = node
+
+    @property
+    def as_tuple(self) -> Tuple[int, int]:
+        return self.address, self.node
+
+    def __eq__(self, other: object):
+        if not isinstance(other, LegacyTTBusDeviceAddress):
+            return False
+        return self.as_tuple == other.as_tuple
+
+    def __hash__(self) -> int:
+        return hash(self.as_tuple)
+
+
+def report(name: str, count: int, secs: float) -> float:
+    rate = count / secs
+    print(f"{name:<40} {rate:>14,.0f} messages/sec")
+    return rate
+
+
+def bench_lookup(addresses: List[Tuple[int, int]], repeat: int) -> None:
+    legacy_covers = {LegacyTTBusDeviceAddress(a, n): None for a, n in addresses}
+    covers = {TTBusDeviceAddress(a, n): None for a, n in addresses}
+
+    def legacy_body() -> None:
+        for a, n in addresses:
+            legacy_covers[LegacyTTBusDeviceAddress(a, n)]
+
+    def body() -> None:
+        for a, n in addresses:
+            covers[TTBusDeviceAddress(a, n)]
+
+    count = len(addresses) * repeat
+    before = report(
+        "before: create address + lookup", count, timeit(legacy_body, number=repeat)
+    )
+    after = report("after: create address + lookup", count, timeit(body, number=repeat))
+    print(f"speed up: {after / before:.1f}x")
+
+
+def bench_decode_and_dispatch(trace: List[bytes], repeat: int) -> None:
+    covers: Dict[TTBusDeviceAddress, int] = {
+        TTBusDeviceAddress(address, 0x04): 0 for address in range(2, 14)
+    }
+
+    def body() -> None:
+        for msg in Decode.decode_many(trace):
+            tt_addr = getattr(msg, "tt_addr", None)
+            if tt_addr is not None:
+                covers[tt_addr] += 1
+
+    report("decode_many + dispatch", len(trace) * repeat, timeit(body, number=repeat))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-r", "--repeat", type=int, default=200)
+    args = parser.parse_args()
+    trace = make_trace()
+    addresses = [(2 + i % 12, 0x04) for i in range(len(trace))]
+    bench_lookup(addresses, args.repeat)
+    bench_decode_and_dispatch(trace, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark Encode throughput in encodes/sec
+
+Compares the cached encoders with the uncached functions that they wrap
+
+Usage:
+    python -m benchmarks.bench_encode [-r REPEAT]
+"""
+
+import argparse
+from timeit import timeit
+from typing import Callable, List
+
+from nicett6.encode import Encode
+from nicett6.ttbus_device import TTBusDeviceAddress
+
+
+def run(name: str, calls: List[Callable[[], bytes]], repeat: int) -> float:
+    def body() -> None:
+        for call in calls:
+            call()
+
+    rate = len(calls) * repeat / timeit(body, number=repeat)
+    print(f"{name:<32} {rate:>14,.0f} encodes/sec")
+    return rate
+
+
+def make_calls(
+    simple_command: Callable[[TTBusDeviceAddress, str], bytes],
+    simple_command_with_data: Callable[[TTBusDeviceAddress, str, int], bytes],
+    web_move_command: Callable[[TTBusDeviceAddress, int], bytes],
+    web_pos_request: Callable[[TTBusDeviceAddress], bytes],
+) -> List[Callable[[], bytes]]:
+    """A UI slider driving two covers with the odd stop and position request"""
+    calls: List[Callable[[], bytes]] = []
+    tt_addrs = [TTBusDeviceAddress(0x02, 0x04), TTBusDeviceAddress(0x03, 0x04)]
+    for i in range(500):
+        tt_addr = tt_addrs[i % 2]
+        pos = i % 100 * 10
+        calls.append(lambda tt_addr=tt_addr, pos=pos: web_move_command(tt_addr, pos))
+        calls.append(lambda tt_addr=tt_addr: web_pos_request(tt_addr))
+        if i % 10 == 0:
+            calls.append(lambda tt_addr=tt_addr: simple_command(tt_addr, "STOP"))
+            calls.append(
+                lambda tt_addr=tt_addr, pos=pos: simple_command_with_data(
+                    tt_addr, "MOVE_POS", pos // 4
+                )
+            )
+    return calls
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-r", "--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    def uncached(method):
+        return lambda *args: method.__wrapped__(Encode, *args)
+
+    before = run(
+        "uncached",
+        make_calls(
+            uncached(Encode.simple_command),
+            uncached(Encode.simple_command_with_data),
+            uncached(Encode._web_move_command),
+            uncached(Encode.web_pos_request),
+        ),
+        args.repeat,
+    )
+    Encode.cache_clear()
+    after = run(
+        "cached",
+        make_calls(
+            Encode.simple_command,
+            Encode.simple_command_with_data,
+            Encode.web_move_command,
+            Encode.web_pos_request,
+        ),
+        args.repeat,
+    )
+    print(f"speed up: {after / before:.1f}x")
+    for name, info in Encode.cache_info().items():
+        print(f"{name:<32} {info}")
+
+
+if __name__ == "__main__":
+    main()
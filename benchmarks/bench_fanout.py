@@ -0,0 +1,75 @@
+"""
+Benchmark fan-out of decoded messages to one reader per cover
+
+Compares every reader receiving every message and filtering out the
+messages for other covers itself with readers subscribed by address using
+a ReaderFilter, so that ReaderManager only delivers the messages wanted
+
+Usage:
+    python -m benchmarks.bench_fanout [-r REPEAT] [-b BATCH]
+"""
+
+import argparse
+from timeit import timeit
+from typing import List, Optional
+
+from benchmarks.bench_decode import make_trace
+from nicett6.decode import Decode, ResponseMessageType
+from nicett6.serial import ReaderFilter, ReaderManager
+from nicett6.tt6_connection import TT6Reader, message_address
+from nicett6.ttbus_device import TTBusDeviceAddress
+
+TT_ADDRS = [TTBusDeviceAddress(address, 0x04) for address in range(2, 14)]
+
+
+def report(name: str, count: int, secs: float) -> float:
+    rate = count / secs
+    print(f"{name:<32} {rate:>14,.0f} messages/sec")
+    return rate
+
+
+def bench(
+    name: str,
+    batches: List[List[ResponseMessageType]],
+    filtered: bool,
+    repeat: int,
+) -> float:
+    manager = ReaderManager(Decode.decode_line_bytes, message_address=message_address)
+    readers: List[TT6Reader] = []
+    for tt_addr in TT_ADDRS:
+        reader = TT6Reader()
+        filter: Optional[ReaderFilter] = (
+            ReaderFilter(address=tt_addr) if filtered else None
+        )
+        manager.add_reader(reader, filter)
+        readers.append(reader)
+
+    def body() -> None:
+        for batch in batches:
+            manager.dispatch(batch)
+        for tt_addr, reader in zip(TT_ADDRS, readers):
+            queue = reader.queue
+            while queue:
+                msg = queue.popleft()
+                if message_address(msg) != tt_addr:
+                    continue
+
+    count = sum(len(batch) for batch in batches) * repeat
+    return report(name, count, timeit(body, number=repeat))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-r", "--repeat", type=int, default=100)
+    parser.add_argument("-b", "--batch", type=int, default=13)
+    args = parser.parse_args()
+    decoded = Decode.decode_many(make_trace())
+    batches = [decoded[i : i + args.batch] for i in range(0, len(decoded), args.batch)]
+    print(f"{len(TT_ADDRS)} readers, {args.batch} messages per batch")
+    before = bench("every reader gets every message", batches, False, args.repeat)
+    after = bench("readers filtered by address", batches, True, args.repeat)
+    print(f"speed up: {after / before:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Benchmark the cost of tracking when covers stop moving
+
+A movement storm is simulated by calling Cover.set_pos repeatedly on a
+number of covers, as the message tracker does for each POS message.   The
+original notifier cancelled, awaited and re-created a task per cover for
+every movement; covers sharing an IdleScheduler are serviced by a single
+timer task.   Reports tasks created per movement and movements/sec
+
+Usage:
+    python -m benchmarks.bench_idle_timer [-c COVERS] [-m MOVES]
+"""
+
+import argparse
+import asyncio
+from asyncio import CancelledError, Lock, Task
+from time import perf_counter
+from typing import Callable, List
+
+from nicett6.cover import Cover, IdleScheduler, PostMovementNotifier
+
+
+class LegacyNotifier:
+    """The original implementation - one task per cover, restarted per movement"""
+
+    def __init__(self, cover: Cover) -> None:
+        self.cover = cover
+        self._task_lock: Lock = Lock()
+        self._task: Task | None = None
+
+    async def moved(self) -> None:
+        async with self._task_lock:
+            await self._cancel_task()
+            self._task = asyncio.create_task(self._set_idle_after_delay())
+
+    async def _set_idle_after_delay(self) -> None:
+        await asyncio.sleep(
+            Cover.MOVEMENT_THRESHOLD_INTERVAL
+            + PostMovementNotifier.POST_MOVEMENT_ALLOWANCE
+        )
+        await self.cover.set_idle()
+
+    async def cancel_task(self) -> None:
+        async with self._task_lock:
+            await self._cancel_task()
+
+    async def _cancel_task(self) -> None:
+        if self._task is not None:
+            if not self._task.done():
+                self._task.cancel()
+            try:
+                await self._task
+            except CancelledError:
+                pass
+
+
+def make_legacy_covers(num_covers: int) -> List[Cover]:
+    covers = [Cover(f"Cover {i}", 2.0) for i in range(num_covers)]
+    for cover in covers:
+        cover._notifier = LegacyNotifier(cover)  # type: ignore[assignment]
+    return covers
+
+
+def make_shared_covers(num_covers: int) -> List[Cover]:
+    scheduler = IdleScheduler()
+    covers = [Cover(f"Cover {i}", 2.0) for i in range(num_covers)]
+    for cover in covers:
+        cover.set_idle_scheduler(scheduler)
+    return covers
+
+
+async def bench(
+    name: str, make_covers: Callable[[int], List[Cover]], num_covers: int, moves: int
+) -> float:
+    loop = asyncio.get_running_loop()
+    tasks_created = 0
+
+    def task_factory(loop, coro, **kwargs):
+        nonlocal tasks_created
+        tasks_created += 1
+        return asyncio.Task(coro, loop=loop, **kwargs)
+
+    covers = make_covers(num_covers)
+    loop.set_task_factory(task_factory)
+    start = perf_counter()
+    try:
+        for i in range(moves):
+            for cover in covers:
+                await cover.set_pos(1000 - i % 1000)
+    finally:
+        loop.set_task_factory(None)
+    elapsed = perf_counter() - start
+    for cover in covers:
+        await cover.stop_notifier()
+    movements = moves * num_covers
+    per_movement = tasks_created / movements
+    print(
+        f"{name:<24} {tasks_created:>8} tasks {per_movement:>8.4f} tasks/movement"
+        f" {movements / elapsed:>12,.0f} movements/sec"
+    )
+    return per_movement
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-c", "--covers", type=int, default=16)
+    parser.add_argument("-m", "--moves", type=int, default=1000)
+    args = parser.parse_args()
+    print(f"{args.covers} covers, {args.moves} movements each")
+    await bench("task per cover", make_legacy_covers, args.covers, args.moves)
+    await bench("shared IdleScheduler", make_shared_covers, args.covers, args.moves)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
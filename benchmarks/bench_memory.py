@@ -0,0 +1,62 @@
+"""
+Benchmark the memory used by messages queued in a SerialReader
+
+Reports the bytes per queued message for the slotted response classes and
+for equivalent plain dataclasses (the original representation) which carry
+a per-instance __dict__
+
+Usage:
+    python -m benchmarks.bench_memory [-n MESSAGES]
+"""
+
+import argparse
+import asyncio
+import tracemalloc
+from dataclasses import dataclass
+from typing import Callable, List
+
+from nicett6.decode import PctPosResponse
+from nicett6.serial import SerialReader
+from nicett6.ttbus_device import TTBusDeviceAddress
+
+
+@dataclass
+class LegacyPctPosResponse:
+    """The original representation"""
+
+    tt_addr: TTBusDeviceAddress
+    pos: int
+
+
+def measure(factory: Callable[[TTBusDeviceAddress, int], object], count: int) -> float:
+    tt_addrs = [TTBusDeviceAddress(address, 0x04) for address in range(2, 14)]
+    reader: SerialReader[object] = SerialReader()
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        batch: List[object] = []
+        for i in range(count):
+            batch.append(factory(tt_addrs[i % len(tt_addrs)], 1000 - i % 1001))
+            if len(batch) == 50:
+                reader.messages_received(batch)
+                batch = []
+        reader.messages_received(batch)
+        after, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return (after - before) / count
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--messages", type=int, default=100000)
+    args = parser.parse_args()
+    print(f"{args.messages} PctPosResponse messages queued in a SerialReader")
+    legacy = measure(LegacyPctPosResponse, args.messages)
+    print(f"{'plain dataclass':<32} {legacy:>8.1f} bytes/message")
+    slotted = measure(PctPosResponse, args.messages)
+    print(f"{'slotted dataclass':<32} {slotted:>8.1f} bytes/message")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,76 @@
+"""
+Benchmark command throughput with fixed and adaptive write pacing
+
+Sends READ_POS to each of a number of covers several times over and reports
+how long it takes for all of the acknowledgements to arrive from an emulator
+that responds after a configurable latency
+
+Usage:
+    python -m benchmarks.bench_pacing [-c COVERS] [-r ROUNDS] [-l LATENCY]
+"""
+
+import argparse
+import asyncio
+from time import perf_counter
+from typing import List
+
+from benchmarks.emulator import make_covers, run_emulator
+from nicett6.decode import HexPosResponse
+from nicett6.encode import Encode
+from nicett6.tt6_connection import TT6AdaptivePacer, TT6Connection, open_connection
+from nicett6.ttbus_device import TTBusDeviceAddress
+
+
+async def collect_acks(conn: TT6Connection, count: int) -> None:
+    reader = conn.add_reader()
+    received = 0
+    async for msg in reader:
+        if isinstance(msg, HexPosResponse):
+            received += 1
+            if received == count:
+                break
+    conn.remove_reader(reader)
+
+
+async def bench(
+    name: str, conn: TT6Connection, tt_addrs: List[TTBusDeviceAddress], rounds: int
+) -> None:
+    count = len(tt_addrs) * rounds
+    collector = asyncio.create_task(collect_acks(conn, count))
+    await asyncio.sleep(0)
+    writer = conn.get_writer()
+    start = perf_counter()
+    for _ in range(rounds):
+        for tt_addr in tt_addrs:
+            writer.write_nowait(Encode.simple_command(tt_addr, "READ_POS"))
+    await collector
+    elapsed = perf_counter() - start
+    gap = f"{1000 * conn.pacer.post_write_delay:6.2f} ms"
+    print(
+        f"{name:<10} {count / elapsed:8.1f} commands/s   "
+        f"{1000 * elapsed / count:6.2f} ms/command   final gap: {gap}"
+    )
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-c", "--covers", type=int, default=5)
+    parser.add_argument("-r", "--rounds", type=int, default=20)
+    parser.add_argument("-l", "--latency", type=float, default=0.005)
+    args = parser.parse_args()
+    covers = make_covers(args.covers)
+    tt_addrs = [cover.tt_addr for cover in covers]
+    async with run_emulator(covers, latency=args.latency) as serial_port:
+        print(
+            f"READ_POS x {args.rounds} to {len(tt_addrs)} covers "
+            f"with {1000 * args.latency:.1f} ms controller latency"
+        )
+        async with open_connection(serial_port) as conn:
+            await bench("fixed", conn, tt_addrs, args.rounds)
+        async with open_connection(serial_port, adaptive_pacing=True) as conn:
+            assert isinstance(conn.pacer, TT6AdaptivePacer)
+            await bench("adaptive", conn, tt_addrs, args.rounds)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,76 @@
+"""
+Benchmark messages/sec through a SerialReader
+
+A producer delivers decoded messages to the reader in chunks, as the
+protocol does, and yields to the event loop after each chunk.   The consumer
+either iterates over the reader one message at a time or takes a batch of
+every queued message per wakeup with reader.batches()
+
+Usage:
+    python -m benchmarks.bench_reader [-r REPEAT] [-b BATCH]
+"""
+
+import argparse
+import asyncio
+from time import perf_counter
+from typing import AsyncIterator, List
+
+from benchmarks.bench_decode import make_trace
+from nicett6.decode import Decode, ResponseMessageType
+from nicett6.tt6_connection import TT6Reader
+
+
+async def produce(
+    reader: TT6Reader, chunks: List[List[ResponseMessageType]], repeat: int
+) -> None:
+    for _ in range(repeat):
+        for chunk in chunks:
+            reader.messages_received(chunk)
+            await asyncio.sleep(0)
+    reader.stop()
+
+
+async def consume_messages(reader: TT6Reader) -> int:
+    count = 0
+    async for msg in reader:
+        count += 1
+    return count
+
+
+async def consume_batches(reader: TT6Reader) -> int:
+    count = 0
+    batches: AsyncIterator[List[ResponseMessageType]] = reader.batches()
+    async for msgs in batches:
+        for msg in msgs:
+            count += 1
+    return count
+
+
+async def bench(name, consume, chunks, repeat) -> float:
+    reader = TT6Reader()
+    start = perf_counter()
+    consumer = asyncio.create_task(consume(reader))
+    await produce(reader, chunks, repeat)
+    count = await consumer
+    rate = count / (perf_counter() - start)
+    print(f"{name:<24} {rate:>14,.0f} messages/sec")
+    return rate
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-r", "--repeat", type=int, default=100)
+    parser.add_argument("-b", "--batch", type=int, default=13)
+    args = parser.parse_args()
+    decoded = Decode.decode_many(make_trace())
+    chunks = [decoded[i : i + args.batch] for i in range(0, len(decoded), args.batch)]
+    print(f"{args.batch} messages per chunk")
+    before = await bench(
+        "async for msg in reader", consume_messages, chunks, args.repeat
+    )
+    after = await bench("reader.batches()", consume_batches, chunks, args.repeat)
+    print(f"speed up: {after / before:.1f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,78 @@
+"""
+Benchmark the latency seen by callers sending commands to the emulator
+
+Sends READ_POS to each of a number of covers and reports how long the
+caller was held up for.   The "legacy" figures hold a lock and sleep for
+post_write_delay after each write, as SerialProtocol.write used to
+
+Usage:
+    python -m benchmarks.bench_write_latency [-c COVERS]
+"""
+
+import argparse
+import asyncio
+from time import perf_counter
+from typing import List
+
+from benchmarks.emulator import make_covers, run_emulator
+from nicett6.encode import Encode
+from nicett6.tt6_connection import TT6Connection, open_connection
+from nicett6.ttbus_device import TTBusDeviceAddress
+
+
+def report(name: str, caller_secs: float, total_secs: float, count: int) -> None:
+    print(
+        f"{name:<24} "
+        f"caller latency/command: {1000 * caller_secs / count:7.2f} ms   "
+        f"all written after: {1000 * total_secs:7.2f} ms"
+    )
+
+
+async def legacy(conn: TT6Connection, tt_addrs: List[TTBusDeviceAddress]) -> None:
+    lock = asyncio.Lock()
+    start = perf_counter()
+    for tt_addr in tt_addrs:
+        async with lock:
+            await conn.write(Encode.simple_command(tt_addr, "READ_POS"))
+            await asyncio.sleep(conn.post_write_delay)
+    elapsed = perf_counter() - start
+    report("legacy (lock + sleep)", elapsed, elapsed, len(tt_addrs))
+
+
+async def awaited(conn: TT6Connection, tt_addrs: List[TTBusDeviceAddress]) -> None:
+    start = perf_counter()
+    for tt_addr in tt_addrs:
+        await conn.write(Encode.simple_command(tt_addr, "READ_POS"))
+    elapsed = perf_counter() - start
+    report("awaited", elapsed, elapsed, len(tt_addrs))
+
+
+async def fire_and_forget(
+    conn: TT6Connection, tt_addrs: List[TTBusDeviceAddress]
+) -> None:
+    start = perf_counter()
+    futures = [
+        conn.write_nowait(Encode.simple_command(tt_addr, "READ_POS"))
+        for tt_addr in tt_addrs
+    ]
+    caller = perf_counter() - start
+    await asyncio.gather(*futures)
+    report("fire and forget", caller, perf_counter() - start, len(tt_addrs))
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-c", "--covers", type=int, default=10)
+    args = parser.parse_args()
+    covers = make_covers(args.covers)
+    tt_addrs = [cover.tt_addr for cover in covers]
+    async with run_emulator(covers) as serial_port:
+        async with open_connection(serial_port) as conn:
+            print(f"READ_POS to {len(tt_addrs)} covers")
+            for bench in (legacy, awaited, fire_and_forget):
+                await bench(conn, tt_addrs)
+                await asyncio.sleep(conn.post_write_delay)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
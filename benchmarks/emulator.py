@@ -0,0 +1,45 @@
+"""Helpers to run the emulator in-process for benchmarks"""
+
+import asyncio
+import socket
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List
+
+from nicett6.emulator.controller import make_tt6controller
+from nicett6.emulator.controller.controller import TT6Controller
+from nicett6.emulator.cover_emulator import TT6CoverEmulator
+from nicett6.ttbus_device import TTBusDeviceAddress
+
+
+def make_covers(num_covers: int) -> List[TT6CoverEmulator]:
+    return [
+        TT6CoverEmulator(
+            f"cover{i}", TTBusDeviceAddress(0x02 + i, 0x04), 0.01, 1.0, 0.5, 1000
+        )
+        for i in range(num_covers)
+    ]
+
+
+@asynccontextmanager
+async def run_emulator(
+    covers: List[TT6CoverEmulator], web_on: bool = True, latency: float = 0.0
+) -> AsyncIterator[str]:
+    """Serve the emulator on a free port and yield the serial_port url"""
+    with make_tt6controller(web_on, covers, latency) as controller:
+        server_task = asyncio.create_task(controller.run_server(0))
+        serial_port = await _wait_for_serial_port(controller)
+        try:
+            yield serial_port
+        finally:
+            await asyncio.sleep(0.1)  # Let the emulator see the client disconnect
+            await controller.stop_server()
+            await server_task
+
+
+async def _wait_for_serial_port(controller: TT6Controller) -> str:
+    while controller._server is None or not controller._server.sockets:
+        await asyncio.sleep(0.01)
+    for sock in controller._server.sockets:
+        if sock.family == socket.AF_INET:
+            return f"socket://127.0.0.1:{sock.getsockname()[1]}"
+    raise RuntimeError("Emulator is not serving on IPv4")
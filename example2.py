@@ -111,10 +111,8 @@ async def run_example_commands_top_gun(writer, screen_tt_addr, mask_tt_addr):
 
 async def request_screen_position(writer, tt_addr):
     _LOGGER.info("requesting screen position")
-    responses = await writer.process_request(
-        writer.send_simple_command(tt_addr, "READ_POS"), 0.5
-    )
-    _LOGGER.info("screen position request responses: %r", responses)
+    response = await writer.request_hex_pos(tt_addr, 0.5)
+    _LOGGER.info("screen position request response: %r", response)
 
 
 async def read_sequences_simple(reader):
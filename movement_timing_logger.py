@@ -3,6 +3,7 @@ import asyncio
 import logging
 from datetime import datetime, timedelta
 
+from nicett6.calibration import CalibrationStore
 from nicett6.cover import Cover
 from nicett6.cover_manager import CoverManager
 from nicett6.decode import PctAckResponse, PctPosResponse
@@ -71,10 +72,13 @@ async def read_messages(reader: TT6Reader, handler: MessageHandler):
     _LOGGER.info(f"read_messages finished")
 
 
-async def log_movement_timing(serial_port: str, address: int) -> None:
+async def log_movement_timing(
+    serial_port: str, address: int, calibration_path: str | None = None
+) -> None:
     tt_addr = TTBusDeviceAddress(address, 0x04)
     max_drop = 2.0
-    async with CoverManager(serial_port) as mgr:
+    calibration = CalibrationStore.load(calibration_path) if calibration_path else None
+    async with CoverManager(serial_port, calibration) as mgr:
         handler: MessageHandler = MessageHandler()
         reader = mgr.conn.add_reader()
         assert isinstance(reader, TT6Reader)
@@ -88,6 +92,9 @@ async def log_movement_timing(serial_port: str, address: int) -> None:
         await tt6_cover.send_pos_command(1000)  # Fully up
         await handler.wait_for_motion_to_complete()
 
+        if calibration is not None:
+            _LOGGER.info("Speed profile: %s", calibration.get(tt_addr))
+
     await read_messages_task
     await message_tracker_task
 
@@ -110,5 +117,12 @@ if __name__ == "__main__":
         default=2,
         help="device address",
     )
+    parser.add_argument(
+        "-c",
+        "--calibration",
+        type=str,
+        default=None,
+        help="calibration store to update",
+    )
     args = parser.parse_args()
-    asyncio.run(log_movement_timing(args.serial_port, args.address))
+    asyncio.run(log_movement_timing(args.serial_port, args.address, args.calibration))
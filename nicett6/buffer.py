@@ -1,20 +1,73 @@
-from typing import List
+from typing import Iterator, List
 
 
 class MessageBuffer:
-    """Buffer that accumulates chunks of bytes and emits messages"""
+    """
+    Buffer that accumulates chunks of bytes and emits messages
+
+    Messages are found by scanning forwards from a moving offset so a chunk
+    containing N messages is processed in a single pass.   Any partial message
+    left over at the end of a chunk is retained in buf until the next chunk
+    """
 
     def __init__(self, eol: bytes) -> None:
         self.buf: bytearray = bytearray()
         self.eol: bytes = eol
 
     def append_chunk(self, chunk: bytes) -> List[bytes]:
-        self.buf += chunk
+        data = self._take(chunk)
+        eol = self.eol
+        eol_len = len(eol)
         messages: List[bytes] = []
+        start = 0
         while True:
-            iX = self.buf.find(self.eol)
+            iX = data.find(eol, start)
             if iX == -1:
                 break
-            messages.append(bytes(self.buf[: iX + len(self.eol)]))
-            del self.buf[: iX + len(self.eol)]
+            end = iX + eol_len
+            messages.append(data[start:end])
+            start = end
+        self._keep(data, start)
         return messages
+
+    def iter_messages(self, chunk: bytes) -> Iterator[memoryview]:
+        """
+        Generate the complete messages made available by chunk
+
+        Each message is a zero-copy memoryview slice of the underlying data
+        and should be converted with bytes() if it needs to be retained
+
+        The unconsumed remainder is compacted into buf when the generator
+        finishes or is closed, so messages that were not consumed will be
+        emitted again by the next call
+        """
+        data = self._take(chunk)
+        view = memoryview(data)
+        eol = self.eol
+        eol_len = len(eol)
+        start = 0
+        try:
+            while True:
+                iX = data.find(eol, start)
+                if iX == -1:
+                    break
+                end = iX + eol_len
+                msg = view[start:end]
+                start = end
+                yield msg
+        finally:
+            self._keep(view, start)
+
+    def _take(self, chunk: bytes) -> bytes:
+        """Return any partial message joined with chunk and empty buf"""
+        if not self.buf:
+            return bytes(chunk)
+        self.buf += chunk
+        data = bytes(self.buf)
+        self.buf.clear()
+        return data
+
+    def _keep(self, data: bytes | memoryview, start: int) -> None:
+        """Compact the unconsumed remainder of data into buf"""
+        if start < len(data):
+            self.buf += data[start:]
@@ -0,0 +1,248 @@
+import json
+import logging
+from dataclasses import asdict, dataclass
+from time import perf_counter
+from typing import Dict, List, Optional, Tuple
+
+from nicett6.cover import Cover
+from nicett6.ttbus_device import TTBusDeviceAddress
+from nicett6.utils import AsyncObservable, AsyncObserver
+
+_LOGGER = logging.getLogger(__name__)
+
+
+@dataclass
+class SpeedProfile:
+    """
+    Movement characteristics of a cover learned during normal operation
+
+    Speeds are in positions per second and times are in seconds
+    start_lag is the time from a movement being acknowledged to the first
+    change of position and deceleration_time is the time lost as the cover
+    slows down at the end of a movement compared with moving at full speed
+    report_interval is the longest observed gap between POS messages
+    while moving
+    """
+
+    SMOOTHING = 0.3
+    IDLE_MARGIN = 1.5
+    MIN_MOVEMENTS = 3
+
+    up_speed: Optional[float] = None
+    down_speed: Optional[float] = None
+    start_lag: Optional[float] = None
+    deceleration_time: Optional[float] = None
+    report_interval: Optional[float] = None
+    movements: int = 0
+
+    def speed(self, going_up: bool) -> Optional[float]:
+        return self.up_speed if going_up else self.down_speed
+
+    @property
+    def mean_speed(self) -> Optional[float]:
+        speeds = [s for s in (self.up_speed, self.down_speed) if s is not None]
+        return sum(speeds) / len(speeds) if speeds else None
+
+    @property
+    def movement_threshold(self) -> Optional[float]:
+        """
+        Suggested Cover.MOVEMENT_THRESHOLD_INTERVAL
+
+        Allows for the start-up lag as well as the report interval so that a
+        cover isn't considered idle before the first POS after an ack
+        None until enough movements have been observed
+        """
+        if self.report_interval is None or self.movements < self.MIN_MOVEMENTS:
+            return None
+        start_lag = self.start_lag if self.start_lag is not None else 0.0
+        return (start_lag + self.report_interval) * self.IDLE_MARGIN
+
+    def travel_time(
+        self, from_pos: float, to_pos: float, from_rest: bool = True
+    ) -> Optional[float]:
+        """Predicted seconds to move from from_pos to to_pos"""
+        if from_pos == to_pos:
+            return 0.0
+        speed = self.speed(to_pos > from_pos)
+        if speed is None:
+            return None
+        travel_time = abs(to_pos - from_pos) / speed
+        if from_rest and self.start_lag is not None:
+            travel_time += self.start_lag
+        if self.deceleration_time is not None:
+            travel_time += self.deceleration_time
+        return travel_time
+
+    def learn(
+        self,
+        going_up: bool,
+        speed: float,
+        start_lag: Optional[float],
+        deceleration_time: Optional[float],
+        report_interval: Optional[float],
+    ) -> None:
+        """Blend the measurements of a movement into the profile"""
+        if going_up:
+            self.up_speed = _smooth(self.up_speed, speed)
+        else:
+            self.down_speed = _smooth(self.down_speed, speed)
+        if start_lag is not None:
+            self.start_lag = _smooth(self.start_lag, start_lag)
+        if deceleration_time is not None:
+            self.deceleration_time = _smooth(self.deceleration_time, deceleration_time)
+        if report_interval is not None:
+            self.report_interval = (
+                report_interval
+                if self.report_interval is None
+                else max(self.report_interval, report_interval)
+            )
+        self.movements += 1
+
+
+def _smooth(current: Optional[float], sample: float) -> float:
+    if current is None:
+        return sample
+    return current + SpeedProfile.SMOOTHING * (sample - current)
+
+
+class CoverCalibrator(AsyncObserver):
+    """
+    Observes a Cover and feeds each completed movement into a SpeedProfile
+
+    The cover notifies its observers when a movement is acknowledged, when
+    each POS message is received and when it becomes idle, so must be
+    attached in SEQUENTIAL or CONCURRENT mode without a min_interval for
+    the timestamps to be accurate
+    """
+
+    def __init__(self, profile: SpeedProfile) -> None:
+        self.profile = profile
+        self._start_time: Optional[float] = None
+        self._points: List[Tuple[float, int]] = []
+
+    async def update(self, observable: AsyncObservable) -> None:
+        if not isinstance(observable, Cover):
+            return
+        now = perf_counter()
+        state = observable.state
+        if not state.is_moving:
+            self._finish()
+            return
+        if self._start_time is None:
+            self._start_time = now
+            self._points = [(now, state.pos)]
+        elif state.pos != self._points[-1][1]:
+            self._points.append((now, state.pos))
+
+    def _finish(self) -> None:
+        start_time = self._start_time
+        points = self._points
+        self._start_time = None
+        self._points = []
+        if start_time is None or len(points) < 3:
+            return  # Too short to measure
+        # points[0] is the acknowledgement or the first POS of the movement
+        # and the segment to points[1] includes the start-up lag, so the
+        # full speed is measured from points[1] to points[-2]
+        moving = points[1:]
+        start_pos = points[0][1]
+        end_time, end_pos = moving[-1]
+        cruise = moving[:-1] if len(moving) > 2 else moving
+        distance = abs(cruise[-1][1] - cruise[0][1])
+        elapsed = cruise[-1][0] - cruise[0][0]
+        if distance == 0 or elapsed <= 0:
+            return
+        speed = distance / elapsed
+        first_time, first_pos = moving[0]
+        start_lag = max(
+            0.0, (first_time - start_time) - abs(first_pos - start_pos) / speed
+        )
+        last_time, last_pos = moving[-2]
+        deceleration_time = max(
+            0.0, (end_time - last_time) - abs(end_pos - last_pos) / speed
+        )
+        report_interval = max(b[0] - a[0] for a, b in zip(moving, moving[1:]))
+        self.profile.learn(
+            end_pos > start_pos, speed, start_lag, deceleration_time, report_interval
+        )
+        _LOGGER.debug("Learned %s", self.profile)
+
+
+class CalibrationStore:
+    """
+    Speed profiles of covers keyed by TTBusDeviceAddress.id
+
+    Profiles are learned by attaching a CoverCalibrator to each cover and
+    can be persisted as JSON so that they survive restarts
+
+    If idle_detection is True then attached covers use the learned
+    movement_threshold instead of Cover.MOVEMENT_THRESHOLD_INTERVAL
+    """
+
+    def __init__(
+        self, path: Optional[str] = None, idle_detection: bool = False
+    ) -> None:
+        self.path = path
+        self.idle_detection = idle_detection
+        self.profiles: Dict[str, SpeedProfile] = {}
+
+    def get(self, tt_addr: TTBusDeviceAddress) -> Optional[SpeedProfile]:
+        return self.profiles.get(tt_addr.id)
+
+    def profile(self, tt_addr: TTBusDeviceAddress) -> SpeedProfile:
+        """Returns the profile for tt_addr, creating an empty one if needed"""
+        profile = self.profiles.get(tt_addr.id)
+        if profile is None:
+            profile = SpeedProfile()
+            self.profiles[tt_addr.id] = profile
+        return profile
+
+    def attach(self, tt_addr: TTBusDeviceAddress, cover: Cover) -> CoverCalibrator:
+        """
+        Start learning the profile of cover
+
+        The cover's speed and MAX_EXTRAPOLATION_INTERVAL are seeded from the
+        profile and, if idle_detection is set, its MOVEMENT_THRESHOLD_INTERVAL
+        """
+        profile = self.profile(tt_addr)
+        if cover.speed is None:
+            cover.speed = profile.mean_speed
+        if profile.report_interval is not None:
+            cover.MAX_EXTRAPOLATION_INTERVAL = profile.report_interval
+        movement_threshold = profile.movement_threshold
+        if self.idle_detection and movement_threshold is not None:
+            cover.set_movement_threshold_interval(movement_threshold)
+        calibrator = CoverCalibrator(profile)
+        cover.attach(calibrator)
+        return calibrator
+
+    def to_dict(self) -> Dict[str, Dict]:
+        return {key: asdict(profile) for key, profile in self.profiles.items()}
+
+    @classmethod
+    def from_dict(
+        cls,
+        data: Dict[str, Dict],
+        path: Optional[str] = None,
+        idle_detection: bool = False,
+    ) -> "CalibrationStore":
+        store = cls(path, idle_detection)
+        store.profiles = {key: SpeedProfile(**value) for key, value in data.items()}
+        return store
+
+    def save(self, path: Optional[str] = None) -> None:
+        path = self.path if path is None else path
+        if path is None:
+            raise ValueError("No path specified to save the calibration store")
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=4)
+
+    @classmethod
+    def load(cls, path: str, idle_detection: bool = False) -> "CalibrationStore":
+        """Load the store from path or return an empty store if it doesn't exist"""
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return cls(path, idle_detection)
+        return cls.from_dict(data, path, idle_detection)
@@ -1,18 +1,102 @@
+import json
+import logging
 import math
-from dataclasses import dataclass
-from typing import Optional
+from asyncio import Task, create_task
+from asyncio import sleep as planner_asyncio_sleep
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
 
 from nicett6.cover import Cover
 from nicett6.image_def import ImageDef
+from nicett6.utils import MAX_ASPECT_RATIO, MIN_ASPECT_RATIO, check_aspect_ratio
+
+# Positions (0 to 1000) that can be reached with a hex move command (0x00 to 0xFF)
+HEX_QUANTISED_POSITIONS: Tuple[int, ...] = tuple(
+    round(hex_pos / 0.255) for hex_pos in range(256)
+)
+
+GeometryKey = Tuple[float, float, float, float, float]
+
+# Sends a hex move command (0x00 to 0xFF) to a cover,
+# e.g. the send_hex_move_command method of a TT6Cover
+HexMoveSender = Callable[[int], Awaitable[None]]
+
+_LOGGER = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class CIWImage:
+    """The visible image for a pair of screen and mask positions"""
+
+    screen_pos: int
+    mask_pos: int
+    image_height: Optional[float]
+    image_diagonal: Optional[float]
+    image_area: Optional[float]
+    aspect_ratio: Optional[float]
 
 
 @dataclass
 class CIWHelper:
-    """Helper class that represents the behaviour of a CIW screen with a mask"""
+    """
+    Helper class that represents the behaviour of a CIW screen with a mask
+
+    The image geometry is calculated once per change of position and cached,
+    keyed on the (screen.pos, mask.pos) that it was calculated for, so the
+    helper doesn't need to observe the covers
+    Call invalidate() after changing max_drop or image_def
+
+    At most one delayed command from move_to_aspect_ratio is pending at a
+    time.   It is cancelled by the next move_to_aspect_ratio or, if
+    command_listener has been added to the command_listeners of the screen
+    and mask TT6Covers, by any other movement or stop command sent to them
+    """
 
     screen: Cover
     mask: Cover
     image_def: ImageDef
+    _image: Optional[CIWImage] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    _aspect_ratio_table: Optional["AspectRatioTable"] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    _pending_move: Optional[Task] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    def invalidate(self) -> None:
+        """Discard the cached image geometry"""
+        self._image = None
+
+    @property
+    def image(self) -> CIWImage:
+        """The (cached) geometry of the visible image"""
+        image = self._image
+        screen_pos = self.screen.pos
+        mask_pos = self.mask.pos
+        if (
+            image is None
+            or image.screen_pos != screen_pos
+            or image.mask_pos != mask_pos
+        ):
+            image_width = self.image_width
+            image_height = calculate_image_height(
+                self.screen.drop, self.mask.drop, self.image_def
+            )
+            image = CIWImage(
+                screen_pos=screen_pos,
+                mask_pos=mask_pos,
+                image_height=image_height,
+                image_diagonal=calculate_image_diagonal(image_height, image_width),
+                image_area=calculate_image_area(image_height, image_width),
+                aspect_ratio=(
+                    None if image_height is None else image_width / image_height
+                ),
+            )
+            self._image = image
+        return image
 
     @property
     def image_width(self) -> float:
@@ -20,24 +104,418 @@ class CIWHelper:
 
     @property
     def image_height(self) -> Optional[float]:
-        return calculate_image_height(self.screen.drop, self.mask.drop, self.image_def)
+        return self.image.image_height
 
     @property
     def image_diagonal(self) -> Optional[float]:
-        return calculate_image_diagonal(self.image_height, self.image_width)
+        return self.image.image_diagonal
 
     @property
     def image_area(self) -> Optional[float]:
-        return calculate_image_area(self.image_height, self.image_width)
+        return self.image.image_area
 
     @property
     def image_is_visible(self) -> Optional[float]:
-        return self.image_height is not None
+        return self.image.image_height is not None
 
     @property
     def aspect_ratio(self) -> Optional[float]:
-        ih = self.image_height
-        return None if ih is None else self.image_width / ih
+        return self.image.aspect_ratio
+
+    @property
+    def geometry_key(self) -> GeometryKey:
+        """The geometry that determines the aspect ratio of each position"""
+        return geometry_key(self.screen.max_drop, self.mask.max_drop, self.image_def)
+
+    @property
+    def aspect_ratio_table(self) -> "AspectRatioTable":
+        """
+        Lookup table from aspect ratio to (screen_pos, mask_pos)
+
+        Built on first use and rebuilt if the geometry changes
+        """
+        key = self.geometry_key
+        table = self._aspect_ratio_table
+        if table is None or table.key != key:
+            table = AspectRatioTable.build(
+                self.screen.max_drop, self.mask.max_drop, self.image_def
+            )
+            self._aspect_ratio_table = table
+        return table
+
+    def lookup_aspect_ratio(
+        self, target_aspect_ratio: float
+    ) -> Optional["AspectRatioEntry"]:
+        """Returns the positions for the nearest achievable aspect ratio"""
+        return self.aspect_ratio_table.lookup(target_aspect_ratio)
+
+    def plan_move_to_aspect_ratio(
+        self, target_aspect_ratio: float
+    ) -> Optional["CIWMovePlan"]:
+        """
+        Plan the movement of the screen and mask to target_aspect_ratio
+
+        The travel time of each cover is estimated from its learned speed and
+        the cover with the shorter journey is delayed so that both arrive at
+        about the same time.   If either speed is not known yet then both
+        covers start straight away and the duration is not known
+
+        Returns None if the image can never be visible
+        """
+        entry = self.lookup_aspect_ratio(target_aspect_ratio)
+        if entry is None:
+            return None
+        screen_travel = estimate_travel_time(self.screen, entry.screen_pos)
+        mask_travel = estimate_travel_time(self.mask, entry.mask_pos)
+        screen_delay = 0.0
+        mask_delay = 0.0
+        if screen_travel is not None and mask_travel is not None:
+            if screen_travel > mask_travel:
+                mask_delay = screen_travel - mask_travel
+            else:
+                screen_delay = mask_travel - screen_travel
+        return CIWMovePlan(
+            entry=entry,
+            screen_travel=screen_travel,
+            mask_travel=mask_travel,
+            screen_delay=screen_delay,
+            mask_delay=mask_delay,
+        )
+
+    async def move_to_aspect_ratio(
+        self,
+        target_aspect_ratio: float,
+        send_screen_hex_move: HexMoveSender,
+        send_mask_hex_move: HexMoveSender,
+    ) -> Optional["CIWMovePlan"]:
+        """
+        Move the screen and mask to target_aspect_ratio
+
+        send_screen_hex_move and send_mask_hex_move send a hex move command
+        to self.screen and self.mask (e.g. TT6Cover.send_hex_move_command)
+        Commands are sent as per plan_move_to_aspect_ratio and a cover that
+        is already in position is not sent a command
+
+        Any delayed command of a previous move is cancelled.   Returns the
+        plan, which includes the predicted duration of the movement, once
+        the undelayed command has been sent - the delayed command is sent
+        in the background (see move_pending)
+        """
+        self.cancel_move()
+        plan = self.plan_move_to_aspect_ratio(target_aspect_ratio)
+        if plan is None:
+            return None
+        entry = plan.entry
+        commands = [
+            (plan.screen_delay, self.screen, entry.screen_pos, send_screen_hex_move),
+            (plan.mask_delay, self.mask, entry.mask_pos, send_mask_hex_move),
+        ]
+        commands.sort(key=lambda command: command[0])  # Undelayed command first
+        for delay, cover, target_pos, send_hex_move in commands:
+            if not cover.is_moving and cover.pos == target_pos:
+                continue
+            hex_pos = pos_to_hex_pos(target_pos)
+            if delay > 0:
+                self._pending_move = create_task(
+                    self._send_hex_move_after(cover, send_hex_move, hex_pos, delay)
+                )
+            else:
+                await send_hex_move(hex_pos)
+        return plan
+
+    @property
+    def move_pending(self) -> bool:
+        """True if a delayed command from move_to_aspect_ratio is pending"""
+        return self._pending_move is not None and not self._pending_move.done()
+
+    def cancel_move(self) -> bool:
+        """
+        Cancel the delayed command of move_to_aspect_ratio, if pending
+
+        Returns True if a command was cancelled
+        """
+        pending_move = self._pending_move
+        self._pending_move = None
+        if pending_move is None or pending_move.done():
+            return False
+        pending_move.cancel()
+        return True
+
+    def command_listener(self, tt6_cover: Any) -> None:
+        """
+        Add to TT6Cover.command_listeners of the screen and mask so that any
+        other command sent to them cancels the delayed move
+        """
+        if self.cancel_move():
+            _LOGGER.debug("delayed move cancelled by command to %s", tt6_cover)
+
+    async def _send_hex_move_after(
+        self, cover: Cover, send_hex_move: HexMoveSender, hex_pos: int, delay: float
+    ) -> None:
+        try:
+            await planner_asyncio_sleep(delay)
+            # No longer pending, so that sending the command doesn't cancel it
+            self._pending_move = None
+            await send_hex_move(hex_pos)
+        except Exception:
+            _LOGGER.exception("delayed move of %s failed", cover.name)
+
+    def save_aspect_ratio_table(self, path: str) -> None:
+        """Save the aspect ratio table as JSON"""
+        self.aspect_ratio_table.save(path)
+
+    def load_aspect_ratio_table(self, path: str) -> bool:
+        """
+        Load a saved aspect ratio table
+
+        Returns False (and leaves the table to be built on first use) if
+        the file doesn't exist or was saved for a different geometry
+        """
+        try:
+            table = AspectRatioTable.load(path)
+        except FileNotFoundError:
+            return False
+        if table.key != self.geometry_key:
+            return False
+        self._aspect_ratio_table = table
+        return True
+
+
+@dataclass(frozen=True)
+class CIWMovePlan:
+    """
+    A coordinated movement of the screen and mask
+
+    Travel times are in seconds or None if the speed of the cover is not
+    known yet.   Delays are the seconds to wait before sending each command
+    """
+
+    entry: "AspectRatioEntry"
+    screen_travel: Optional[float]
+    mask_travel: Optional[float]
+    screen_delay: float
+    mask_delay: float
+
+    @property
+    def duration(self) -> Optional[float]:
+        """Predicted seconds from the start of the movement until completion"""
+        if self.screen_travel is None or self.mask_travel is None:
+            return None
+        return max(
+            self.screen_delay + self.screen_travel,
+            self.mask_delay + self.mask_travel,
+        )
+
+
+def estimate_travel_time(cover: Cover, target_pos: int) -> Optional[float]:
+    """Seconds for cover to reach target_pos at its learned speed"""
+    if not cover.is_moving and cover.pos == target_pos:
+        return 0.0
+    speed = cover.speed
+    if not speed:
+        return None
+    return abs(target_pos - cover.estimated_pos) / speed
+
+
+def geometry_key(
+    screen_max_drop: float, mask_max_drop: float, image_def: ImageDef
+) -> GeometryKey:
+    return (
+        screen_max_drop,
+        mask_max_drop,
+        image_def.bottom_border_height,
+        image_def.height,
+        image_def.aspect_ratio,
+    )
+
+
+@dataclass(frozen=True)
+class AspectRatioEntry:
+    """Screen and mask positions that produce an aspect ratio"""
+
+    aspect_ratio: float
+    screen_pos: int
+    mask_pos: int
+
+    @property
+    def screen_hex_pos(self) -> int:
+        return pos_to_hex_pos(self.screen_pos)
+
+    @property
+    def mask_hex_pos(self) -> int:
+        return pos_to_hex_pos(self.mask_pos)
+
+
+def pos_to_hex_pos(pos: int) -> int:
+    """Nearest hex position (0x00 to 0xFF) to pos (0 to 1000)"""
+    return round(pos * 0.255)
+
+
+def position_preference(screen_pos, mask_pos):
+    """
+    Rank of a (screen_pos, mask_pos) combination - lower is preferred
+
+    The screen lowest and then the mask highest, so that the mask does the
+    cropping.   Also works element-wise on numpy arrays (see CIWSolver)
+    """
+    return screen_pos * 1001 + (1000 - mask_pos)
+
+
+class AspectRatioTable:
+    """
+    Sorted lookup table from aspect ratio to (screen_pos, mask_pos)
+
+    Holds every achievable aspect ratio in the supported range with the
+    preferred combination of positions that produces it
+    A lookup finds the nearest achievable aspect ratio by bisection and then
+    returns the preferred entry (see position_preference) of those within
+    tolerance of it, which is the same rule as CIWSolver.solve
+    The preferred entry of a range is found from a sparse table of range
+    minima, so a lookup is O(log n)
+    """
+
+    def __init__(
+        self, key: GeometryKey, tolerance: float, entries: List[AspectRatioEntry]
+    ) -> None:
+        self.key = key
+        self.tolerance = tolerance
+        self.entries = sorted(entries, key=lambda entry: entry.aspect_ratio)
+        self.aspect_ratios = [entry.aspect_ratio for entry in self.entries]
+        self._preferred = _range_minima(
+            [
+                position_preference(entry.screen_pos, entry.mask_pos)
+                for entry in self.entries
+            ]
+        )
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @classmethod
+    def build(
+        cls,
+        screen_max_drop: float,
+        mask_max_drop: float,
+        image_def: ImageDef,
+        positions: Iterable[int] = HEX_QUANTISED_POSITIONS,
+        tolerance: float = 0.005,
+    ) -> "AspectRatioTable":
+        positions = sorted(set(positions))
+        image_width = image_def.width
+        mask_drops = [
+            (mask_pos, (1000 - mask_pos) * mask_max_drop / 1000.0)
+            for mask_pos in reversed(positions)
+        ]
+        # Combinations are visited in order of preference so the first one
+        # found for each aspect ratio is kept
+        entries: Dict[float, AspectRatioEntry] = {}
+        for screen_pos in positions:
+            screen_drop = (1000 - screen_pos) * screen_max_drop / 1000.0
+            for mask_pos, mask_drop in mask_drops:
+                image_height = calculate_image_height(screen_drop, mask_drop, image_def)
+                if image_height is None:
+                    continue
+                aspect_ratio = image_width / image_height
+                if not MIN_ASPECT_RATIO <= aspect_ratio <= MAX_ASPECT_RATIO:
+                    continue
+                if aspect_ratio not in entries:
+                    entries[aspect_ratio] = AspectRatioEntry(
+                        aspect_ratio, screen_pos, mask_pos
+                    )
+        key = geometry_key(screen_max_drop, mask_max_drop, image_def)
+        return cls(key, tolerance, list(entries.values()))
+
+    def lookup(self, target_aspect_ratio: float) -> Optional[AspectRatioEntry]:
+        """
+        Returns the preferred entry within tolerance of the nearest aspect ratio
+        """
+        check_aspect_ratio(target_aspect_ratio)
+        aspect_ratios = self.aspect_ratios
+        n = len(aspect_ratios)
+        if n == 0:
+            return None
+        i = bisect_left(aspect_ratios, target_aspect_ratio)
+        best_error = min(
+            abs(aspect_ratios[j] - target_aspect_ratio)
+            for j in (i - 1, i)
+            if 0 <= j < n
+        )
+        max_error = best_error + self.tolerance
+        lo = bisect_left(aspect_ratios, target_aspect_ratio - max_error)
+        hi = bisect_right(aspect_ratios, target_aspect_ratio + max_error)
+        # Settle the ends with the same comparison as CIWSolver.solve
+        while lo > 0 and abs(aspect_ratios[lo - 1] - target_aspect_ratio) <= max_error:
+            lo -= 1
+        while abs(aspect_ratios[lo] - target_aspect_ratio) > max_error:
+            lo += 1
+        while hi < n and abs(aspect_ratios[hi] - target_aspect_ratio) <= max_error:
+            hi += 1
+        while abs(aspect_ratios[hi - 1] - target_aspect_ratio) > max_error:
+            hi -= 1
+        return self.entries[self._preferred_index(lo, hi)]
+
+    def _preferred_index(self, lo: int, hi: int) -> int:
+        """Index of the preferred entry of entries[lo:hi]"""
+        level = (hi - lo).bit_length() - 1
+        values, indices = self._preferred[level]
+        a = lo
+        b = hi - (1 << level)
+        return indices[a] if values[a] <= values[b] else indices[b]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "key": list(self.key),
+            "tolerance": self.tolerance,
+            "entries": [
+                [entry.aspect_ratio, entry.screen_pos, entry.mask_pos]
+                for entry in self.entries
+            ],
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "AspectRatioTable":
+        key = tuple(data["key"])
+        if len(key) != 5:
+            raise ValueError("Invalid aspect ratio table key")
+        return cls(
+            key,  # type: ignore[arg-type]
+            data["tolerance"],
+            [AspectRatioEntry(ar, s, m) for ar, s, m in data["entries"]],
+        )
+
+    def save(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f)
+
+    @classmethod
+    def load(cls, path: str) -> "AspectRatioTable":
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+
+def _range_minima(values: List[int]) -> List[Tuple[List[int], List[int]]]:
+    """
+    Sparse table of the minima of values
+
+    Level k holds the minimum (and its index) of each run of 2**k values
+    """
+    levels = [(values, list(range(len(values))))]
+    width = 1
+    while width * 2 <= len(values):
+        prev_values, prev_indices = levels[-1]
+        level_values: List[int] = []
+        level_indices: List[int] = []
+        for a in range(len(prev_values) - width):
+            b = a + width
+            if prev_values[a] <= prev_values[b]:
+                level_values.append(prev_values[a])
+                level_indices.append(prev_indices[a])
+            else:
+                level_values.append(prev_values[b])
+                level_indices.append(prev_indices[b])
+        levels.append((level_values, level_indices))
+        width *= 2
+    return levels
 
 
 def calculate_image_height(
@@ -36,6 +36,8 @@ class CIWPositionLogger(AsyncObserver):
         self.helper.mask.detach(self)
 
     def log(self, cover: Cover):
+        if not _LOGGER.isEnabledFor(self.loglevel):
+            return
         _LOGGER.log(
             self.loglevel,
             f"cover: {cover.name}; "
@@ -0,0 +1,202 @@
+"""
+Vectorised CIW geometry for planning screen and mask positions
+
+Evaluates the image geometry of a CIW screen with a mask across whole grids
+of (screen_pos, mask_pos) at once and finds the position pair that best
+matches a requested aspect ratio
+
+Requires numpy, which is an optional dependency of the package::
+
+    pip install nicett6-pp81381[numpy]
+"""
+
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+import numpy.typing as npt
+
+from nicett6.ciw_helper import position_preference
+from nicett6.image_def import ImageDef
+from nicett6.utils import MAX_ASPECT_RATIO, MIN_ASPECT_RATIO, check_aspect_ratio
+
+FloatArray = npt.NDArray[np.float64]
+IntArray = npt.NDArray[np.int_]
+
+HEX_POSITIONS: IntArray = np.arange(256)
+
+
+def hex_pos_to_pos(hex_pos: npt.ArrayLike) -> IntArray:
+    """Convert hex positions (0x00 to 0xFF) to positions (0 to 1000)"""
+    return np.round(np.asarray(hex_pos) / 0.255).astype(np.int_)
+
+
+def pos_to_drop(pos: npt.ArrayLike, max_drop: float) -> FloatArray:
+    """Vectorised equivalent of Cover.drop"""
+    return (1000 - np.asarray(pos, dtype=np.float64)) * max_drop / 1000.0
+
+
+@dataclass(frozen=True)
+class CIWGeometry:
+    """
+    Image geometry arrays as calculated by CIWHelper
+
+    Elements where the image is not visible are NaN
+    """
+
+    image_width: float
+    image_height: FloatArray
+
+    @property
+    def image_is_visible(self) -> npt.NDArray[np.bool_]:
+        return ~np.isnan(self.image_height)
+
+    @property
+    def image_diagonal(self) -> FloatArray:
+        return np.hypot(self.image_width, self.image_height)
+
+    @property
+    def image_area(self) -> FloatArray:
+        return self.image_width * self.image_height
+
+    @property
+    def aspect_ratio(self) -> FloatArray:
+        return self.image_width / self.image_height
+
+
+def calculate_geometry(
+    screen_drop: npt.ArrayLike,
+    mask_drop: npt.ArrayLike,
+    image_def: ImageDef,
+) -> CIWGeometry:
+    """Vectorised equivalent of ciw_helper.calculate_image_height and friends"""
+    image_height = np.minimum(
+        np.asarray(screen_drop, dtype=np.float64)
+        - image_def.bottom_border_height
+        - np.asarray(mask_drop, dtype=np.float64),
+        image_def.height,
+    )
+    visible_threshold = 0.1 * image_def.height
+    image_height = np.where(image_height > visible_threshold, image_height, np.nan)
+    return CIWGeometry(image_def.width, image_height)
+
+
+def evaluate_grid(
+    screen_pos: npt.ArrayLike,
+    mask_pos: npt.ArrayLike,
+    screen_max_drop: float,
+    mask_max_drop: float,
+    image_def: ImageDef,
+) -> CIWGeometry:
+    """
+    Evaluate the geometry for every combination of screen_pos and mask_pos
+
+    The result arrays have shape (len(screen_pos), len(mask_pos))
+    """
+    screen_drop = pos_to_drop(screen_pos, screen_max_drop)[:, np.newaxis]
+    mask_drop = pos_to_drop(mask_pos, mask_max_drop)[np.newaxis, :]
+    return calculate_geometry(screen_drop, mask_drop, image_def)
+
+
+@dataclass(frozen=True)
+class CIWSolution:
+    """Screen and mask positions that produce an aspect ratio"""
+
+    screen_hex_pos: int
+    mask_hex_pos: int
+    screen_pos: int
+    mask_pos: int
+    aspect_ratio: float
+    image_height: float
+
+
+class CIWSolver:
+    """
+    Finds the screen and mask positions for a target aspect ratio
+
+    The geometry of every combination of hex positions is calculated once
+    on construction so that each solve is a handful of array operations
+
+    Only aspect ratios in the supported range are achievable.   Of the pairs
+    within tolerance of the best achievable aspect ratio, the preferred one
+    (see ciw_helper.position_preference) is chosen - the same rule as
+    ciw_helper.AspectRatioTable - or the one that needs the least movement
+    if the current positions are given
+    """
+
+    def __init__(
+        self,
+        screen_max_drop: float,
+        mask_max_drop: float,
+        image_def: ImageDef,
+        hex_positions: npt.ArrayLike = HEX_POSITIONS,
+    ) -> None:
+        self.screen_max_drop = screen_max_drop
+        self.mask_max_drop = mask_max_drop
+        self.image_def = image_def
+        self.hex_positions: IntArray = np.asarray(hex_positions, dtype=np.int_)
+        self.positions: IntArray = hex_pos_to_pos(self.hex_positions)
+        self.geometry = evaluate_grid(
+            self.positions,
+            self.positions,
+            screen_max_drop,
+            mask_max_drop,
+            image_def,
+        )
+        aspect_ratio = self.geometry.aspect_ratio
+        self._aspect_ratio: FloatArray = np.where(
+            (aspect_ratio >= MIN_ASPECT_RATIO) & (aspect_ratio <= MAX_ASPECT_RATIO),
+            aspect_ratio,
+            np.inf,
+        )
+        screen_grid, mask_grid = np.meshgrid(
+            self.positions, self.positions, indexing="ij"
+        )
+        self._screen_grid: IntArray = screen_grid
+        self._mask_grid: IntArray = mask_grid
+
+    def solve(
+        self,
+        target_aspect_ratio: float,
+        tolerance: float = 0.005,
+        current: Optional[Tuple[int, int]] = None,
+    ) -> Optional[CIWSolution]:
+        """
+        Find the (screen, mask) positions closest to target_aspect_ratio
+
+        current is the current (screen_pos, mask_pos), if known
+        Returns None if no combination produces a visible image
+        """
+        check_aspect_ratio(target_aspect_ratio)
+        error = np.abs(self._aspect_ratio - target_aspect_ratio)
+        best_error = error.min()
+        if not np.isfinite(best_error):
+            return None
+        candidates = error <= best_error + tolerance
+        if current is None:
+            cost = position_preference(self._screen_grid, self._mask_grid)
+        else:
+            cost = np.maximum(
+                np.abs(self._screen_grid - current[0]),
+                np.abs(self._mask_grid - current[1]),
+            )
+        cost = np.where(candidates, cost, np.iinfo(np.int_).max)
+        min_cost = cost.min()
+        # Break ties in favour of the most accurate aspect ratio
+        i, j = np.unravel_index(
+            np.argmin(np.where(cost == min_cost, error, np.inf)), error.shape
+        )
+        return CIWSolution(
+            screen_hex_pos=int(self.hex_positions[i]),
+            mask_hex_pos=int(self.hex_positions[j]),
+            screen_pos=int(self.positions[i]),
+            mask_pos=int(self.positions[j]),
+            aspect_ratio=float(self.geometry.aspect_ratio[i, j]),
+            image_height=float(self.geometry.image_height[i, j]),
+        )
+
+    def solve_many(
+        self, target_aspect_ratios: Iterable[float], tolerance: float = 0.005
+    ) -> List[Optional[CIWSolution]]:
+        """Solve for each of target_aspect_ratios"""
+        return [self.solve(ar, tolerance) for ar in target_aspect_ratios]
@@ -1,15 +1,35 @@
 import logging
-from asyncio import CancelledError, Event, Lock, Task, create_task
-from asyncio import sleep as asyncio_sleep
+from asyncio import Event, Task, TimeoutError, create_task
 from asyncio import sleep as notifier_asyncio_sleep
+from asyncio import wait, wait_for
+from dataclasses import dataclass
+from heapq import heappop, heappush
+from itertools import count
 from time import perf_counter
-from typing import Iterable
+from typing import Dict, Iterable, List, Optional, Tuple
 
-from nicett6.utils import AsyncObservable, check_pos
+from nicett6.utils import AsyncObservable, AsyncObserver, check_pos
 
 _LOGGER = logging.getLogger(__name__)
 
-POLLING_INTERVAL = 0.2
+
+@dataclass(frozen=True)
+class CoverState:
+    """
+    Immutable snapshot of the state of a Cover
+
+    Taken each time the state of the Cover changes (i.e. when it moves or
+    becomes idle) so the derived flags are computed once per change
+    """
+
+    pos: int
+    prev_pos: int
+    drop: float
+    is_moving: bool
+    is_going_up: bool
+    is_going_down: bool
+    is_fully_up: bool
+    is_fully_down: bool
 
 
 class Cover(AsyncObservable):
@@ -18,6 +38,9 @@ class Cover(AsyncObservable):
     MOVEMENT_THRESHOLD_INTERVAL: float = 2.7
     IS_FULLY_UP_POS: int = 950
     IS_FULLY_DOWN_POS: int = 5
+    SPEED_SMOOTHING: float = 0.3
+    # estimated_pos is not extrapolated further than this past the last POS
+    MAX_EXTRAPOLATION_INTERVAL: float = 1.0
 
     def __init__(self, name: str, max_drop: float) -> None:
         super().__init__()
@@ -26,9 +49,18 @@ class Cover(AsyncObservable):
         self._pos: int = 1000
         self._prev_movement = perf_counter() - self.MOVEMENT_THRESHOLD_INTERVAL
         self._prev_pos: int = self._pos
+        self._pos_time: float = self._prev_movement
+        self._pos_reported: bool = False
+        self._target_pos: Optional[int] = None
+        self._stopping: bool = False
+        self._speed: Optional[float] = None
         self._notifier = PostMovementNotifier(self)
+        self._state: CoverState = self._make_state(False)
         self.idle_event = Event()
         self.idle_event.set()
+        # Set when idle_event was set by cancelling the idle deadline
+        # rather than by set_idle, so the motion did not complete
+        self._idle_cancelled: bool = False
 
     def __repr__(self):
         return (
@@ -38,20 +70,42 @@ class Cover(AsyncObservable):
         )
 
     def log(self, msg: str, loglevel: int = logging.DEBUG) -> None:
+        if not _LOGGER.isEnabledFor(loglevel):
+            return
+        state = self._state
         _LOGGER.log(
             loglevel,
             f"{msg}; "
             f"name: {self.name}; "
             f"max_drop: {self.max_drop}; "
-            f"pos: {self.pos}; "
-            f"_prev_pos: {self._prev_pos}; "
-            f"is_moving: {self.is_moving}; "
-            f"is_going_down: {self.is_going_down}; "
-            f"is_going_up: {self.is_going_up}; "
-            f"is_fully_down: {self.is_fully_down}; "
-            f"is_fully_up: {self.is_fully_up}; ",
+            f"pos: {state.pos}; "
+            f"_prev_pos: {state.prev_pos}; "
+            f"is_moving: {state.is_moving}; "
+            f"is_going_down: {state.is_going_down}; "
+            f"is_going_up: {state.is_going_up}; "
+            f"is_fully_down: {state.is_fully_down}; "
+            f"is_fully_up: {state.is_fully_up}; ",
+        )
+
+    def _make_state(self, is_moving: bool) -> CoverState:
+        pos = self._pos
+        prev_pos = self._prev_pos
+        return CoverState(
+            pos=pos,
+            prev_pos=prev_pos,
+            drop=(1000 - pos) * self.max_drop / 1000.0,
+            is_moving=is_moving,
+            is_going_up=is_moving and pos > prev_pos,
+            is_going_down=is_moving and pos < prev_pos,
+            is_fully_up=not is_moving and pos > self.IS_FULLY_UP_POS,
+            is_fully_down=not is_moving and pos < self.IS_FULLY_DOWN_POS,
         )
 
+    @property
+    def state(self) -> CoverState:
+        """Snapshot of the state as of the last movement or set_idle"""
+        return self._state
+
     @property
     def pos(self) -> int:
         """Native position: from 0 (fully down) to 1000 (fully up)"""
@@ -62,16 +116,102 @@ class Cover(AsyncObservable):
         prev_pos = self._pos  # Preserve state in case of exception
         self._pos = check_pos(f"{self.name} pos", value)
         self._prev_pos = prev_pos
+        now = perf_counter()
+        self._learn_speed(prev_pos, now)
+        self._pos_time = now
+        self._pos_reported = True
+        self._prev_movement = now
         await self.moved()
 
+    def _learn_speed(self, prev_pos: int, now: float) -> None:
+        """Update the smoothed speed from consecutive positions of a movement"""
+        if now - self._prev_movement >= self.MOVEMENT_THRESHOLD_INTERVAL:
+            return  # First position of a movement
+        if not self._pos_reported:
+            return  # First position after an ack - includes the start-up lag
+        elapsed = now - self._pos_time
+        if elapsed <= 0 or self._pos == prev_pos:
+            return
+        observed = abs(self._pos - prev_pos) / elapsed
+        if self._speed is None:
+            self._speed = observed
+        else:
+            self._speed += self.SPEED_SMOOTHING * (observed - self._speed)
+
     @property
     def drop(self) -> float:
         """Drop in length units from 0.0 when fully up to max_drop when fully down"""
         return (1000 - self._pos) * self.max_drop / 1000.0
 
+    @property
+    def speed(self) -> Optional[float]:
+        """Speed learned from previous movements in positions per second"""
+        return self._speed
+
+    @speed.setter
+    def speed(self, speed: Optional[float]) -> None:
+        """Seed the speed, e.g. from a calibration store"""
+        self._speed = speed
+
+    @property
+    def target_pos(self) -> Optional[int]:
+        """Position that the cover is moving towards, if known"""
+        return self._target_pos
+
+    @property
+    def estimated_pos(self) -> float:
+        """
+        Position extrapolated from the last POS message using the learned speed
+
+        Returns pos if the cover isn't moving, is stopping or the speed or
+        direction is not known yet.   Never overshoots the target position
+        and extrapolates no more than MAX_EXTRAPOLATION_INTERVAL seconds past
+        the last POS, so a cover that stops without warning (e.g. from the
+        physical remote) is not overshot by much
+        """
+        pos = self._pos
+        speed = self._speed
+        now = perf_counter()
+        if (
+            speed is None
+            or self._stopping
+            or now - self._prev_movement >= self.MOVEMENT_THRESHOLD_INTERVAL
+        ):
+            return pos
+        target_pos = self._target_pos
+        if target_pos is not None:
+            limit = target_pos
+        elif pos != self._prev_pos:
+            limit = 1000 if pos > self._prev_pos else 0
+        else:
+            return pos
+        distance = speed * min(now - self._pos_time, self.MAX_EXTRAPOLATION_INTERVAL)
+        if limit > pos:
+            return min(pos + distance, limit)
+        return max(pos - distance, limit)
+
+    @property
+    def estimated_drop(self) -> float:
+        """Drop corresponding to estimated_pos"""
+        return (1000 - self.estimated_pos) * self.max_drop / 1000.0
+
+    @property
+    def eta(self) -> Optional[float]:
+        """Estimated seconds until the cover reaches target_pos, if known"""
+        if self._target_pos is None or not self._speed:
+            return None
+        return abs(self._target_pos - self.estimated_pos) / self._speed
+
     async def moved(self) -> None:
         """Called to indicate movement"""
-        self._prev_movement = perf_counter()
+        now = perf_counter()
+        if now - self._prev_movement >= self.MOVEMENT_THRESHOLD_INTERVAL:
+            self._pos_time = now  # Starting from rest
+            self._pos_reported = False
+            self._stopping = False
+        self._prev_movement = now
+        self._state = self._make_state(True)
+        self._idle_cancelled = False
         self.idle_event.clear()
         await self._notifier.moved()
         await self.notify_observers()
@@ -80,11 +220,14 @@ class Cover(AsyncObservable):
         """Called to indicate that movement has finished"""
         self._prev_pos = self._pos
         self._prev_movement = perf_counter() - self.MOVEMENT_THRESHOLD_INTERVAL
+        self._target_pos = None
+        self._state = self._make_state(False)
+        self._idle_cancelled = False
         self.idle_event.set()
         await self.notify_observers()
 
     async def wait_idle(self) -> None:
-        _LOGGER.debug(f"State of idle_event is {self.idle_event.is_set()}")
+        _LOGGER.debug("State of idle_event is %s", self.idle_event.is_set())
         await self.idle_event.wait()
 
     @property
@@ -129,38 +272,220 @@ class Cover(AsyncObservable):
 
     async def set_going_up(self) -> None:
         """Force the state to is_going_up"""
-        self._prev_pos = self._pos - 1
-        await self.moved()
+        await self._set_going(self._pos - 1, 1000)
 
     async def set_going_down(self) -> None:
         """Force the state to is_going_down"""
-        self._prev_pos = self._pos + 1
-        await self.moved()
+        await self._set_going(self._pos + 1, 0)
 
     async def set_target_pos_hint(self, target_pos: int) -> None:
         """ "Force the state to is_going_up/down based on target_pos"""
         if target_pos < self._pos:
-            await self.set_going_down()
+            await self._set_going(self._pos + 1, target_pos)
         elif target_pos > self._pos:
-            await self.set_going_up()
+            await self._set_going(self._pos - 1, target_pos)
+
+    async def _set_going(self, prev_pos: int, target_pos: int) -> None:
+        self._prev_pos = prev_pos
+        self._target_pos = target_pos
+        self._stopping = False
+        await self.moved()
+
+    async def set_stopping(self) -> None:
+        """
+        Called when a stop command has been acknowledged
+
+        Forgets the target position and stops extrapolating estimated_pos
+        The cover keeps moving (is_moving) until the final POS has arrived
+        and set_idle is called
+        """
+        self._target_pos = None
+        self._stopping = True
+
+    def set_idle_scheduler(self, scheduler: "IdleScheduler") -> None:
+        """Track the idle deadline of the cover with a (shared) scheduler"""
+        prev_scheduler = self._notifier.scheduler
+        if scheduler is prev_scheduler:
+            return
+        deadline = prev_scheduler.deadline(self)
+        prev_scheduler.cancel(self, release_waiters=False)
+        self._notifier = PostMovementNotifier(self, scheduler)
+        if deadline is not None:
+            scheduler.schedule(self, deadline)
+
+    def set_movement_threshold_interval(self, interval: float) -> None:
+        """
+        Override MOVEMENT_THRESHOLD_INTERVAL for this cover
+
+        An idle cover stays idle whether the interval is longer or shorter
+        """
+        self.MOVEMENT_THRESHOLD_INTERVAL = interval
+        if not self._state.is_moving:
+            self._prev_movement = min(self._prev_movement, perf_counter() - interval)
+            self._state = self._make_state(False)
 
     async def stop_notifier(self) -> None:
         await self._notifier.cancel_task()
 
+    def _release_idle_waiters(self) -> None:
+        """Set idle_event for a cover whose idle deadline has been cancelled"""
+        self._idle_cancelled = True
+        self.idle_event.set()
+
 
-async def wait_for_motion_to_complete(covers: Iterable[Cover]) -> None:
+class CoverStateObserver(AsyncObserver):
+    """An observer of Covers that is given the CoverState snapshot directly"""
+
+    async def update(self, observable: AsyncObservable) -> None:
+        if isinstance(observable, Cover):
+            await self.update_state(observable, observable.state)
+
+    async def update_state(self, cover: Cover, state: CoverState) -> None:
+        pass
+
+
+async def wait_for_motion_to_complete(
+    covers: Iterable[Cover], timeout: Optional[float] = None
+) -> Dict[Cover, bool]:
     """
-    Poll for motion to complete
+    Wait for motion to complete
 
-    Make sure that Cover.moving() is called when movement
+    Waits on the idle_event of the covers, which is set by the
+    PostMovementNotifier once a cover has stopped moving, or when its idle
+    deadline is cancelled (e.g. by Cover.stop_notifier)
+    Only returns once all of the covers are idle at the same time, so if a
+    cover starts moving again while waiting for another then the wait goes on
+    If timeout (seconds) is specified then gives up waiting after timeout
+
+    Returns a dict indicating whether each cover completed its motion
+    (False for a cover whose idle deadline was cancelled, as it was never
+    set to idle and its state may still show it as moving)
+
+    Make sure that Cover.moved() is called when movement
     is initiated for this method to work reliably
     (see TT6Cover.handle_response_message)
-    Has the side effect of notifying observers of the idle state
     """
+    covers = list(covers)
+    try:
+        await wait_for(_wait_for_idle_events(covers), timeout)
+    except TimeoutError:
+        pass
+    return {
+        cover: cover.idle_event.is_set() and not cover._idle_cancelled
+        for cover in covers
+    }
+
+
+async def _wait_for_idle_events(covers: List[Cover]) -> None:
     while True:
-        await asyncio_sleep(POLLING_INTERVAL)
-        if all([not cover.is_moving for cover in covers]):
+        moving = [cover for cover in covers if not cover.idle_event.is_set()]
+        if not moving:
             return
+        waiters = [create_task(cover.idle_event.wait()) for cover in moving]
+        try:
+            await wait(waiters)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+
+
+class IdleScheduler:
+    """
+    Calls set_idle on covers once they have stopped moving
+
+    Tracks an idle deadline for every moving cover in a heap serviced by a
+    single timer task, so a movement only costs a dict update (or a heap
+    push when the deadline is brought forward) rather than a new task
+
+    Heap entries are invalidated lazily: an entry whose deadline no longer
+    matches the cover's current deadline is re-pushed or discarded when it
+    reaches the top of the heap
+    """
+
+    def __init__(self) -> None:
+        self._deadlines: Dict[Cover, float] = {}
+        self._heap: List[Tuple[float, int, Cover]] = []
+        self._seq = count()
+        self._task: Task | None = None
+        self._wake_at: float | None = None
+
+    def __contains__(self, cover: Cover) -> bool:
+        return cover in self._deadlines
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def deadline(self, cover: Cover) -> Optional[float]:
+        """The time (per perf_counter) at which cover becomes idle, if scheduled"""
+        return self._deadlines.get(cover)
+
+    def schedule(self, cover: Cover, deadline: float) -> None:
+        """Set the time (per perf_counter) at which cover becomes idle"""
+        prev_deadline = self._deadlines.get(cover)
+        self._deadlines[cover] = deadline
+        if prev_deadline is not None and prev_deadline <= deadline:
+            return  # The existing heap entry will be re-pushed when it expires
+        heappush(self._heap, (deadline, next(self._seq), cover))
+        if self._task is None or self._task.done():
+            self._task = create_task(self._run())
+        elif self._wake_at is not None and deadline < self._wake_at:
+            self._task.cancel()
+            self._task = create_task(self._run())
+
+    def cancel(self, cover: Cover, release_waiters: bool = True) -> None:
+        """
+        Forget the deadline for cover without calling set_idle
+
+        Unless release_waiters is False, the idle_event of the cover is set
+        (without notifying observers) so that wait_for_motion_to_complete
+        doesn't wait forever for a set_idle that will never come - it reports
+        the cover as not having completed its motion
+        """
+        if self._deadlines.pop(cover, None) is not None and release_waiters:
+            cover._release_idle_waiters()
+        if not self._deadlines:
+            self._heap.clear()
+            self._stop_task()
+
+    def stop(self) -> None:
+        """Stop the timer task and cancel all deadlines, releasing any waiters"""
+        for cover in self._deadlines:
+            cover._release_idle_waiters()
+        self._deadlines.clear()
+        self._heap.clear()
+        self._stop_task()
+
+    def _stop_task(self) -> None:
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        self._task = None
+        self._wake_at = None
+
+    async def _run(self) -> None:
+        heap = self._heap
+        deadlines = self._deadlines
+        while heap:
+            deadline, _, cover = heap[0]
+            delay = deadline - perf_counter()
+            if delay > 0:
+                self._wake_at = deadline
+                await notifier_asyncio_sleep(delay)
+                self._wake_at = None
+                continue
+            heappop(heap)
+            current_deadline = deadlines.get(cover)
+            if current_deadline is None or current_deadline < deadline:
+                continue  # Cancelled, or superseded by an earlier entry
+            if current_deadline > deadline:
+                heappush(heap, (current_deadline, next(self._seq), cover))
+                continue
+            del deadlines[cover]
+            try:
+                await cover.set_idle()
+            except Exception:
+                _LOGGER.exception("set_idle failed for %s", cover.name)
+            else:
+                cover.log("PostMovementNotifier set to idle", logging.DEBUG)
 
 
 class PostMovementNotifier:
@@ -169,43 +494,34 @@ class PostMovementNotifier:
 
     The cover is considered idle if it hasn't moved for
     Cover.MOVEMENT_THRESHOLD_INTERVAL + PostMovementNotifier.POST_MOVEMENT_ALLOWANCE seconds
+
+    The deadline is tracked by an IdleScheduler, which may be shared
+    between covers (see CoverManager); a private one is used by default
     """
 
     POST_MOVEMENT_ALLOWANCE = 0.05
 
-    def __init__(self, cover: Cover) -> None:
+    def __init__(self, cover: Cover, scheduler: Optional[IdleScheduler] = None) -> None:
         self.cover = cover
-        self._task_lock: Lock = Lock()
-        self._task: Task | None = None
+        self.scheduler = scheduler if scheduler is not None else IdleScheduler()
+
+    @property
+    def is_pending(self) -> bool:
+        """Returns True if set_idle is due to be called"""
+        return self.cover in self.scheduler
 
     async def moved(self) -> None:
         """
-        Manage a task that will call set_idle on the cover after a short delay
+        Schedule a call to set_idle on the cover after a short delay
 
-        Reset the task if movement happens again while a task is running
+        Pushes the deadline back if movement happens again before then
         """
-        async with self._task_lock:
-            await self._cancel_task()
-            self._task = create_task(self._set_idle_after_delay())
-            self.cover.log("PostMovementNotifier task started", logging.DEBUG)
-
-    async def _set_idle_after_delay(self) -> None:
-        await notifier_asyncio_sleep(
-            Cover.MOVEMENT_THRESHOLD_INTERVAL + self.POST_MOVEMENT_ALLOWANCE
+        self.scheduler.schedule(
+            self.cover,
+            perf_counter()
+            + self.cover.MOVEMENT_THRESHOLD_INTERVAL
+            + self.POST_MOVEMENT_ALLOWANCE,
         )
-        await self.cover.set_idle()
-        self.cover.log("PostMovementNotifier set to idle", logging.DEBUG)
 
     async def cancel_task(self) -> None:
-        async with self._task_lock:
-            await self._cancel_task()
-
-    async def _cancel_task(self) -> None:
-        """Cancel task - make sure you have acquired the lock first"""
-        if self._task is not None:
-            if not self._task.done():
-                self._task.cancel()
-            try:
-                await self._task
-            except CancelledError:
-                pass
+        self.scheduler.cancel(self.cover)
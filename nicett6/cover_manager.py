@@ -1,7 +1,8 @@
 import logging
 from typing import Dict, Optional
 
-from nicett6.cover import Cover
+from nicett6.calibration import CalibrationStore
+from nicett6.cover import Cover, IdleScheduler
 from nicett6.decode import (
     AckResponse,
     HexPosResponse,
@@ -9,6 +10,7 @@ from nicett6.decode import (
     PctPosResponse,
     ResponseMessageType,
 )
+from nicett6.serial import ReaderFilter
 from nicett6.tt6_connection import TT6Connection, TT6Reader, TT6Writer
 from nicett6.tt6_connection import open as open_tt6
 from nicett6.tt6_cover import TT6Cover
@@ -18,12 +20,20 @@ _LOGGER = logging.getLogger(__name__)
 
 
 class CoverManager:
-    def __init__(self, serial_port: str):
+    MESSAGE_TRACKER_FILTER = ReaderFilter(
+        types=(AckResponse, HexPosResponse, PctPosResponse, PctAckResponse)
+    )
+
+    def __init__(
+        self, serial_port: str, calibration: Optional[CalibrationStore] = None
+    ):
         self._conn: Optional[TT6Connection] = None
         self._serial_port: str = serial_port
         self._message_tracker_reader: Optional[TT6Reader] = None
         self._writer: Optional[TT6Writer] = None
         self._tt6_covers_dict: Dict[TTBusDeviceAddress, TT6Cover] = {}
+        self._idle_scheduler: IdleScheduler = IdleScheduler()
+        self._calibration: Optional[CalibrationStore] = calibration
 
     @property
     def serial_port(self):
@@ -33,6 +43,14 @@ class CoverManager:
     def tt6_covers(self):
         return self._tt6_covers_dict.values()
 
+    @property
+    def idle_scheduler(self) -> IdleScheduler:
+        return self._idle_scheduler
+
+    @property
+    def calibration(self) -> Optional[CalibrationStore]:
+        return self._calibration
+
     @property
     def conn(self) -> TT6Connection:
         if self._conn is None:
@@ -53,7 +71,7 @@ class CoverManager:
 
         # NOTE: reader is created here rather than in self.message_tracker
         # to ensure that all messages from this moment on are captured
-        reader = self._conn.add_reader()
+        reader = self._conn.add_reader(self.MESSAGE_TRACKER_FILTER)
         assert isinstance(reader, TT6Reader)
         self._message_tracker_reader = reader
 
@@ -69,6 +87,8 @@ class CoverManager:
 
     async def close(self) -> None:
         await self.remove_covers()
+        if self._calibration is not None and self._calibration.path is not None:
+            self._calibration.save()
         if self._conn is not None:
             if self._message_tracker_reader is not None:
                 self._conn.remove_reader(self._message_tracker_reader)
@@ -91,14 +111,18 @@ class CoverManager:
     async def message_tracker(self) -> None:
         _LOGGER.debug("message_tracker started")
         if self._message_tracker_reader is not None:
-            async for msg in self._message_tracker_reader:
-                _LOGGER.debug("msg:%s", msg)
-                await self._handle_response_message(msg)
+            async for msgs in self._message_tracker_reader.batches():
+                for msg in msgs:
+                    _LOGGER.debug("msg:%s", msg)
+                    await self._handle_response_message(msg)
         _LOGGER.debug("message tracker finished")
 
     async def add_cover(self, tt_addr: TTBusDeviceAddress, cover: Cover) -> TT6Cover:
         if self._writer is None:
             raise RuntimeError("add_cover called when writer not initialised")
+        cover.set_idle_scheduler(self._idle_scheduler)
+        if self._calibration is not None:
+            self._calibration.attach(tt_addr, cover)
         tt6_cover = TT6Cover(tt_addr, cover, self._writer)
         self._tt6_covers_dict[tt_addr] = tt6_cover
         await tt6_cover.send_pos_request()
@@ -108,3 +132,4 @@ class CoverManager:
         for tt6_cover in self._tt6_covers_dict.values():
             await tt6_cover.stop_notifier()
         self._tt6_covers_dict = {}
+        self._idle_scheduler.stop()
@@ -1,7 +1,8 @@
 from __future__ import annotations
 
+import re
 from dataclasses import dataclass
-from typing import Callable, Union
+from typing import Callable, Dict, Iterable, List, Tuple, Union
 
 from nicett6.command_code import CommandCode
 from nicett6.ttbus_device import TTBusDeviceAddress
@@ -12,7 +13,7 @@ class InvalidResponseError(Exception):
     pass
 
 
-@dataclass
+@dataclass(slots=True)
 class AckResponse:
     tt_addr: TTBusDeviceAddress
     cmd_code: CommandCode
@@ -21,7 +22,7 @@ class AckResponse:
         return f"{type(self).__name__}({self.tt_addr}, {self.cmd_code})"
 
 
-@dataclass
+@dataclass(slots=True)
 class HexPosResponse:
     tt_addr: TTBusDeviceAddress
     cmd_code: CommandCode
@@ -31,7 +32,7 @@ class HexPosResponse:
         return f"{type(self).__name__}({self.tt_addr}, {self.cmd_code}, {self.hex_pos:02X})"
 
 
-@dataclass
+@dataclass(slots=True)
 class PctPosResponse:
     tt_addr: TTBusDeviceAddress
     pos: int
@@ -40,7 +41,7 @@ class PctPosResponse:
         return f"{type(self).__name__}({self.tt_addr}, {self.pos})"
 
 
-@dataclass
+@dataclass(slots=True)
 class PctAckResponse:
     tt_addr: TTBusDeviceAddress
     pos: int
@@ -49,7 +50,7 @@ class PctAckResponse:
         return f"{type(self).__name__}({self.tt_addr}, {self.pos})"
 
 
-@dataclass
+@dataclass(slots=True)
 class InformationalResponse:
     info: str
 
@@ -57,7 +58,7 @@ class InformationalResponse:
         return f"{type(self).__name__}({self.info})"
 
 
-@dataclass
+@dataclass(slots=True)
 class ErrorResponse:
     error: str
 
@@ -121,11 +122,147 @@ def _decode_web_response(args: list[str], line: str) -> ResponseMessageType:
         raise InvalidResponseError()
 
 
+def _make_hex_table() -> Dict[bytes, int]:
+    """Map every 1 or 2 digit hex token (either case) to its value"""
+    table: Dict[bytes, int] = {}
+    for value in range(0x100):
+        for fmt in ("{:02X}", "{:02x}", "{:X}", "{:x}"):
+            table[fmt.format(value).encode("utf-8")] = value
+    return table
+
+
+_HEX_TABLE: Dict[bytes, int] = _make_hex_table()
+
+_COMMAND_CODES: Dict[int, CommandCode] = {code.value: code for code in CommandCode}
+
+_HEX_POS_COMMAND_CODES = {CommandCode.READ_POS, CommandCode.MOVE_POS}
+
+_PCT_TABLE: Dict[bytes, int] = {
+    f"{pct:04d}".encode("utf-8"): pct for pct in range(1001)
+}
+
+# Fast path pattern for the well formed lines that make up nearly all traffic
+_FAST_PATH_PATTERN = re.compile(
+    rb"(?:"
+    rb"POS ([*#]) (([0-9A-Fa-f]{1,2}) ([0-9A-Fa-f]{2})) ([0-9]{4}) FFFF FF"
+    rb"|"
+    rb"RSP ([0-9A-Fa-f]{1,2}) ([0-9A-Fa-f]{1,2}) ([0-9A-Fa-f]{1,2})"
+    rb"(?: ([0-9A-Fa-f]{1,2}))?"
+    rb")\r\Z"
+)
+
+# Layout of a POS line with a two digit address: b"POS * 03 04 0500 FFFF FF\r"
+# Once the pattern has matched a line, the b"* 03 04 " field is added to
+# _POS_FIELD_TABLE so that later lines can be decoded without tokenising
+_POS_LINE_LEN = 25
+_POS_LINE_HEAD = b"POS "
+_POS_LINE_TAIL = b" FFFF FF\r"
+_POS_FIELD_TABLE: Dict[
+    bytes,
+    Tuple[Callable[[TTBusDeviceAddress, int], ResponseMessageType], TTBusDeviceAddress],
+] = {}
+
+# Whole lines that have been decoded by the fast path, mapped to the message
+# class and constructor arguments, so that a repeated line costs one lookup
+# A moving cover repeats the same few hundred lines so this stays small, but
+# it stops growing at _LINE_TABLE_MAX_SIZE to bound memory in any case
+# Both tables are emptied by Decode.cache_clear()
+_LINE_TABLE_MAX_SIZE = 16384
+_LINE_TABLE: Dict[bytes, Tuple[Callable[..., ResponseMessageType], Tuple]] = {}
+
+
+def _remember_line(
+    line: bytes, factory: Callable[..., ResponseMessageType], *args
+) -> ResponseMessageType:
+    if len(_LINE_TABLE) < _LINE_TABLE_MAX_SIZE:
+        _LINE_TABLE[line] = (factory, args)
+    return factory(*args)
+
+
+def _fast_decode(line_bytes: bytes) -> ResponseMessageType | None:
+    """Decode a remembered or well formed RSP, POS * or POS # line or return None"""
+    key = line_bytes if isinstance(line_bytes, bytes) else bytes(line_bytes)
+    entry = _LINE_TABLE.get(key)
+    if entry is not None:
+        return entry[0](*entry[1])
+    # A leading b"\n" is the tail of a CRLF from the previous line
+    line = key[1:] if key[:1] == b"\n" else key
+    if (
+        len(line) == _POS_LINE_LEN
+        and line.startswith(_POS_LINE_HEAD)
+        and line.endswith(_POS_LINE_TAIL)
+    ):
+        pos_entry = _POS_FIELD_TABLE.get(line[4:12])
+        pos = _PCT_TABLE.get(line[12:16])
+        if pos_entry is not None and pos is not None:
+            factory, tt_addr = pos_entry
+            if len(_LINE_TABLE) < _LINE_TABLE_MAX_SIZE:
+                _LINE_TABLE[key] = (factory, (tt_addr, pos))
+            return factory(tt_addr, pos)
+    m = _FAST_PATH_PATTERN.match(line)
+    if m is None:
+        return None
+    cmd_char, field, address, node, pct, rsp_address, rsp_node, code, data = m.groups()
+    if cmd_char is not None:
+        pos = _PCT_TABLE.get(pct)
+        if pos is None:
+            return None
+        tt_addr = TTBusDeviceAddress(_HEX_TABLE[address], _HEX_TABLE[node])
+        factory = PctPosResponse if cmd_char == b"*" else PctAckResponse
+        if len(address) == 2:
+            _POS_FIELD_TABLE[cmd_char + b" " + field + b" "] = (factory, tt_addr)
+        return _remember_line(key, factory, tt_addr, pos)
+    cmd_code = _COMMAND_CODES.get(_HEX_TABLE[code])
+    if cmd_code is None:
+        return None
+    tt_addr = TTBusDeviceAddress(_HEX_TABLE[rsp_address], _HEX_TABLE[rsp_node])
+    if data is None:
+        return _remember_line(key, AckResponse, tt_addr, cmd_code)
+    if cmd_code in _HEX_POS_COMMAND_CODES:
+        return _remember_line(key, HexPosResponse, tt_addr, cmd_code, _HEX_TABLE[data])
+    return None
+
+
 class Decode:
     EOL = b"\r"
 
     @classmethod
     def decode_line_bytes(cls, line_bytes: bytes) -> ResponseMessageType:
+        """
+        Decode a line received from the controller
+
+        Well formed RSP, POS * and POS # lines are parsed directly from the bytes
+        and remembered so that a repeated line is decoded with a single lookup
+        Anything else is handed to decode_line_bytes_reference, so the results
+        (including any exceptions raised) are always the same as the reference
+        """
+        msg = _fast_decode(line_bytes)
+        if msg is not None:
+            return msg
+        return cls.decode_line_bytes_reference(line_bytes)
+
+    @classmethod
+    def cache_clear(cls) -> None:
+        """Forget the lines and POS fields remembered by decode_line_bytes"""
+        _LINE_TABLE.clear()
+        _POS_FIELD_TABLE.clear()
+
+    @classmethod
+    def decode_many(cls, lines: Iterable[bytes]) -> List[ResponseMessageType]:
+        """Decode a batch of lines, such as all of the lines in a chunk"""
+        fast_decode = _fast_decode
+        decoded: List[ResponseMessageType] = []
+        append = decoded.append
+        for line_bytes in lines:
+            msg = fast_decode(line_bytes)
+            append(
+                msg if msg is not None else cls.decode_line_bytes_reference(line_bytes)
+            )
+        return decoded
+
+    @classmethod
+    def decode_line_bytes_reference(cls, line_bytes: bytes) -> ResponseMessageType:
+        """Reference implementation of decode_line_bytes"""
         if line_bytes.find(cls.EOL) != len(line_bytes) - len(cls.EOL):
             raise InvalidResponseError()
 
@@ -69,6 +69,13 @@ def build_config(args=None):
         const=False,
         help="emulator starts up in web_off mode",
     )
+    parser.add_argument(
+        "-l",
+        "--latency",
+        type=float,
+        default=None,
+        help="seconds that the controller takes to respond to each command",
+    )
     parser.add_argument(
         "-i",
         "--initial_pos",
@@ -83,6 +90,7 @@ def build_config(args=None):
         json_config = json.load(fp)
 
     web_on = json_config.get("web_on", False) if args.web_on is None else args.web_on
+    latency = json_config.get("latency", 0.0) if args.latency is None else args.latency
 
     cover_config_by_name = {}
     if "covers" in json_config:
@@ -110,4 +118,4 @@ def build_config(args=None):
     for c in cover_config_by_name.values():
         covers.append(tt6cover_from_dict(c))
 
-    return {"port": args.port, "web_on": web_on, "covers": covers}
+    return {"port": args.port, "web_on": web_on, "latency": latency, "covers": covers}
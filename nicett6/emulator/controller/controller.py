@@ -12,8 +12,8 @@ _LOGGER = logging.getLogger(__name__)
 
 
 @contextmanager
-def make_tt6controller(web_on, devices):
-    controller = TT6Controller(web_on)
+def make_tt6controller(web_on, devices, latency=0.0):
+    controller = TT6Controller(web_on, latency)
     with ExitStack() as stack:
         for device in devices:
             controller.device_manager.register_device(device)
@@ -22,7 +22,8 @@ def make_tt6controller(web_on, devices):
 
 
 class TT6Controller(ServerController):
-    def __init__(self, web_on: bool) -> None:
+    def __init__(self, web_on: bool, latency: float = 0.0) -> None:
+        self.latency = latency
         self.writer_manager = WriterManager()
         self.web_pos_manager = WebPosManager(self.writer_manager, web_on)
         self.device_manager: DeviceManager = DeviceManager(self.web_pos_manager)
@@ -38,6 +39,7 @@ class TT6Controller(ServerController):
             self,
             reader,
             writer,
+            self.latency,
         )
 
     async def run_server(self, port: int | str | None) -> None:
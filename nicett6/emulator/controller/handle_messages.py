@@ -26,6 +26,7 @@ async def handle_messages(
     server_controller: ServerController,
     reader: asyncio.StreamReader,
     writer: asyncio.StreamWriter,
+    latency: float = 0.0,
 ) -> None:
     with writer_manager.wrap_writer(writer) as wrapped_writer:
         line_handler = LineHandler(
@@ -33,6 +34,7 @@ async def handle_messages(
             web_pos_manager,
             device_registry,
             server_controller,
+            latency,
         )
         listener_task: asyncio.Task = asyncio.create_task(read_line_bytes(reader))
         done: Iterable[asyncio.Task]
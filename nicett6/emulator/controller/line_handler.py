@@ -1,3 +1,4 @@
+import asyncio
 import logging
 from typing import List
 
@@ -35,16 +36,20 @@ class LineHandler:
         web_pos_manager: WebPosManager,
         device_registry: DeviceRegistry,
         server_controller: ServerController,
+        latency: float = 0.0,
     ) -> None:
         self.wrapped_writer = wrapped_writer
         self.web_pos_manager = web_pos_manager
         self.device_registry = device_registry
         self.server_controller = server_controller
+        self.latency = latency
 
     async def write_msg(self, msg: str) -> None:
         await self.wrapped_writer.write_msg(msg)
 
     async def handle_line(self, line_bytes: bytes) -> None:
+        if self.latency > 0.0:
+            await asyncio.sleep(self.latency)
         try:
             _LOGGER.info(f"handling cmd: {line_bytes!r}")
             line: str = line_bytes.decode("utf-8")
@@ -1,13 +1,26 @@
 import logging
+from functools import lru_cache
+from typing import Any, Dict
 
 from nicett6.command_code import CommandCode
 from nicett6.ttbus_device import TTBusDeviceAddress
 
 _LOGGER = logging.getLogger(__name__)
 
+# Bounds for the encoded command caches - generous for a dozen or so devices
+SIMPLE_COMMAND_CACHE_SIZE = 512
+SIMPLE_COMMAND_WITH_DATA_CACHE_SIZE = 1024
+WEB_MOVE_COMMAND_CACHE_SIZE = 4096
+WEB_POS_REQUEST_CACHE_SIZE = 64
+
 
 class Encode:
-    """Helper class to encode commands"""
+    """
+    Helper class to encode commands
+
+    The set of possible commands is small so the encoded bytes are cached,
+    keyed on the arguments.   Use cache_info() to see the hit and miss counts
+    """
 
     EOL = b"\r"
 
@@ -24,6 +37,7 @@ class Encode:
         return cls.fmt_msg("WEB_OFF")
 
     @classmethod
+    @lru_cache(maxsize=SIMPLE_COMMAND_CACHE_SIZE)
     def simple_command(cls, tt_addr: TTBusDeviceAddress, cmd_name: str) -> bytes:
         return cls.fmt_msg(
             f"CMD {tt_addr.address:02X} {tt_addr.node:02X} "
@@ -31,6 +45,7 @@ class Encode:
         )
 
     @classmethod
+    @lru_cache(maxsize=SIMPLE_COMMAND_WITH_DATA_CACHE_SIZE)
     def simple_command_with_data(
         cls, tt_addr: TTBusDeviceAddress, cmd_name: str, data: int
     ) -> bytes:
@@ -55,13 +70,41 @@ class Encode:
         elif pos > 1000:
             _LOGGER.info(f"Requested position for {tt_addr} of {pos} capped at 1000")
             pos = 1000
+        return cls._web_move_command(tt_addr, pos)
+
+    @classmethod
+    @lru_cache(maxsize=WEB_MOVE_COMMAND_CACHE_SIZE)
+    def _web_move_command(cls, tt_addr: TTBusDeviceAddress, pos: int) -> bytes:
         return cls.fmt_msg(
             f"POS > {tt_addr.address:02X} {tt_addr.node:02X} " f"{pos:04d} FFFF FF"
         )
 
     @classmethod
+    @lru_cache(maxsize=WEB_POS_REQUEST_CACHE_SIZE)
     def web_pos_request(cls, tt_addr: TTBusDeviceAddress) -> bytes:
         """Request the position"""
         return cls.fmt_msg(
             f"POS < {tt_addr.address:02X} {tt_addr.node:02X} " "FFFF FFFF FF"
         )
+
+    @classmethod
+    def cache_info(cls) -> Dict[str, Any]:
+        """
+        Hit and miss counts for each of the encoded command caches
+
+        Each value is the named tuple returned by the cache_info() method of
+        a functools.lru_cache wrapped function
+        """
+        return {
+            "simple_command": cls.simple_command.cache_info(),
+            "simple_command_with_data": cls.simple_command_with_data.cache_info(),
+            "web_move_command": cls._web_move_command.cache_info(),
+            "web_pos_request": cls.web_pos_request.cache_info(),
+        }
+
+    @classmethod
+    def cache_clear(cls) -> None:
+        cls.simple_command.cache_clear()
+        cls.simple_command_with_data.cache_clear()
+        cls._web_move_command.cache_clear()
+        cls.web_pos_request.cache_clear()
@@ -1,8 +1,24 @@
 import asyncio
 import logging
+from collections import deque
 from collections.abc import AsyncIterator
-from typing import Awaitable, Callable, Generic, List, Optional, TypeVar
-from weakref import WeakSet
+from dataclasses import dataclass
+from enum import Enum
+from typing import (
+    Awaitable,
+    Callable,
+    Deque,
+    Dict,
+    Generic,
+    Hashable,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
+from weakref import ReferenceType, WeakSet, finalize, ref
 
 from serial_asyncio_fast import create_serial_connection  # type: ignore[import-untyped]
 
@@ -13,26 +29,153 @@ _LOGGER = logging.getLogger(__name__)
 T = TypeVar("T")
 
 
-class SerialReaderStopSentinel:
-    pass
+def _identity(msg: T) -> T:
+    return msg
+
+
+def _no_address(msg: object) -> None:
+    return None
+
+
+@dataclass(frozen=True)
+class ReaderFilter:
+    """
+    Subscription of a reader to a subset of the messages
+
+    A message is delivered if its type is one of types (exact match) and its
+    address is address - either can be None to match any
+    The address of a message is determined by the message_address function
+    of the connection
+    """
+
+    types: Optional[Tuple[type, ...]] = None
+    address: Optional[Hashable] = None
+
+    def index_keys(self) -> List[Tuple[Optional[type], Optional[Hashable]]]:
+        if self.types is None:
+            return [(None, self.address)]
+        return [(t, self.address) for t in self.types]
+
+
+_ALL_MESSAGES = ReaderFilter()
+
+
+class OverflowPolicy(Enum):
+    """What a bounded SerialReader does when its queue is full"""
+
+    DROP_OLDEST = "drop_oldest"
+    DROP_NEWEST = "drop_newest"
+    KEEP_LATEST_PER_KEY = "keep_latest_per_key"
+    BLOCK_PRODUCER = "block_producer"
 
 
 class SerialReader(AsyncIterator[T]):
-    """Generic class for Readers"""
+    """
+    Generic class for Readers
+
+    Messages are queued until they are consumed by iterating over the reader
+    Iteration stops once the reader has been stopped and the queue is empty
+
+    If maxsize is greater than zero then the queue is bounded and the
+    overflow policy decides what happens when a message arrives and the
+    queue is full:
+
+    DROP_OLDEST - the oldest queued messages are discarded
+    DROP_NEWEST - the arriving messages that do not fit are discarded
+    KEEP_LATEST_PER_KEY - queued messages superseded by a later message with
+    the same overflow_key are discarded first (messages with a key of None
+    are never superseded), then the oldest messages
+    BLOCK_PRODUCER - nothing is discarded but reading from the connection is
+    paused until the consumer has drained the queue to half of maxsize, so
+    the queue can exceed maxsize by at most one chunk of messages
+
+    dropped counts the messages discarded and high_water_mark records the
+    longest that the queue has been
+    """
 
-    def __init__(self) -> None:
-        self.queue: asyncio.Queue[T | SerialReaderStopSentinel] = asyncio.Queue()
+    def __init__(
+        self,
+        maxsize: int = 0,
+        overflow: OverflowPolicy = OverflowPolicy.DROP_OLDEST,
+        overflow_key: Optional[Callable[[T], Optional[Hashable]]] = None,
+    ) -> None:
+        if overflow is OverflowPolicy.KEEP_LATEST_PER_KEY and overflow_key is None:
+            raise ValueError("overflow_key is required for KEEP_LATEST_PER_KEY")
+        self.queue: Deque[T] = deque()
+        self.maxsize = maxsize
+        self.overflow = overflow
+        self.overflow_key = overflow_key
+        self.dropped: int = 0
+        self.high_water_mark: int = 0
+        self.is_blocking: bool = False
+        self.flow_control: Optional[Callable[[], None]] = None
+        self.filter: ReaderFilter = _ALL_MESSAGES
         self.is_stopped: bool = False
         self.is_iterated: bool = False
+        self._wakeup = asyncio.Event()
 
     def message_received(self, msg: T) -> None:
-        if not self.is_stopped:
-            self.queue.put_nowait(msg)
+        self.messages_received((msg,))
+
+    def messages_received(self, msgs: Sequence[T]) -> None:
+        """Queue a batch of messages with a single queue operation"""
+        if self.is_stopped or not msgs:
+            return
+        queue = self.queue
+        if self.maxsize > 0 and len(queue) + len(msgs) > self.maxsize:
+            self._overflow(msgs)
+        else:
+            queue.extend(msgs)
+        if len(queue) > self.high_water_mark:
+            self.high_water_mark = len(queue)
+        self._wakeup.set()
+
+    def _overflow(self, msgs: Sequence[T]) -> None:
+        queue = self.queue
+        maxsize = self.maxsize
+        if self.overflow is OverflowPolicy.DROP_NEWEST:
+            room = max(maxsize - len(queue), 0)
+            queue.extend(msgs[:room])
+            self.dropped += len(msgs) - room
+            return
+        queue.extend(msgs)
+        if self.overflow is OverflowPolicy.BLOCK_PRODUCER:
+            self._set_blocking(True)
+            return
+        if self.overflow is OverflowPolicy.KEEP_LATEST_PER_KEY:
+            self._discard_superseded()
+        while len(queue) > maxsize:
+            queue.popleft()
+            self.dropped += 1
+
+    def _discard_superseded(self) -> None:
+        """Discard the messages superseded by a later message with the same key"""
+        assert self.overflow_key is not None
+        overflow_key = self.overflow_key
+        seen = set()
+        kept: Deque[T] = deque()
+        for msg in reversed(self.queue):
+            key = overflow_key(msg)
+            if key is not None:
+                if key in seen:
+                    continue
+                seen.add(key)
+            kept.appendleft(msg)
+        self.dropped += len(self.queue) - len(kept)
+        self.queue.clear()
+        self.queue.extend(kept)
+
+    def _set_blocking(self, is_blocking: bool) -> None:
+        if self.is_blocking != is_blocking:
+            self.is_blocking = is_blocking
+            if self.flow_control is not None:
+                self.flow_control()
 
     def stop(self) -> None:
         if not self.is_stopped:
             self.is_stopped = True
-            self.queue.put_nowait(SerialReaderStopSentinel())
+            self._set_blocking(False)
+            self._wakeup.set()
 
     def __aiter__(self) -> AsyncIterator[T]:
         return self
@@ -40,11 +183,149 @@ class SerialReader(AsyncIterator[T]):
     async def __anext__(self) -> T:
         if self.is_iterated:
             raise RuntimeError("Reader cannot be iterated twice")
-        item = await self.queue.get()
-        if isinstance(item, SerialReaderStopSentinel):
-            self.is_iterated = True
-            raise StopAsyncIteration
-        return item
+        while not self.has_messages():
+            if self.is_stopped:
+                self.is_iterated = True
+                raise StopAsyncIteration
+            self._wakeup.clear()
+            await self._wakeup.wait()
+        return self.pop_message()
+
+    async def batches(
+        self, max_items: int = 0, max_latency: float = 0.0
+    ) -> AsyncIterator[List[T]]:
+        """
+        Iterate over the messages in batches
+
+        Each batch is every message queued when the reader wakes up (at most
+        max_items if it is greater than zero) so a burst of messages costs a
+        single wakeup
+        If max_latency is greater than zero then, once a message is queued,
+        the reader waits up to max_latency seconds for more messages to
+        arrive (or for max_items to be queued) before returning the batch
+
+        Cannot be combined with iterating over the reader itself
+        """
+        if self.is_iterated:
+            raise RuntimeError("Reader cannot be iterated twice")
+        loop = asyncio.get_running_loop()
+        while True:
+            while not self.has_messages():
+                if self.is_stopped:
+                    self.is_iterated = True
+                    return
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            if max_latency > 0.0:
+                deadline = loop.time() + max_latency
+                while not self.is_stopped and (
+                    max_items <= 0 or self.message_count() < max_items
+                ):
+                    remaining = deadline - loop.time()
+                    if remaining <= 0.0:
+                        break
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+            yield self.take_messages(max_items)
+
+    def has_messages(self) -> bool:
+        return bool(self.queue)
+
+    def message_count(self) -> int:
+        return len(self.queue)
+
+    def pop_message(self) -> T:
+        """Remove and return the next message (there must be one)"""
+        msg = self.queue.popleft()
+        if self.is_blocking and len(self.queue) <= self.maxsize // 2:
+            self._set_blocking(False)
+        return msg
+
+    def take_messages(self, max_items: int = 0) -> List[T]:
+        """Remove and return the queued messages (at most max_items if > 0)"""
+        queue = self.queue
+        if max_items <= 0 or max_items >= len(queue):
+            msgs = list(queue)
+            queue.clear()
+        else:
+            msgs = [queue.popleft() for _ in range(max_items)]
+        if self.is_blocking and len(queue) <= self.maxsize // 2:
+            self._set_blocking(False)
+        return msgs
+
+
+class ConflatingReader(SerialReader[T]):
+    """
+    Reader that only keeps the latest message for each key
+
+    conflation_key returns the key of a message, e.g. the address of a
+    position message.   A message with a key replaces any unread message
+    with the same key, so a slow consumer only sees the latest value for
+    each key.   Messages with a key of None (e.g. acknowledgements and
+    errors) are queued in order in a separate lane, which is bounded as for
+    a SerialReader
+
+    Iteration returns the messages in the ordered lane first, then the
+    latest message for each key in the order that the keys first arrived
+    conflated counts the messages that were replaced
+    """
+
+    def __init__(
+        self,
+        conflation_key: Callable[[T], Optional[Hashable]],
+        maxsize: int = 0,
+        overflow: OverflowPolicy = OverflowPolicy.DROP_OLDEST,
+        overflow_key: Optional[Callable[[T], Optional[Hashable]]] = None,
+    ) -> None:
+        super().__init__(maxsize, overflow, overflow_key)
+        self.conflation_key = conflation_key
+        self.latest: Dict[Hashable, T] = {}
+        self.conflated: int = 0
+
+    def messages_received(self, msgs: Sequence[T]) -> None:
+        if self.is_stopped or not msgs:
+            return
+        conflation_key = self.conflation_key
+        latest = self.latest
+        ordered: List[T] = []
+        for msg in msgs:
+            key = conflation_key(msg)
+            if key is None:
+                ordered.append(msg)
+            else:
+                if key in latest:
+                    self.conflated += 1
+                latest[key] = msg
+        if ordered:
+            super().messages_received(ordered)
+        else:
+            self._wakeup.set()
+
+    def has_messages(self) -> bool:
+        return bool(self.queue) or bool(self.latest)
+
+    def message_count(self) -> int:
+        return len(self.queue) + len(self.latest)
+
+    def pop_message(self) -> T:
+        if self.queue:
+            return super().pop_message()
+        key = next(iter(self.latest))
+        return self.latest.pop(key)
+
+    def take_messages(self, max_items: int = 0) -> List[T]:
+        msgs = super().take_messages(max_items)
+        latest = self.latest
+        if max_items <= 0 or len(msgs) + len(latest) <= max_items:
+            msgs.extend(latest.values())
+            latest.clear()
+        else:
+            while len(msgs) < max_items:
+                msgs.append(latest.pop(next(iter(latest))))
+        return msgs
 
 
 class SerialWriter(Generic[T]):
@@ -53,8 +334,65 @@ class SerialWriter(Generic[T]):
     def __init__(self, conn: "SerialConnection[T]") -> None:
         self.conn = conn
 
-    async def write(self, msg: bytes) -> None:
-        await self.conn.write(msg)
+    async def write(self, msg: bytes, coalesce_key: Optional[Hashable] = None) -> None:
+        await self.conn.write(msg, coalesce_key)
+
+    def write_nowait(
+        self, msg: bytes, coalesce_key: Optional[Hashable] = None
+    ) -> "asyncio.Future[bool]":
+        return self.conn.write_nowait(msg, coalesce_key)
+
+    async def request(self, msg: bytes, match: Hashable, timeout: float = 1.0) -> T:
+        return await self.conn.request(msg, match, timeout)
+
+    async def process_request(
+        self, coro: Awaitable[None], time_window: float = 1.0
+    ) -> List[T]:
+        return await self.conn.process_request(coro, time_window)
+
+
+class PendingRequests(Generic[T]):
+    """
+    Table of requests that are waiting for a response
+
+    Requests are keyed by the key of the response that they are waiting for
+    Each response received resolves every request waiting for its key, so
+    requests for different keys can be outstanding at the same time
+    """
+
+    def __init__(self, response_key: Callable[[T], Optional[Hashable]]) -> None:
+        self.response_key = response_key
+        self.pending: Dict[Hashable, List["asyncio.Future[T]"]] = {}
+
+    def add(self, key: Hashable) -> "asyncio.Future[T]":
+        future: asyncio.Future[T] = asyncio.get_running_loop().create_future()
+        self.pending.setdefault(key, []).append(future)
+        return future
+
+    def remove(self, key: Hashable, future: "asyncio.Future[T]") -> None:
+        futures = self.pending.get(key)
+        if futures is not None and future in futures:
+            futures.remove(future)
+            if not futures:
+                del self.pending[key]
+
+    def messages_received(self, msgs: Sequence[T]) -> None:
+        if not self.pending:
+            return
+        for msg in msgs:
+            key = self.response_key(msg)
+            if key is None:
+                continue
+            for future in self.pending.pop(key, ()):
+                if not future.done():
+                    future.set_result(msg)
+
+    def fail_all(self, exc: Exception) -> None:
+        for futures in self.pending.values():
+            for future in futures:
+                if not future.done():
+                    future.set_exception(exc)
+        self.pending.clear()
 
 
 class ReaderManager(Generic[T]):
@@ -63,56 +401,256 @@ class ReaderManager(Generic[T]):
 
     Decouples readers from the protocol to simplify reconnection
     Readers survive a disconnection - they are stopped when the session ends
+
+    Readers are indexed by the (type, address) of the messages that they
+    subscribe to, with None standing for any, so that a message is only
+    offered to the readers that want it
     """
 
-    def __init__(self, decoder: Callable[[bytes], T]) -> None:
+    def __init__(
+        self,
+        decoder: Callable[[bytes], T],
+        batch_decoder: Optional[Callable[[Iterable[bytes]], List[T]]] = None,
+        response_key: Optional[Callable[[T], Optional[Hashable]]] = None,
+        message_address: Optional[Callable[[T], Optional[Hashable]]] = None,
+    ) -> None:
         self.decoder = decoder
+        self.batch_decoder = batch_decoder
+        self.message_address = (
+            message_address if message_address is not None else _no_address
+        )
         self.readers: WeakSet[SerialReader[T]] = WeakSet()
-
-    def add_reader(self, reader: SerialReader[T]) -> None:
+        self._index: Dict[
+            Tuple[Optional[type], Optional[Hashable]], WeakSet[SerialReader[T]]
+        ] = {}
+        # Readers of each (type, address) resolved from the index on demand
+        self._routes: Dict[
+            Tuple[type, Optional[Hashable]],
+            Tuple[ReferenceType[SerialReader[T]], ...],
+        ] = {}
+        self._transport: Optional[asyncio.ReadTransport] = None
+        self._is_reading_paused: bool = False
+        self.requests: PendingRequests[T] = PendingRequests(
+            response_key if response_key is not None else _identity
+        )
+
+    def add_reader(
+        self, reader: SerialReader[T], filter: Optional[ReaderFilter] = None
+    ) -> None:
         self.readers.add(reader)
+        reader.filter = filter if filter is not None else _ALL_MESSAGES
+        for key in reader.filter.index_keys():
+            self._index.setdefault(key, WeakSet()).add(reader)
+        self._routes.clear()
+        if reader.overflow is OverflowPolicy.BLOCK_PRODUCER:
+            reader.flow_control = self.update_reading
+            # Re-check when the reader is released while it is blocking
+            finalize(reader, self.update_reading)
+
+    def set_transport(self, transport: Optional[asyncio.ReadTransport]) -> None:
+        """Called by the protocol when the connection is made or lost"""
+        self._transport = transport
+        self._is_reading_paused = False
+        self.update_reading()
+
+    def update_reading(self) -> None:
+        """Pause reading while any reader is blocking the producer"""
+        if self._transport is None:
+            return
+        is_blocked = any(r.is_blocking for r in self.readers)
+        if is_blocked and not self._is_reading_paused:
+            _LOGGER.debug("Reading paused")
+            self._transport.pause_reading()
+            self._is_reading_paused = True
+        elif not is_blocked and self._is_reading_paused:
+            _LOGGER.debug("Reading resumed")
+            self._transport.resume_reading()
+            self._is_reading_paused = False
 
     def remove_reader(self, reader: SerialReader[T]) -> None:
         reader.stop()
         self.readers.remove(reader)
+        for key in reader.filter.index_keys():
+            subscribers = self._index.get(key)
+            if subscribers is not None:
+                subscribers.discard(reader)
+                if not subscribers:
+                    del self._index[key]
+        self._routes.clear()
 
     def message_received(self, msg: bytes) -> None:
-        _LOGGER.debug(f"data_received: %r", msg)
+        _LOGGER.debug("data_received: %r", msg)
         decoded_message = self.decoder(msg)
-        _LOGGER.debug(f"decoded message: %r", decoded_message)
-        for r in self.readers:
-            r.message_received(decoded_message)
+        _LOGGER.debug("decoded message: %r", decoded_message)
+        self.dispatch([decoded_message])
+        self.requests.messages_received((decoded_message,))
+
+    def messages_received(self, msgs: List[bytes]) -> List[T]:
+        """
+        Decode a batch of messages once and deliver the batch to each reader
+
+        Returns the decoded messages
+        """
+        try:
+            decoded_messages = self.decode_many(msgs)
+        except Exception:
+            # Deliver the messages that precede the bad one before raising
+            for msg in msgs:
+                self.message_received(msg)
+            raise
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug("decoded messages: %r from %r", decoded_messages, msgs)
+        self.dispatch(decoded_messages)
+        self.requests.messages_received(decoded_messages)
+        return decoded_messages
+
+    def dispatch(self, msgs: List[T]) -> None:
+        """Deliver each message to the readers that subscribe to it"""
+        index = self._index
+        if not index:
+            return
+        if len(index) == 1 and (None, None) in index:
+            # Nobody is filtering so every reader gets the whole batch
+            for r in index[(None, None)]:
+                r.messages_received(msgs)
+            return
+        message_address = self.message_address
+        routes = self._routes
+        deliveries: Dict[ReferenceType[SerialReader[T]], List[T]] = {}
+        for msg in msgs:
+            route_key = type(msg), message_address(msg)
+            route = routes.get(route_key)
+            if route is None:
+                route = routes[route_key] = self._route(*route_key)
+            for reader_ref in route:
+                reader_msgs = deliveries.get(reader_ref)
+                if reader_msgs is None:
+                    deliveries[reader_ref] = [msg]
+                else:
+                    reader_msgs.append(msg)
+        for reader_ref, reader_msgs in deliveries.items():
+            reader = reader_ref()
+            if reader is not None:
+                reader.messages_received(reader_msgs)
+
+    def _route(
+        self, msg_type: type, address: Optional[Hashable]
+    ) -> Tuple[ReferenceType[SerialReader[T]], ...]:
+        """Return weak references to the readers of messages with the given key"""
+        keys: List[Tuple[Optional[type], Optional[Hashable]]] = [
+            (msg_type, None),
+            (None, None),
+        ]
+        if address is not None:
+            keys += [(msg_type, address), (None, address)]
+        return tuple(ref(r) for key in keys for r in self._index.get(key, ()))
+
+    def decode_many(self, msgs: List[bytes]) -> List[T]:
+        if self.batch_decoder is not None:
+            return self.batch_decoder(msgs)
+        decoder = self.decoder
+        return [decoder(msg) for msg in msgs]
 
     def remove_all(self) -> None:
         for r in self.readers:
             r.stop()
         self.readers.clear()
+        self._index.clear()
+        self._routes.clear()
+        self.requests.fail_all(ConnectionError("Connection closed"))
+
+
+@dataclass
+class WriteStats:
+    """Counters for the outbound queue of a connection"""
+
+    written: int = 0
+    coalesced: int = 0
+
+
+class WritePacer(Generic[T]):
+    """
+    Decides how long to pause after each message is written
+
+    The base class always pauses for a fixed post_write_delay
+    Subclasses can adapt the delay by overriding post_write_delay and
+    observing the messages that are written and received
+    """
+
+    def __init__(self, post_write_delay: float) -> None:
+        self._post_write_delay = post_write_delay
+
+    @property
+    def post_write_delay(self) -> float:
+        return self._post_write_delay
+
+    def message_written(self, msg: bytes) -> None:
+        """Called each time that msg has been written to the transport"""
+
+    def messages_received(self, msgs: Sequence[T]) -> None:
+        """Called with each batch of decoded messages received"""
+
+
+@dataclass
+class PendingWrite:
+    """A message in the outbound queue and the futures of the callers that sent it"""
+
+    msg: bytes
+    futures: List["asyncio.Future[bool]"]
+    coalesce_key: Optional[Hashable] = None
+
+    @property
+    def is_withdrawn(self) -> bool:
+        return all(future.done() for future in self.futures)
+
+    def set_result(self, result: bool) -> None:
+        for future in self.futures:
+            if not future.done():
+                future.set_result(result)
 
 
 class SerialProtocol(asyncio.Protocol, Generic[T]):
+    """
+    Protocol that feeds received data to the readers and writes queued messages
+
+    Outbound messages are queued and written by a drainer task that pauses
+    after each write for the delay decided by the pacer, so callers are not
+    held up by the delay
+
+    A message sent with a coalesce_key replaces a queued message with the same
+    key that has not been written yet, so only the latest is sent.   A message
+    sent without a key is a barrier - no message sent after it can be merged
+    with a message sent before it - which preserves the ordering of commands
+    """
+
     def __init__(
         self,
         eol: bytes,
         readers: ReaderManager[T],
-        post_write_delay: float,
+        pacer: WritePacer[T],
+        write_stats: Optional[WriteStats] = None,
     ) -> None:
         self.readers = readers
         self.buf: MessageBuffer = MessageBuffer(eol)
         self._transport: Optional[asyncio.Transport] = None
-        self.send_lock = asyncio.Lock()
-        self.post_write_delay = post_write_delay
+        self.pacer = pacer
+        self.write_stats = write_stats if write_stats is not None else WriteStats()
         self.connection_made_event = asyncio.Event()
+        self._write_queue: Deque[PendingWrite] = deque()
+        self._coalescible: Dict[Hashable, PendingWrite] = {}
+        self._drainer: Optional[asyncio.Task[None]] = None
 
     def connection_made(self, transport: asyncio.BaseTransport) -> None:
         _LOGGER.info("Connection made")
         assert isinstance(transport, asyncio.Transport)
         self._transport = transport
+        self.readers.set_transport(transport)
         self.connection_made_event.set()
 
     def data_received(self, data: bytes) -> None:
         messages: List[bytes] = self.buf.append_chunk(data)
-        for msg in messages:
-            self.readers.message_received(msg)
+        if messages:
+            self.pacer.messages_received(self.readers.messages_received(messages))
 
     def connection_lost(self, exc: Exception | None) -> None:
         if self.buf.buf != b"":
@@ -122,19 +660,80 @@ class SerialProtocol(asyncio.Protocol, Generic[T]):
         else:
             _LOGGER.info("Connection lost")
         self._transport = None
+        self.readers.set_transport(None)
+        self._cancel_writes()
 
     @property
     def is_open(self):
         return self._transport is not None and not self._transport.is_closing()
 
-    async def write(self, msg: bytes) -> bool:
-        if self._transport is None or self._transport.is_closing():
-            return False
-        async with self.send_lock:
-            _LOGGER.debug(f"Writing message {msg!r}")
-            self._transport.write(msg)
-            await asyncio.sleep(self.post_write_delay)
-        return True
+    async def write(self, msg: bytes, coalesce_key: Optional[Hashable] = None) -> bool:
+        """Queue msg and wait until it has been written to the transport"""
+        return await self.write_nowait(msg, coalesce_key)
+
+    def write_nowait(
+        self, msg: bytes, coalesce_key: Optional[Hashable] = None
+    ) -> "asyncio.Future[bool]":
+        """
+        Queue msg for writing without waiting
+
+        Returns a future that will be set to True when the message (or the
+        message that superseded it) has been written to the transport or to
+        False if the connection is lost first
+        Cancel the future to withdraw the message if it has not been written yet
+        """
+        future: asyncio.Future[bool] = asyncio.get_running_loop().create_future()
+        if not self.is_open:
+            future.set_result(False)
+            return future
+        if coalesce_key is None:
+            self._coalescible.clear()
+        else:
+            pending = self._coalescible.get(coalesce_key)
+            if pending is not None and not pending.is_withdrawn:
+                _LOGGER.debug("Message %r superseded by %r", pending.msg, msg)
+                pending.msg = msg
+                pending.futures.append(future)
+                self.write_stats.coalesced += 1
+                return future
+        pending = PendingWrite(msg, [future], coalesce_key)
+        self._write_queue.append(pending)
+        if coalesce_key is not None:
+            self._coalescible[coalesce_key] = pending
+        if self._drainer is None:
+            self._drainer = asyncio.create_task(self._drain_writes())
+        return future
+
+    async def _drain_writes(self) -> None:
+        """Write the queued messages, pausing as decided by the pacer after each one"""
+        try:
+            while self._write_queue:
+                pending = self._write_queue.popleft()
+                if self._coalescible.get(pending.coalesce_key) is pending:
+                    del self._coalescible[pending.coalesce_key]
+                if pending.is_withdrawn:
+                    continue
+                if self._transport is None or self._transport.is_closing():
+                    pending.set_result(False)
+                    continue
+                _LOGGER.debug("Writing message %r", pending.msg)
+                self._transport.write(pending.msg)
+                self.write_stats.written += 1
+                self.pacer.message_written(pending.msg)
+                pending.set_result(True)
+                await asyncio.sleep(self.pacer.post_write_delay)
+        finally:
+            if self._drainer is asyncio.current_task():
+                self._drainer = None
+
+    def _cancel_writes(self) -> None:
+        """Stop the drainer and tell the callers that queued messages were not sent"""
+        if self._drainer is not None:
+            self._drainer.cancel()
+            self._drainer = None
+        self._coalescible.clear()
+        while self._write_queue:
+            self._write_queue.popleft().set_result(False)
 
     def close_transport(self) -> None:
         if self._transport is not None:
@@ -143,6 +742,7 @@ class SerialProtocol(asyncio.Protocol, Generic[T]):
             self._transport = None
         else:
             _LOGGER.debug("Transport already closed")
+        self._cancel_writes()
 
 
 class SerialConnection(Generic[T]):
@@ -161,9 +761,13 @@ class SerialConnection(Generic[T]):
         self,
         decoder: Callable[[bytes], T],
         eol: bytes,
-        reader_factory: Callable[[], SerialReader[T]],
+        reader_factory: Callable[..., SerialReader[T]],
         writer_factory: Callable[["SerialConnection[T]"], SerialWriter[T]],
         post_write_delay: float,
+        batch_decoder: Optional[Callable[[Iterable[bytes]], List[T]]] = None,
+        pacer: Optional[WritePacer[T]] = None,
+        response_key: Optional[Callable[[T], Optional[Hashable]]] = None,
+        message_address: Optional[Callable[[T], Optional[Hashable]]] = None,
         **serial_kwargs,
     ) -> None:
         self.decoder = decoder
@@ -171,9 +775,15 @@ class SerialConnection(Generic[T]):
         self.reader_factory = reader_factory
         self.writer_factory = writer_factory
         self.post_write_delay = post_write_delay
+        self.pacer: WritePacer[T] = (
+            pacer if pacer is not None else WritePacer(post_write_delay)
+        )
         self.serial_kwargs = serial_kwargs
         self._protocol: Optional[SerialProtocol[T]] = None
-        self._readers: ReaderManager[T] = ReaderManager(decoder)
+        self._readers: ReaderManager[T] = ReaderManager(
+            decoder, batch_decoder, response_key, message_address
+        )
+        self.write_stats = WriteStats()
 
     @property
     def is_connected(self) -> bool:
@@ -182,7 +792,7 @@ class SerialConnection(Generic[T]):
     async def connect(self) -> None:
         self.disconnect()
         loop = asyncio.get_running_loop()
-        protocol = SerialProtocol(self.eol, self._readers, self.post_write_delay)
+        protocol = SerialProtocol(self.eol, self._readers, self.pacer, self.write_stats)
         await create_serial_connection(loop, lambda: protocol, **self.serial_kwargs)
         await protocol.connection_made_event.wait()
         self._protocol = protocol
@@ -196,9 +806,23 @@ class SerialConnection(Generic[T]):
         self._readers.remove_all()
         self.disconnect()
 
-    def add_reader(self) -> SerialReader[T]:
-        reader = self.reader_factory()
-        self._readers.add_reader(reader)
+    def add_reader(
+        self,
+        filter: Optional[ReaderFilter] = None,
+        reader_factory: Optional[Callable[..., SerialReader[T]]] = None,
+        **kwargs,
+    ) -> SerialReader[T]:
+        """
+        Return a new reader
+
+        If filter is specified then the reader only receives matching messages
+        The reader is made by reader_factory (by default the reader_factory of
+        the connection) and kwargs are passed to it (e.g. maxsize and overflow)
+        """
+        if reader_factory is None:
+            reader_factory = self.reader_factory
+        reader = reader_factory(**kwargs)
+        self._readers.add_reader(reader, filter)
         return reader
 
     def remove_reader(self, reader: SerialReader[T]) -> None:
@@ -208,16 +832,64 @@ class SerialConnection(Generic[T]):
     def get_writer(self) -> SerialWriter[T]:
         return self.writer_factory(self)
 
-    async def write(self, msg: bytes) -> None:
+    async def write(self, msg: bytes, coalesce_key: Optional[Hashable] = None) -> None:
+        """Send msg and wait until it has been written to the transport"""
+        await self.write_nowait(msg, coalesce_key)
+
+    def write_nowait(
+        self, msg: bytes, coalesce_key: Optional[Hashable] = None
+    ) -> "asyncio.Future[bool]":
+        """
+        Send msg without waiting for it to be written
+
+        The returned future can be awaited for confirmation (True if written)
+        or ignored if the message is fire and forget
+        If coalesce_key is specified then msg will replace any message with the
+        same key that is still waiting to be written (see SerialProtocol)
+        """
         if self._protocol is not None and self._protocol.is_open:
-            await self._protocol.write(msg)
-        else:
-            _LOGGER.warning(f"Message not written (not connected): {msg!r}")
+            return self._protocol.write_nowait(msg, coalesce_key)
+        _LOGGER.warning(f"Message not written (not connected): {msg!r}")
+        future: asyncio.Future[bool] = asyncio.get_running_loop().create_future()
+        future.set_result(False)
+        return future
+
+    async def request(self, msg: bytes, match: Hashable, timeout: float = 1.0) -> T:
+        """
+        Send msg and return the first response message whose key is match
+
+        The key of each response is determined by the response_key function
+        of the connection (by default the message itself is the key)
+        The request is registered before msg is sent so a fast response is
+        not missed, and requests for different keys can overlap
+
+        Raises asyncio.TimeoutError if no response arrives within timeout
+        (a message that has not been written by then is withdrawn)
+        Raises ConnectionError if the message could not be sent or the
+        connection is closed while waiting
+        """
+        requests = self._readers.requests
+        future = requests.add(match)
+        try:
+            return await asyncio.wait_for(self._send_request(msg, future), timeout)
+        finally:
+            requests.remove(match, future)
+            if not future.done():
+                future.cancel()
+            elif not future.cancelled():
+                future.exception()  # Retrieved so that asyncio doesn't log it
+
+    async def _send_request(self, msg: bytes, future: "asyncio.Future[T]") -> T:
+        if not await self.write_nowait(msg):
+            raise ConnectionError(f"Request not sent: {msg!r}")
+        return await future
 
     async def process_request(self, coro: Awaitable[None], time_window: float = 1.0):
         """
         Send a command and collect the response messages that arrive in time_window
 
+        Prefer request if the response can be identified by a key
+
         Usage:
              coro = writer.write("DO SOMETHING")
              messages = await writer.process_request(coro)
@@ -1,12 +1,39 @@
 import logging
+from collections import deque
 from contextlib import asynccontextmanager
-from typing import Optional, TypeAlias
+from time import perf_counter
+from typing import (
+    Callable,
+    Deque,
+    Dict,
+    Hashable,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeAlias,
+)
 
 from serial import PARITY_NONE, STOPBITS_ONE  # type: ignore
 
-from nicett6.decode import Decode, ResponseMessageType
+from nicett6.command_code import CommandCode
+from nicett6.decode import (
+    AckResponse,
+    Decode,
+    ErrorResponse,
+    HexPosResponse,
+    PctAckResponse,
+    PctPosResponse,
+    ResponseMessageType,
+)
 from nicett6.encode import Encode
-from nicett6.serial import SerialConnection, SerialReader, SerialWriter
+from nicett6.serial import (
+    ConflatingReader,
+    OverflowPolicy,
+    SerialConnection,
+    SerialReader,
+    SerialWriter,
+    WritePacer,
+)
 from nicett6.ttbus_device import TTBusDeviceAddress
 from nicett6.utils import async_get_platform_serial_port
 
@@ -15,52 +42,316 @@ _LOGGER = logging.getLogger(__name__)
 ResponseMessageConnectionType: TypeAlias = SerialConnection[ResponseMessageType]
 ResponseMessageReaderType: TypeAlias = SerialReader[ResponseMessageType]
 ResponseMessageWriterType: TypeAlias = SerialWriter[ResponseMessageType]
+ResponseMessagePacerType: TypeAlias = WritePacer[ResponseMessageType]
+
+
+def message_address(msg: ResponseMessageType) -> Optional[TTBusDeviceAddress]:
+    """Return the address of the device that msg relates to (if any)"""
+    if isinstance(msg, (AckResponse, HexPosResponse, PctAckResponse, PctPosResponse)):
+        return msg.tt_addr
+    return None
+
+
+def position_key(msg: ResponseMessageType) -> Optional[Hashable]:
+    """
+    Return the address of a PctPosResponse
+
+    Used to keep only the latest position of each cover - all other
+    messages have a key of None so that they are never superseded
+    """
+    if isinstance(msg, PctPosResponse):
+        return msg.tt_addr
+    return None
 
 
 class TT6Reader(ResponseMessageReaderType):
-    pass
+    """
+    Reader of TT6 response messages
+
+    With the KEEP_LATEST_PER_KEY overflow policy the default overflow_key
+    keeps the latest position message for each cover
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 0,
+        overflow: OverflowPolicy = OverflowPolicy.DROP_OLDEST,
+        overflow_key: Optional[
+            Callable[[ResponseMessageType], Optional[Hashable]]
+        ] = None,
+    ) -> None:
+        super().__init__(
+            maxsize,
+            overflow,
+            overflow_key if overflow_key is not None else position_key,
+        )
+
+
+def response_key(msg: ResponseMessageType) -> Optional[Hashable]:
+    """
+    Return the key used to correlate msg with a request
+
+    The key is (tt_addr, cmd_code) for RSP messages and (tt_addr, response
+    class) for POS messages.   Messages without an address have no key
+    """
+    if isinstance(msg, (AckResponse, HexPosResponse)):
+        return msg.tt_addr, msg.cmd_code
+    if isinstance(msg, (PctAckResponse, PctPosResponse)):
+        return msg.tt_addr, type(msg)
+    return None
+
+
+class TT6ConflatingReader(ConflatingReader[ResponseMessageType]):
+    """
+    Reader of TT6 response messages that only keeps the latest position of
+    each cover
+
+    Acknowledgements, errors and other messages are kept in order
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 0,
+        overflow: OverflowPolicy = OverflowPolicy.DROP_OLDEST,
+    ) -> None:
+        super().__init__(position_key, maxsize, overflow, position_key)
+
+
+MOVE_COALESCE_KEY = "move"
+POS_REQUEST_COALESCE_KEY = "pos_request"
 
 
 class TT6Writer(ResponseMessageWriterType):
+    """
+    Writer for TT6 commands
+
+    Move commands to a cover that are still waiting to be written are replaced
+    by the latest move command to the same cover, and a position request to a
+    cover is not queued again while one is still waiting.   Other commands
+    (e.g. STOP, MOVE_UP, MOVE_DOWN) are never merged and keep their order
+    relative to everything else sent
+    """
+
     def __init__(self, conn: ResponseMessageConnectionType) -> None:
         super().__init__(conn)
 
     async def send_web_on(self) -> None:
-        _LOGGER.debug(f"send_web_on")
+        _LOGGER.debug("send_web_on")
         await self.write(Encode.web_on())
 
     async def send_web_off(self) -> None:
-        _LOGGER.debug(f"send_web_off")
+        _LOGGER.debug("send_web_off")
         await self.write(Encode.web_off())
 
     async def send_simple_command(
         self, tt_addr: TTBusDeviceAddress, cmd_name: str
     ) -> None:
-        _LOGGER.debug(f"send_simple_command {cmd_name} to {tt_addr}")
+        _LOGGER.debug("send_simple_command %s to %s", cmd_name, tt_addr)
         await self.write(Encode.simple_command(tt_addr, cmd_name))
 
     async def send_hex_move_command(
         self, tt_addr: TTBusDeviceAddress, hex_pos: int
     ) -> None:
-        _LOGGER.debug(f"send_hex_move_command {hex_pos} to {tt_addr}")
-        await self.write(Encode.simple_command_with_data(tt_addr, "MOVE_POS", hex_pos))
+        _LOGGER.debug("send_hex_move_command %s to %s", hex_pos, tt_addr)
+        await self.write(
+            Encode.simple_command_with_data(tt_addr, "MOVE_POS", hex_pos),
+            (tt_addr, MOVE_COALESCE_KEY),
+        )
 
     async def send_web_move_command(
         self, tt_addr: TTBusDeviceAddress, pos: int
     ) -> None:
-        _LOGGER.debug(f"send_web_move_command {pos} to {tt_addr}")
-        await self.write(Encode.web_move_command(tt_addr, pos))
+        _LOGGER.debug("send_web_move_command %s to %s", pos, tt_addr)
+        await self.write(
+            Encode.web_move_command(tt_addr, pos), (tt_addr, MOVE_COALESCE_KEY)
+        )
+
+    async def request_simple_command(
+        self, tt_addr: TTBusDeviceAddress, cmd_name: str, timeout: float = 1.0
+    ) -> ResponseMessageType:
+        """Send a simple command and return the response to it"""
+        _LOGGER.debug("request_simple_command %s to %s", cmd_name, tt_addr)
+        return await self.request(
+            Encode.simple_command(tt_addr, cmd_name),
+            (tt_addr, CommandCode[cmd_name]),
+            timeout,
+        )
+
+    async def request_hex_pos(
+        self, tt_addr: TTBusDeviceAddress, timeout: float = 1.0
+    ) -> ResponseMessageType:
+        """Send READ_POS and return the HexPosResponse"""
+        return await self.request_simple_command(tt_addr, "READ_POS", timeout)
+
+    async def request_web_pos(
+        self, tt_addr: TTBusDeviceAddress, timeout: float = 1.0
+    ) -> ResponseMessageType:
+        """Send a web position request and return the PctPosResponse"""
+        _LOGGER.debug("request_web_pos to %s", tt_addr)
+        return await self.request(
+            Encode.web_pos_request(tt_addr), (tt_addr, PctPosResponse), timeout
+        )
 
     async def send_web_pos_request(self, tt_addr: TTBusDeviceAddress) -> None:
-        _LOGGER.debug(f"send_web_pos_request to {tt_addr}")
-        await self.write(Encode.web_pos_request(tt_addr))
+        _LOGGER.debug("send_web_pos_request to %s", tt_addr)
+        await self.write(
+            Encode.web_pos_request(tt_addr), (tt_addr, POS_REQUEST_COALESCE_KEY)
+        )
+
+
+# (kind of acknowledgement, address, command code of a CMD)
+_AckKey: TypeAlias = Tuple[bytes, TTBusDeviceAddress, Optional[CommandCode]]
+
+_ACK_KIND_BY_RESPONSE_TYPE = {
+    AckResponse: b"CMD",
+    HexPosResponse: b"CMD",
+    PctAckResponse: b">",
+    PctPosResponse: b"<",
+}
+
+
+class TT6AdaptivePacer(ResponseMessagePacerType):
+    """
+    Pacer that tunes the gap between commands to the latency of the controller
+
+    The round trip time from a command being written until its acknowledgement
+    (RSP for a CMD, POS # for a POS > and POS * for a POS <) is received is
+    smoothed as srtt and rttvar, and the gap after each write is
+    srtt + 4 * rttvar bounded by min_delay and max_delay
+    Until the first acknowledgement arrives the initial_delay is used
+    Each ErrorResponse doubles the gap (up to max_backoff times) and each
+    acknowledgement reduces the back off again
+    Acknowledgements that take longer than ack_timeout are not sampled
+    Writes awaiting an acknowledgement are kept in order per cover, kind of
+    acknowledgement and (for a CMD) command code, so each acknowledgement is
+    timed from the write it answers
+    A moving cover sends a stream of unsolicited POS * messages, so a POS *
+    for a cover that has sent a POS * or POS # within movement_interval is
+    not sampled as the acknowledgement of a POS <
+    """
+
+    RTT_GAIN = 0.125
+    RTTVAR_GAIN = 0.25
+    BACKOFF_RECOVERY = 0.75
+
+    def __init__(
+        self,
+        initial_delay: float = 0.05,
+        min_delay: float = 0.005,
+        max_delay: float = 0.5,
+        ack_timeout: float = 1.0,
+        max_backoff: float = 16.0,
+        movement_interval: float = 2.7,
+    ) -> None:
+        super().__init__(initial_delay)
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.ack_timeout = ack_timeout
+        self.max_backoff = max_backoff
+        self.movement_interval = movement_interval
+        self.srtt: Optional[float] = None
+        self.rttvar: float = 0.0
+        self.backoff: float = 1.0
+        self._written: Dict[_AckKey, Deque[float]] = {}
+        self._last_pos: Dict[TTBusDeviceAddress, float] = {}
+
+    @property
+    def post_write_delay(self) -> float:
+        if self.srtt is None:
+            delay = self._post_write_delay
+        else:
+            delay = self.srtt + 4 * self.rttvar
+        return min(max(delay * self.backoff, self.min_delay), self.max_delay)
+
+    def message_written(self, msg: bytes) -> None:
+        key = self._ack_key(msg)
+        if key is None:
+            return
+        now = perf_counter()
+        written = self._written.setdefault(key, deque())
+        while written and now - written[0] > self.ack_timeout:
+            written.popleft()  # Never acknowledged
+        written.append(now)
+
+    def messages_received(self, msgs: Sequence[ResponseMessageType]) -> None:
+        now = perf_counter()
+        for msg in msgs:
+            if isinstance(msg, ErrorResponse):
+                self.backoff = min(self.backoff * 2, self.max_backoff)
+                _LOGGER.debug("Error received - write back off is %r", self.backoff)
+                continue
+            if not isinstance(
+                msg, (AckResponse, HexPosResponse, PctAckResponse, PctPosResponse)
+            ):
+                continue
+            cmd_code = (
+                msg.cmd_code if isinstance(msg, (AckResponse, HexPosResponse)) else None
+            )
+            key = _ACK_KIND_BY_RESPONSE_TYPE[type(msg)], msg.tt_addr, cmd_code
+            written = self._pop_written(key)
+            if isinstance(msg, (PctAckResponse, PctPosResponse)):
+                last_pos = self._last_pos.get(msg.tt_addr)
+                self._last_pos[msg.tt_addr] = now
+                if (
+                    isinstance(msg, PctPosResponse)
+                    and last_pos is not None
+                    and now - last_pos < self.movement_interval
+                ):
+                    continue  # Probably a movement report rather than the ack
+            if written is None:
+                continue
+            self.backoff = max(self.backoff * self.BACKOFF_RECOVERY, 1.0)
+            rtt = now - written
+            if rtt <= self.ack_timeout:
+                self.add_sample(rtt)
+
+    def add_sample(self, rtt: float) -> None:
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar += self.RTTVAR_GAIN * (abs(self.srtt - rtt) - self.rttvar)
+            self.srtt += self.RTT_GAIN * (rtt - self.srtt)
+
+    def _pop_written(self, key: _AckKey) -> Optional[float]:
+        """Return the time of the oldest write awaiting the acknowledgement key"""
+        written = self._written.get(key)
+        if not written:
+            return None
+        result = written.popleft()
+        if not written:
+            del self._written[key]
+        return result
+
+    @staticmethod
+    def _ack_key(msg: bytes) -> Optional[_AckKey]:
+        """Return the key of the acknowledgement expected for msg (if any)"""
+        args = msg.split()
+        try:
+            if args[0] == b"CMD":
+                return (
+                    b"CMD",
+                    TTBusDeviceAddress(int(args[1], 16), int(args[2], 16)),
+                    CommandCode(int(args[3], 16)),
+                )
+            if args[0] == b"POS":
+                return (
+                    args[1],
+                    TTBusDeviceAddress(int(args[2], 16), int(args[3], 16)),
+                    None,
+                )
+        except (IndexError, ValueError):
+            pass
+        return None
 
 
 class TT6Connection(ResponseMessageConnectionType):
     pass
 
 
-async def open(serial_port: Optional[str] = None) -> TT6Connection:
+async def open(
+    serial_port: Optional[str] = None, adaptive_pacing: bool = False
+) -> TT6Connection:
     if serial_port is None:
         serial_port = await async_get_platform_serial_port()
     conn = TT6Connection(
@@ -69,6 +360,10 @@ async def open(serial_port: Optional[str] = None) -> TT6Connection:
         TT6Reader,
         TT6Writer,
         0.05,
+        batch_decoder=Decode.decode_many,
+        pacer=TT6AdaptivePacer(0.05) if adaptive_pacing else None,
+        response_key=response_key,
+        message_address=message_address,
         url=serial_port,
         baudrate=19200,
         timeout=None,
@@ -80,8 +375,8 @@ async def open(serial_port: Optional[str] = None) -> TT6Connection:
 
 
 @asynccontextmanager
-async def open_connection(serial_port=None):
-    conn = await open(serial_port)
+async def open_connection(serial_port=None, adaptive_pacing=False):
+    conn = await open(serial_port, adaptive_pacing)
     try:
         yield conn
     finally:
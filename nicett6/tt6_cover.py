@@ -1,5 +1,6 @@
 import logging
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from typing import Callable, List
 
 from nicett6.command_code import CommandCode
 from nicett6.cover import Cover
@@ -18,11 +19,23 @@ _LOGGER = logging.getLogger(__name__)
 
 @dataclass
 class TT6Cover:
-    """Class that sends commands to a `Cover` that is connected to the TTBus"""
+    """
+    Class that sends commands to a `Cover` that is connected to the TTBus
+
+    Each of command_listeners is called with the TT6Cover before a movement
+    or stop command is sent (but not before a position request)
+    """
 
     tt_addr: TTBusDeviceAddress
     cover: Cover
     writer: TT6Writer
+    command_listeners: List[Callable[["TT6Cover"], None]] = field(
+        default_factory=list, repr=False, compare=False
+    )
+
+    def _command_sent(self) -> None:
+        for listener in self.command_listeners:
+            listener(self)
 
     async def stop_notifier(self) -> None:
         await self.cover.stop_notifier()
@@ -31,19 +44,23 @@ class TT6Cover:
         await self.writer.send_web_pos_request(self.tt_addr)
 
     async def send_simple_command(self, cmd_name: str) -> None:
-        _LOGGER.debug(f"sending {cmd_name} to {self.cover.name}")
+        _LOGGER.debug("sending %s to %s", cmd_name, self.cover.name)
+        self._command_sent()
         await self.writer.send_simple_command(self.tt_addr, cmd_name)
 
     async def send_pos_command(self, pos: int) -> None:
-        _LOGGER.debug(f"moving {self.cover.name} to {pos}")
+        _LOGGER.debug("moving %s to %s", self.cover.name, pos)
+        self._command_sent()
         await self.writer.send_web_move_command(self.tt_addr, pos)
 
     async def send_hex_move_command(self, hex_pos: int) -> None:
-        _LOGGER.debug(f"moving {self.cover.name} to hex pos {hex_pos}")
+        _LOGGER.debug("moving %s to hex pos %s", self.cover.name, hex_pos)
+        self._command_sent()
         await self.writer.send_hex_move_command(self.tt_addr, hex_pos)
 
     async def send_close_command(self) -> None:
-        _LOGGER.debug(f"sending MOVE_UP to {self.cover.name}")
+        _LOGGER.debug("sending MOVE_UP to %s", self.cover.name)
+        self._command_sent()
         await self.writer.send_simple_command(self.tt_addr, "MOVE_UP")
 
     async def handle_response_message(self, msg: ResponseMessageType) -> None:
@@ -67,7 +84,7 @@ class TT6Cover:
                 # response will come from the controller up to
                 # 2.5 secs after the Ack, which will call moved()
                 # again and initiate another idle delay check
-                pass
+                await self.cover.set_stopping()
             elif msg.cmd_code in {
                 CommandCode.MOVE_POS_1,
                 CommandCode.MOVE_POS_2,
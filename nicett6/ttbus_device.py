@@ -1,26 +1,75 @@
-from typing import Tuple
+from typing import Dict, Tuple
 
 
 class TTBusDeviceAddress:
-    def __init__(self, address: int, node: int):
-        self.address = address
-        self.node = node
+    """
+    Immutable address of a TTBus device
+
+    Instances are interned so that TTBusDeviceAddress(address, node) always
+    returns the same object for the same (address, node).   The hash is
+    computed once and equality is usually decided by identity, so using an
+    address as a dict key does not allocate
+    """
+
+    __slots__ = ("_address", "_node", "_hash")
+
+    _address: int
+    _node: int
+    _hash: int
+
+    _interned: Dict[Tuple[int, int], "TTBusDeviceAddress"] = {}
+
+    def __new__(cls, address: int, node: int) -> "TTBusDeviceAddress":
+        key = (address, node)
+        tt_addr = cls._interned.get(key)
+        if tt_addr is None:
+            tt_addr = super().__new__(cls)
+            object.__setattr__(tt_addr, "_address", address)
+            object.__setattr__(tt_addr, "_node", node)
+            object.__setattr__(tt_addr, "_hash", hash(key))
+            tt_addr = cls._interned.setdefault(key, tt_addr)
+        return tt_addr
+
+    @property
+    def address(self) -> int:
+        return self._address
+
+    @property
+    def node(self) -> int:
+        return self._node
 
     @property
     def id(self) -> str:
-        return f"{self.address:02X}_{self.node:02X}"
+        return f"{self._address:02X}_{self._node:02X}"
 
     @property
     def as_tuple(self) -> Tuple[int, int]:
-        return self.address, self.node
+        return self._address, self._node
+
+    def __setattr__(self, name: str, value: object) -> None:
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name: str) -> None:
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __reduce__(self):
+        return type(self), self.as_tuple
+
+    def __copy__(self) -> "TTBusDeviceAddress":
+        return self
+
+    def __deepcopy__(self, memo) -> "TTBusDeviceAddress":
+        return self
 
     def __str__(self) -> str:
-        return f"{type(self).__name__}(0x{self.address:02X}, 0x{self.node:02X})"
+        return f"{type(self).__name__}(0x{self._address:02X}, 0x{self._node:02X})"
 
     def __eq__(self, other: object):
+        if self is other:
+            return True
         if not isinstance(other, TTBusDeviceAddress):
             return False
         return self.as_tuple == other.as_tuple
 
     def __hash__(self) -> int:
-        return hash(self.as_tuple)
+        return self._hash
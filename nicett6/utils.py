@@ -6,7 +6,9 @@ import logging
 import platform
 import re
 from collections.abc import Awaitable, Callable
-from typing import Coroutine, Sequence, Set, Tuple
+from enum import Enum
+from time import perf_counter
+from typing import Coroutine, Dict, Optional, Sequence, Tuple
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -14,6 +16,10 @@ MIN_ASPECT_RATIO = 0.3
 MAX_ASPECT_RATIO = 3.5
 PCT_ABS_TOL = 0.0000001
 
+_FIXED_LEN_HEX_PATTERN = re.compile("[a-fA-F0-9]{2,2}$")
+_VARIABLE_LEN_HEX_PATTERN = re.compile("[a-fA-F0-9]{1,2}$")
+_PCT_PATTERN = re.compile("[0-9]{4,4}$")
+
 
 def get_system_serial_port(system: str) -> str:
     """Work out the most likely serial port given the type of system. YMMV."""
@@ -39,10 +45,7 @@ async def async_get_platform_serial_port() -> str:
 
 def hex_arg_to_int(arg: str, fixed_len: bool = True) -> int:
     """Parse and convert a 2 char hex string"""
-    if fixed_len:
-        pat = re.compile("[a-fA-F0-9]{2,2}$")
-    else:
-        pat = re.compile("[a-fA-F0-9]{1,2}$")
+    pat = _FIXED_LEN_HEX_PATTERN if fixed_len else _VARIABLE_LEN_HEX_PATTERN
     m = pat.match(arg)
     if m is None:
         raise ValueError(f"Invalid hex string: {arg!r}")
@@ -51,8 +54,7 @@ def hex_arg_to_int(arg: str, fixed_len: bool = True) -> int:
 
 def pct_arg_to_int(arg: str) -> int:
     """Parse a numeric string that represents a percentage in units of 0.1%.  1000 == 100%"""
-    pat = re.compile("[0-9]{4,4}$")
-    m = pat.match(arg)
+    m = _PCT_PATTERN.match(arg)
     if m is None:
         raise ValueError(f"Invalid percent string: {arg!r}")
     pct = int(m.group(0))
@@ -66,19 +68,188 @@ class AsyncObserver:
         pass
 
 
+class NotificationMode(Enum):
+    """How AsyncObservable.notify_observers delivers updates to its observers"""
+
+    SEQUENTIAL = "sequential"  # Await each observer in turn
+    CONCURRENT = "concurrent"  # Await all observers at the same time
+    BACKGROUND = "background"  # Queue updates for each observer and return
+
+
+class ObserverSubscription:
+    """
+    The notification settings and delivery state of an attached observer
+
+    timeout limits how long an update of the observer may take
+    maxsize bounds the queue of pending updates in BACKGROUND mode - an update
+    is dropped if the queue is full since a queued update will already cause
+    the observer to see the latest state of the observable
+    min_interval limits the rate of updates - an update that comes too soon
+    after the previous one is deferred to a single trailing update at the end
+    of the interval, so the final state is always delivered
+    """
+
+    def __init__(
+        self,
+        observer: AsyncObserver,
+        observable: "AsyncObservable",
+        timeout: Optional[float] = None,
+        maxsize: int = 1,
+        min_interval: Optional[float] = None,
+    ) -> None:
+        self.observer = observer
+        self.observable = observable
+        self.timeout = timeout
+        self.min_interval = min_interval
+        self.queue: asyncio.Queue[None] = asyncio.Queue(maxsize)
+        self.task: Optional[asyncio.Task] = None
+        self.trailing: Optional[asyncio.Task] = None
+        self.last_update: float = float("-inf")
+        self.dropped: int = 0
+        self.throttled: int = 0
+
+    def due(self) -> bool:
+        """
+        Returns True if the observer should be updated now
+
+        Otherwise makes sure that a trailing update is scheduled
+        """
+        if self.min_interval is None:
+            return True
+        now = perf_counter()
+        next_update = self.last_update + self.min_interval
+        if self.trailing is None and now >= next_update:
+            self.last_update = now
+            return True
+        self.throttled += 1
+        if self.trailing is None:
+            self.trailing = asyncio.create_task(
+                self._trailing_update(next_update - now)
+            )
+        return False
+
+    async def _trailing_update(self, delay: float) -> None:
+        await asyncio.sleep(delay)
+        self.trailing = None
+        self.last_update = perf_counter()
+        if self.observable.notification_mode is NotificationMode.BACKGROUND:
+            self.enqueue()
+            return
+        try:
+            await self.update()
+        except Exception:
+            _LOGGER.exception("Trailing update of %r failed", self.observer)
+
+    async def update(self) -> None:
+        if self.timeout is None:
+            await self.observer.update(self.observable)
+        else:
+            await asyncio.wait_for(self.observer.update(self.observable), self.timeout)
+
+    def enqueue(self) -> None:
+        try:
+            self.queue.put_nowait(None)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._deliver())
+
+    async def _deliver(self) -> None:
+        queue = self.queue
+        while True:
+            await queue.get()
+            try:
+                await self.update()
+            except Exception:
+                _LOGGER.exception("Background update of %r failed", self.observer)
+            finally:
+                queue.task_done()
+
+    async def flush(self) -> None:
+        """Wait until trailing and queued updates have been delivered"""
+        if self.trailing is not None:
+            await self.trailing
+        await self.queue.join()
+
+    def cancel(self) -> None:
+        """Stop delivery and discard any deferred or queued updates"""
+        if self.trailing is not None:
+            self.trailing.cancel()
+            self.trailing = None
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        while not self.queue.empty():
+            self.queue.get_nowait()
+            self.queue.task_done()
+
+
 class AsyncObservable:
-    def __init__(self) -> None:
-        self.observers: Set[AsyncObserver] = set()
+    """
+    Notifies attached observers of changes
+
+    By default each observer is awaited in turn and any exception propagates
+    to the caller of notify_observers.   In CONCURRENT mode the observers are
+    awaited at the same time and in BACKGROUND mode notify_observers only
+    queues the updates, which are delivered by a task per observer.   In
+    both cases an observer that fails or times out is logged and does not
+    affect the other observers
+    """
+
+    def __init__(
+        self, notification_mode: NotificationMode = NotificationMode.SEQUENTIAL
+    ) -> None:
+        self.observers: Dict[AsyncObserver, ObserverSubscription] = {}
+        self.notification_mode = notification_mode
 
-    def attach(self, observer: AsyncObserver) -> None:
-        self.observers.add(observer)
+    def attach(
+        self,
+        observer: AsyncObserver,
+        timeout: Optional[float] = None,
+        maxsize: int = 1,
+        min_interval: Optional[float] = None,
+    ) -> None:
+        if observer in self.observers:
+            self.observers[observer].cancel()
+        self.observers[observer] = ObserverSubscription(
+            observer, self, timeout, maxsize, min_interval
+        )
 
     def detach(self, observer: AsyncObserver) -> None:
-        self.observers.remove(observer)
+        self.observers.pop(observer).cancel()
 
     async def notify_observers(self) -> None:
-        for o in self.observers:
-            await o.update(self)
+        mode = self.notification_mode
+        if mode is NotificationMode.SEQUENTIAL:
+            for subscription in tuple(self.observers.values()):
+                if subscription.due():
+                    await subscription.update()
+        elif mode is NotificationMode.BACKGROUND:
+            for subscription in tuple(self.observers.values()):
+                if subscription.due():
+                    subscription.enqueue()
+        else:
+            await self._notify_concurrently()
+
+    async def _notify_concurrently(self) -> None:
+        subscriptions = [s for s in tuple(self.observers.values()) if s.due()]
+        results = await asyncio.gather(
+            *(subscription.update() for subscription in subscriptions),
+            return_exceptions=True,
+        )
+        for subscription, result in zip(subscriptions, results):
+            if isinstance(result, asyncio.CancelledError):
+                raise result
+            if isinstance(result, BaseException):
+                _LOGGER.error(
+                    "Update of %r failed", subscription.observer, exc_info=result
+                )
+
+    async def flush_observers(self) -> None:
+        """Wait until trailing and queued BACKGROUND updates have been delivered"""
+        for subscription in tuple(self.observers.values()):
+            await subscription.flush()
 
 
 def check_pos(name: str, pos: int) -> int:
@@ -8,6 +8,8 @@ from nicett6.tt6_connection import TT6Connection, TT6Reader, TT6Writer
 def make_mock_conn(reader_return_value) -> AsyncMock:
     mock_reader = AsyncMock(name="reader", spec=TT6Reader)
     mock_reader.__aiter__.return_value = reader_return_value
+    mock_reader.batches = MagicMock()
+    mock_reader.batches.return_value.__aiter__.return_value = [reader_return_value]
 
     mock_writer = AsyncMock(name="writer", spec=TT6Writer)
 
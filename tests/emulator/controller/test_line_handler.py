@@ -1,6 +1,6 @@
 import asyncio
 from unittest import IsolatedAsyncioTestCase
-from unittest.mock import AsyncMock, MagicMock, PropertyMock
+from unittest.mock import AsyncMock, MagicMock, PropertyMock, patch
 
 from nicett6.command_code import CommandCode
 from nicett6.consts import RCV_EOL
@@ -31,6 +31,27 @@ class TestHandleWebOnCommands(IsolatedAsyncioTestCase):
             LineHandler.MSG_WEB_COMMANDS_ON
         )
 
+    async def test_handle_web_on_latency(self):
+        line_bytes = b"WEB_ON" + RCV_EOL
+        wrapped_writer = AsyncMock()
+        web_pos_manager = AsyncMock()
+        web_pos_manager.web_on = False
+        device_manager = AsyncMock()
+        server_controller = AsyncMock()
+        line_handler = LineHandler(
+            wrapped_writer,
+            web_pos_manager,
+            device_manager,
+            server_controller,
+            0.5,
+        )
+        with patch("asyncio.sleep") as mock_sleep:
+            await line_handler.handle_line(line_bytes)
+        mock_sleep.assert_awaited_once_with(0.5)
+        wrapped_writer.write_msg.assert_awaited_once_with(
+            LineHandler.MSG_WEB_COMMANDS_ON
+        )
+
     async def test_handle_web_on_err(self):
         line_bytes = b"WEB_ON BAD" + RCV_EOL
         wrapped_writer = AsyncMock()
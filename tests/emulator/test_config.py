@@ -15,6 +15,7 @@ class TestConfig(TestCase):
         config = build_config(["-f", self.filename])
         self.assertEqual(config["port"], 50200)
         self.assertEqual(config["web_on"], False)
+        self.assertEqual(config["latency"], 0.0)
         self.assertEqual(len(config["covers"]), 2)
         screen = config["covers"][0]
         self.assertEqual(screen.name, "screen")
@@ -26,8 +27,9 @@ class TestConfig(TestCase):
         self.assertEqual(mask.name, "mask")
 
     def test_build_config2(self):
-        config = build_config(["-f", self.filename, "-w", "-p", "50300"])
+        config = build_config(["-f", self.filename, "-w", "-p", "50300", "-l", "0.02"])
         self.assertEqual(config["web_on"], True)
+        self.assertAlmostEqual(config["latency"], 0.02)
         self.assertEqual(config["port"], 50300)
 
     def test_build_config3(self):
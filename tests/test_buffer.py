@@ -132,3 +132,24 @@ class TestBuffer(unittest.TestCase):
                 self.assertEqual(messages1, expected_messages1)
                 self.assertEqual(messages2, expected_messages2)
                 self.assertEqual(b.buf, expected_tail)
+
+    def test_iter_messages(self):
+        b = MessageBuffer(b"\r")
+        messages = b.iter_messages(b"RSP 2 4 11\rRSP 3 4 11\rRSP 3")
+        views = list(messages)
+        self.assertTrue(all(isinstance(v, memoryview) for v in views))
+        self.assertEqual([bytes(v) for v in views], [b"RSP 2 4 11\r", b"RSP 3 4 11\r"])
+        self.assertEqual(b.buf, b"RSP 3")
+        self.assertEqual(
+            [bytes(v) for v in b.iter_messages(b" 4 11\r")], [b"RSP 3 4 11\r"]
+        )
+        self.assertEqual(b.buf, b"")
+
+    def test_iter_messages_partially_consumed(self):
+        b = MessageBuffer(b"\r")
+        messages = b.iter_messages(b"RSP 2 4 11\rRSP 3 4 11\rRSP 3")
+        self.assertEqual(bytes(next(messages)), b"RSP 2 4 11\r")
+        messages.close()
+        self.assertEqual(b.buf, b"RSP 3 4 11\rRSP 3")
+        self.assertEqual(b.append_chunk(b" 4 11\r"), [b"RSP 3 4 11\r", b"RSP 3 4 11\r"])
+        self.assertEqual(b.buf, b"")
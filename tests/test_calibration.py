@@ -0,0 +1,171 @@
+import json
+import os
+import tempfile
+from unittest import IsolatedAsyncioTestCase, TestCase
+from unittest.mock import patch
+
+from nicett6.calibration import CalibrationStore, SpeedProfile
+from nicett6.cover import Cover
+from nicett6.ttbus_device import TTBusDeviceAddress
+from tests import MockSleepInstant
+
+
+class TestSpeedProfile(TestCase):
+    def test_empty(self):
+        profile = SpeedProfile()
+        self.assertIsNone(profile.mean_speed)
+        self.assertIsNone(profile.movement_threshold)
+        self.assertIsNone(profile.travel_time(1000, 0))
+        self.assertEqual(profile.travel_time(500, 500), 0.0)
+
+    def test_learn(self):
+        profile = SpeedProfile()
+        profile.learn(False, 100.0, 1.0, 0.5, 1.0)
+        profile.learn(True, 50.0, 2.0, None, 0.8)
+        self.assertAlmostEqual(profile.down_speed, 100.0)
+        self.assertAlmostEqual(profile.up_speed, 50.0)
+        self.assertAlmostEqual(profile.mean_speed, 75.0)
+        self.assertAlmostEqual(profile.start_lag, 1.3)
+        self.assertAlmostEqual(profile.deceleration_time, 0.5)
+        self.assertAlmostEqual(profile.report_interval, 1.0)
+        self.assertEqual(profile.movements, 2)
+
+    def test_travel_time(self):
+        profile = SpeedProfile(100.0, 50.0, 1.0, 0.5)
+        self.assertAlmostEqual(profile.travel_time(1000, 500), 11.5)
+        self.assertAlmostEqual(profile.travel_time(0, 500), 6.5)
+        self.assertAlmostEqual(profile.travel_time(0, 500, from_rest=False), 5.5)
+
+    def test_movement_threshold(self):
+        profile = SpeedProfile(report_interval=1.0, movements=2)
+        self.assertIsNone(profile.movement_threshold)
+        profile.movements = 3
+        self.assertAlmostEqual(profile.movement_threshold, 1.5)
+        profile.start_lag = 1.0
+        self.assertAlmostEqual(profile.movement_threshold, 3.0)
+
+
+class TestCalibrationStore(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.sleeper = MockSleepInstant()
+        for target in (
+            "nicett6.cover.perf_counter",
+            "nicett6.calibration.perf_counter",
+        ):
+            patcher = patch(target, self.sleeper.perf_counter)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.tt_addr = TTBusDeviceAddress(0x02, 0x04)
+        self.cover = Cover("Test", 2.0)
+
+    async def asyncTearDown(self):
+        await self.cover.stop_notifier()
+
+    async def move(self, pos: int, secs: float = 1.0) -> None:
+        self.sleeper.offset += secs
+        await self.cover.set_pos(pos)
+
+    async def move_down(self) -> None:
+        await self.cover.set_target_pos_hint(0)
+        await self.move(950, 1.5)
+        await self.move(850)
+        await self.move(750)
+        await self.move(700)
+        await self.cover.set_idle()
+
+    async def test_learn_movement(self):
+        store = CalibrationStore()
+        store.attach(self.tt_addr, self.cover)
+        await self.move_down()
+        profile = store.get(self.tt_addr)
+        self.assertAlmostEqual(profile.down_speed, 100.0)
+        self.assertIsNone(profile.up_speed)
+        self.assertAlmostEqual(profile.start_lag, 1.0)
+        self.assertAlmostEqual(profile.deceleration_time, 0.5)
+        self.assertAlmostEqual(profile.report_interval, 1.0)
+        self.assertEqual(profile.movements, 1)
+
+    async def test_learn_movement_without_ack(self):
+        store = CalibrationStore()
+        store.attach(self.tt_addr, self.cover)
+        await self.cover.set_pos(0)
+        await self.cover.set_idle()
+        await self.move(50)
+        await self.move(100)
+        await self.move(150)
+        await self.move(170)
+        await self.cover.set_idle()
+        profile = store.get(self.tt_addr)
+        self.assertAlmostEqual(profile.up_speed, 50.0)
+        self.assertAlmostEqual(profile.start_lag, 0.0)
+        self.assertAlmostEqual(profile.deceleration_time, 0.6)
+        self.assertEqual(profile.movements, 1)
+
+    async def test_short_movement_ignored(self):
+        store = CalibrationStore()
+        store.attach(self.tt_addr, self.cover)
+        await self.cover.set_target_pos_hint(900)
+        await self.move(900)
+        await self.cover.set_idle()
+        self.assertEqual(store.get(self.tt_addr).movements, 0)
+
+    async def test_seed_cover(self):
+        store = CalibrationStore(idle_detection=True)
+        store.profiles[self.tt_addr.id] = SpeedProfile(
+            100.0, 50.0, report_interval=1.0, movements=3
+        )
+        store.attach(self.tt_addr, self.cover)
+        self.assertAlmostEqual(self.cover.speed, 75.0)
+        self.assertAlmostEqual(self.cover.MAX_EXTRAPOLATION_INTERVAL, 1.0)
+        self.assertAlmostEqual(self.cover.MOVEMENT_THRESHOLD_INTERVAL, 1.5)
+        self.assertAlmostEqual(Cover.MOVEMENT_THRESHOLD_INTERVAL, 2.7)
+
+    async def test_seed_cover_longer_threshold(self):
+        store = CalibrationStore(idle_detection=True)
+        store.profiles[self.tt_addr.id] = SpeedProfile(
+            100.0, 50.0, 1.0, report_interval=2.0, movements=3
+        )
+        store.attach(self.tt_addr, self.cover)
+        self.assertAlmostEqual(self.cover.MOVEMENT_THRESHOLD_INTERVAL, 4.5)
+        self.assertFalse(self.cover.is_moving)
+        self.assertFalse(self.cover.state.is_moving)
+
+    async def test_learned_threshold_covers_start_up_lag(self):
+        store = CalibrationStore(idle_detection=True)
+        store.profiles[self.tt_addr.id] = SpeedProfile(
+            None, 100.0, 1.0, 0.5, 1.0, movements=3
+        )
+        store.attach(self.tt_addr, self.cover)
+        self.assertAlmostEqual(self.cover.MOVEMENT_THRESHOLD_INTERVAL, 3.0)
+        await self.cover.set_target_pos_hint(0)
+        self.sleeper.offset += 1.8
+        self.assertTrue(self.cover.is_moving)
+        self.assertFalse(self.cover.idle_event.is_set())
+        deadline = self.cover._notifier.scheduler.deadline(self.cover)
+        self.assertGreater(deadline, self.sleeper.perf_counter())
+
+    async def test_idle_detection_off(self):
+        store = CalibrationStore()
+        store.profiles[self.tt_addr.id] = SpeedProfile(
+            100.0, 50.0, report_interval=1.0, movements=3
+        )
+        store.attach(self.tt_addr, self.cover)
+        self.assertAlmostEqual(self.cover.MOVEMENT_THRESHOLD_INTERVAL, 2.7)
+
+    async def test_save_load(self):
+        with tempfile.TemporaryDirectory() as dirname:
+            path = os.path.join(dirname, "calibration.json")
+            store = CalibrationStore.load(path)
+            self.assertEqual(store.profiles, {})
+            store.attach(self.tt_addr, self.cover)
+            await self.move_down()
+            store.save()
+            with open(path) as f:
+                data = json.load(f)
+            self.assertEqual(list(data.keys()), ["02_04"])
+            loaded = CalibrationStore.load(path)
+            self.assertEqual(loaded.get(self.tt_addr), store.get(self.tt_addr))
+
+    def test_save_without_path(self):
+        with self.assertRaises(ValueError):
+            CalibrationStore().save()
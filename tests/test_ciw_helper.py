@@ -1,8 +1,23 @@
+import os
+import tempfile
+from asyncio import Event
+from asyncio import sleep as asyncio_sleep
 from unittest import IsolatedAsyncioTestCase, TestCase
+from unittest.mock import AsyncMock, patch
 
-from nicett6.ciw_helper import CIWHelper
+from nicett6.ciw_helper import (
+    HEX_QUANTISED_POSITIONS,
+    AspectRatioEntry,
+    AspectRatioTable,
+    CIWHelper,
+    CIWMovePlan,
+    calculate_image_height,
+    position_preference,
+)
 from nicett6.cover import Cover
 from nicett6.image_def import ImageDef
+from nicett6.tt6_cover import TT6Cover
+from nicett6.ttbus_device import TTBusDeviceAddress
 
 
 class TestCIWHelper(IsolatedAsyncioTestCase):
@@ -108,3 +123,333 @@ class TestCIWHelper(IsolatedAsyncioTestCase):
             self.assertAlmostEqual(self.helper.image_diagonal, 3.47779298)
         if self.helper.image_area is not None:
             self.assertAlmostEqual(self.helper.image_area, 4.3584)
+
+
+class TestCIWHelperCache(IsolatedAsyncioTestCase):
+    def setUp(self):
+        image_def = ImageDef(0.05, 1.8, 16 / 9)
+        self.helper = CIWHelper(Cover("Screen", 2.0), Cover("Mask", 0.8), image_def)
+        patcher = patch(
+            "nicett6.ciw_helper.calculate_image_height",
+            wraps=calculate_image_height,
+        )
+        self.mock_calc = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def asyncTearDown(self):
+        await self.helper.screen.stop_notifier()
+        await self.helper.mask.stop_notifier()
+
+    def read_all(self):
+        return (
+            self.helper.image_height,
+            self.helper.image_diagonal,
+            self.helper.image_area,
+            self.helper.image_is_visible,
+            self.helper.aspect_ratio,
+        )
+
+    async def test_cached(self):
+        await self.helper.screen.set_pos(0)
+        for _ in range(3):
+            self.read_all()
+        self.assertEqual(self.mock_calc.call_count, 1)
+
+    async def test_recalculated_on_move(self):
+        await self.helper.screen.set_pos(0)
+        self.read_all()
+        await self.helper.mask.set_pos(265)
+        aspect_ratio = self.helper.aspect_ratio
+        assert aspect_ratio is not None
+        self.assertAlmostEqual(aspect_ratio, 2.34948605)
+        self.assertEqual(self.mock_calc.call_count, 2)
+
+    async def test_covers_not_observed(self):
+        self.assertEqual(self.helper.screen.observers, {})
+        self.assertEqual(self.helper.mask.observers, {})
+
+    async def test_keyed_on_positions(self):
+        self.read_all()
+        self.helper.screen._pos = 0  # Bypass notification
+        self.assertEqual(self.helper.image.screen_pos, 0)
+        self.assertTrue(self.helper.image_is_visible)
+        self.assertEqual(self.mock_calc.call_count, 2)
+
+    async def test_invalidate(self):
+        await self.helper.screen.set_pos(0)
+        self.assertAlmostEqual(self.helper.image_height, 1.8)
+        self.helper.image_def.height = 1.5
+        self.assertAlmostEqual(self.helper.image_height, 1.8)  # Still cached
+        self.helper.invalidate()
+        self.assertAlmostEqual(self.helper.image_height, 1.5)
+
+
+class TestAspectRatioTable(IsolatedAsyncioTestCase):
+    def setUp(self):
+        image_def = ImageDef(0.05, 1.8, 16 / 9)
+        self.helper = CIWHelper(Cover("Screen", 2.0), Cover("Mask", 0.8), image_def)
+
+    async def check_entry(self, entry: AspectRatioEntry) -> None:
+        """Moving the covers to the entry's positions gives its aspect ratio"""
+        await self.helper.screen.set_pos(entry.screen_pos)
+        await self.helper.mask.set_pos(entry.mask_pos)
+        aspect_ratio = self.helper.aspect_ratio
+        assert aspect_ratio is not None
+        self.assertAlmostEqual(aspect_ratio, entry.aspect_ratio)
+
+    async def asyncTearDown(self):
+        await self.helper.screen.stop_notifier()
+        await self.helper.mask.stop_notifier()
+
+    async def test_lookup(self):
+        for target in (2.35, 2.0, 1.85, 2.4):
+            with self.subTest(target=target):
+                entry = self.helper.lookup_aspect_ratio(target)
+                assert entry is not None
+                self.assertAlmostEqual(entry.aspect_ratio, target, delta=0.005)
+                self.assertEqual(entry.screen_pos, 0)  # Mask does the cropping
+                self.assertIn(entry.mask_pos, HEX_QUANTISED_POSITIONS)
+                await self.check_entry(entry)
+
+    async def test_lookup_out_of_range(self):
+        entry = self.helper.lookup_aspect_ratio(1.5)
+        assert entry is not None
+        self.assertAlmostEqual(entry.aspect_ratio, 16 / 9)
+        self.assertEqual((entry.screen_pos, entry.mask_pos), (0, 1000))
+        table = self.helper.aspect_ratio_table
+        entry = self.helper.lookup_aspect_ratio(3.5)
+        assert entry is not None
+        self.assertAlmostEqual(
+            entry.aspect_ratio, table.aspect_ratios[-1], delta=table.tolerance
+        )
+        with self.assertRaises(ValueError):
+            self.helper.lookup_aspect_ratio(10.0)
+
+    async def test_lookup_rule(self):
+        """The preferred entry within tolerance of the nearest aspect ratio"""
+        table = self.helper.aspect_ratio_table
+        ratios = table.aspect_ratios
+        self.assertEqual(ratios, sorted(ratios))
+        self.assertEqual(len(set(ratios)), len(ratios))
+        for target in [1.7 + i * 0.0137 for i in range(130)]:
+            with self.subTest(target=target):
+                best_error = min(abs(ar - target) for ar in ratios)
+                expected = min(
+                    (
+                        entry
+                        for entry in table.entries
+                        if abs(entry.aspect_ratio - target)
+                        <= best_error + table.tolerance
+                    ),
+                    key=lambda entry: position_preference(
+                        entry.screen_pos, entry.mask_pos
+                    ),
+                )
+                self.assertIs(table.lookup(target), expected)
+
+    async def test_cached(self):
+        table = self.helper.aspect_ratio_table
+        self.assertIs(self.helper.aspect_ratio_table, table)
+        await self.helper.screen.set_pos(500)
+        self.assertIs(self.helper.aspect_ratio_table, table)
+
+    async def test_invalidated(self):
+        table = self.helper.aspect_ratio_table
+        self.helper.mask.max_drop = 1.0
+        new_table = self.helper.aspect_ratio_table
+        self.assertIsNot(new_table, table)
+        self.assertEqual(new_table.key[1], 1.0)
+        self.helper.image_def.bottom_border_height = 0.1
+        self.assertIsNot(self.helper.aspect_ratio_table, new_table)
+
+    async def test_save_and_load(self):
+        table = self.helper.aspect_ratio_table
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "ar_table.json")
+            self.helper.save_aspect_ratio_table(path)
+            helper = CIWHelper(
+                Cover("Screen", 2.0), Cover("Mask", 0.8), ImageDef(0.05, 1.8, 16 / 9)
+            )
+            self.assertTrue(helper.load_aspect_ratio_table(path))
+            loaded = helper._aspect_ratio_table
+            assert loaded is not None
+            self.assertIs(helper.aspect_ratio_table, loaded)
+            self.assertEqual(loaded.key, table.key)
+            self.assertEqual(loaded.entries, table.entries)
+            other = CIWHelper(
+                Cover("Screen", 2.5), Cover("Mask", 0.8), ImageDef(0.05, 1.8, 16 / 9)
+            )
+            self.assertFalse(other.load_aspect_ratio_table(path))
+            self.assertIsNone(other._aspect_ratio_table)
+        self.assertFalse(
+            helper.load_aspect_ratio_table(os.path.join(tmpdir, "missing.json"))
+        )
+
+    def test_empty(self):
+        table = AspectRatioTable.build(0.1, 0.8, ImageDef(0.05, 1.8, 16 / 9))
+        self.assertEqual(len(table), 0)
+        self.assertIsNone(table.lookup(2.35))
+
+
+class TestMoveToAspectRatio(IsolatedAsyncioTestCase):
+    def setUp(self):
+        image_def = ImageDef(0.05, 1.8, 16 / 9)
+        self.helper = CIWHelper(Cover("Screen", 2.0), Cover("Mask", 0.8), image_def)
+        self.screen = self.make_tt6_cover(0x02, self.helper.screen)
+        self.mask = self.make_tt6_cover(0x03, self.helper.mask)
+        self.screen.command_listeners.append(self.helper.command_listener)
+        self.mask.command_listeners.append(self.helper.command_listener)
+        self.log = []
+        self.wake = Event()
+        patcher = patch(
+            "nicett6.ciw_helper.planner_asyncio_sleep", side_effect=self.mock_sleep
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def asyncTearDown(self):
+        self.helper.cancel_move()
+
+    def make_tt6_cover(self, address: int, cover: Cover) -> TT6Cover:
+        writer = AsyncMock()
+
+        async def send_hex_move_command(tt_addr, hex_pos):
+            self.log.append((cover.name, hex_pos))
+
+        writer.send_hex_move_command.side_effect = send_hex_move_command
+        return TT6Cover(TTBusDeviceAddress(address, 0x04), cover, writer)
+
+    async def move(self, target_aspect_ratio):
+        return await self.helper.move_to_aspect_ratio(
+            target_aspect_ratio,
+            self.screen.send_hex_move_command,
+            self.mask.send_hex_move_command,
+        )
+
+    async def mock_sleep(self, delay):
+        self.log.append(("sleep", delay))
+        await self.wake.wait()
+        self.wake.clear()
+
+    async def finish_delayed_move(self):
+        task = self.helper._pending_move
+        assert task is not None
+        self.wake.set()
+        await task
+
+    async def test_speed_unknown(self):
+        plan = await self.move(2.35)
+        assert plan is not None
+        self.assertEqual(plan.entry, self.helper.lookup_aspect_ratio(2.35))
+        self.assertIsNone(plan.screen_travel)
+        self.assertEqual(plan.screen_delay, 0.0)
+        self.assertEqual(plan.mask_delay, 0.0)
+        self.assertIsNone(plan.duration)
+        self.assertFalse(self.helper.move_pending)
+        self.assertCountEqual(
+            self.log,
+            [("Screen", plan.entry.screen_hex_pos), ("Mask", plan.entry.mask_hex_pos)],
+        )
+
+    async def test_coordinated(self):
+        self.helper.screen._speed = 100.0
+        self.helper.mask._speed = 50.0
+        plan = await self.move(2.35)
+        assert plan is not None
+        screen_travel = (1000 - plan.entry.screen_pos) / 100.0
+        mask_travel = (1000 - plan.entry.mask_pos) / 50.0
+        self.assertAlmostEqual(plan.screen_travel, screen_travel)
+        self.assertAlmostEqual(plan.mask_travel, mask_travel)
+        self.assertGreater(mask_travel, screen_travel)
+        self.assertAlmostEqual(plan.screen_delay, mask_travel - screen_travel)
+        self.assertEqual(plan.mask_delay, 0.0)
+        self.assertAlmostEqual(plan.duration, mask_travel)
+        # Returns once the mask has started without waiting for the delay
+        self.assertEqual(self.log, [("Mask", plan.entry.mask_hex_pos)])
+        self.assertTrue(self.helper.move_pending)
+        await self.finish_delayed_move()
+        self.assertFalse(self.helper.move_pending)
+        self.assertEqual(
+            self.log,
+            [
+                ("Mask", plan.entry.mask_hex_pos),
+                ("sleep", plan.screen_delay),
+                ("Screen", plan.entry.screen_hex_pos),
+            ],
+        )
+
+    async def test_already_in_position(self):
+        self.helper.screen._speed = 100.0
+        self.helper.mask._speed = 50.0
+        entry = self.helper.lookup_aspect_ratio(16 / 9)
+        assert entry is not None
+        self.assertEqual(entry.mask_pos, 1000)
+        plan = await self.move(16 / 9)
+        self.assertEqual(
+            plan,
+            CIWMovePlan(
+                entry=entry,
+                screen_travel=10.0,
+                mask_travel=0.0,
+                screen_delay=0.0,
+                mask_delay=10.0,
+            ),
+        )
+        self.assertFalse(self.helper.move_pending)
+        self.assertEqual(self.log, [("Screen", 0)])
+
+    async def test_overlapping_moves(self):
+        self.helper.screen._speed = 10.0
+        self.helper.mask._speed = 100.0
+        plan1 = await self.move(2.35)
+        assert plan1 is not None
+        self.assertGreater(plan1.mask_delay, 0.0)
+        await asyncio_sleep(0)  # The delayed mask command is sleeping
+        first_move = self.helper._pending_move
+        plan2 = await self.move(1.78)
+        assert plan2 is not None and first_move is not None
+        await asyncio_sleep(0)
+        self.assertTrue(first_move.cancelled())
+        self.assertNotEqual(plan1.entry.mask_pos, plan2.entry.mask_pos)
+        if self.helper.move_pending:
+            await self.finish_delayed_move()
+        # The mask is already in position for 1.78:1 so is never commanded
+        self.assertEqual(plan2.entry.mask_pos, self.helper.mask.pos)
+        commands = [entry for entry in self.log if entry[0] != "sleep"]
+        self.assertEqual(
+            commands,
+            [
+                ("Screen", plan1.entry.screen_hex_pos),
+                ("Screen", plan2.entry.screen_hex_pos),
+            ],
+        )
+
+    async def test_other_command_cancels_delayed_move(self):
+        self.helper.screen._speed = 10.0
+        self.helper.mask._speed = 100.0
+        plan = await self.move(2.35)
+        assert plan is not None
+        self.assertTrue(self.helper.move_pending)
+        await self.mask.send_simple_command("STOP")
+        self.assertFalse(self.helper.move_pending)
+        await self.screen.send_hex_move_command(0x80)
+        self.assertEqual(
+            self.log, [("Screen", plan.entry.screen_hex_pos), ("Screen", 0x80)]
+        )
+
+    async def test_hex_positions(self):
+        for entry in self.helper.aspect_ratio_table.entries:
+            self.assertEqual(
+                HEX_QUANTISED_POSITIONS[entry.screen_hex_pos], entry.screen_pos
+            )
+            self.assertEqual(
+                HEX_QUANTISED_POSITIONS[entry.mask_hex_pos], entry.mask_pos
+            )
+
+    async def test_cancel_move(self):
+        self.assertFalse(self.helper.cancel_move())
+        self.helper.screen._speed = 10.0
+        self.helper.mask._speed = 100.0
+        await self.move(2.35)
+        self.assertTrue(self.helper.cancel_move())
+        self.assertFalse(self.helper.move_pending)
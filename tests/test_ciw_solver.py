@@ -0,0 +1,133 @@
+from importlib.util import find_spec
+from unittest import TestCase, skipIf
+
+from nicett6.ciw_helper import (
+    AspectRatioTable,
+    calculate_image_area,
+    calculate_image_diagonal,
+    calculate_image_height,
+)
+from nicett6.image_def import ImageDef
+
+HAS_NUMPY = find_spec("numpy") is not None
+
+if HAS_NUMPY:
+    import numpy as np
+
+    from nicett6.ciw_solver import (
+        CIWSolver,
+        calculate_geometry,
+        evaluate_grid,
+        hex_pos_to_pos,
+    )
+
+
+@skipIf(not HAS_NUMPY, "numpy is not installed")
+class TestCIWSolver(TestCase):
+    def setUp(self):
+        self.image_def = ImageDef(0.05, 1.8, 16 / 9)
+        self.solver = CIWSolver(2.0, 0.8, self.image_def)
+
+    def test_hex_pos_to_pos(self):
+        for hex_pos in (0x00, 0x12, 0x4A, 0x80, 0xFF):
+            self.assertEqual(hex_pos_to_pos(hex_pos), round(hex_pos / 0.255))
+
+    def test_grid_matches_scalar(self):
+        positions = [0, 100, 263, 500, 750, 1000]
+        geometry = evaluate_grid(positions, positions, 2.0, 0.8, self.image_def)
+        self.assertEqual(geometry.image_height.shape, (6, 6))
+        for i, screen_pos in enumerate(positions):
+            for j, mask_pos in enumerate(positions):
+                with self.subTest(screen_pos=screen_pos, mask_pos=mask_pos):
+                    height = calculate_image_height(
+                        (1000 - screen_pos) * 2.0 / 1000,
+                        (1000 - mask_pos) * 0.8 / 1000,
+                        self.image_def,
+                    )
+                    if height is None:
+                        self.assertFalse(geometry.image_is_visible[i, j])
+                        continue
+                    self.assertAlmostEqual(geometry.image_height[i, j], height)
+                    width = self.image_def.width
+                    self.assertAlmostEqual(
+                        geometry.image_diagonal[i, j],
+                        calculate_image_diagonal(height, width),
+                    )
+                    self.assertAlmostEqual(
+                        geometry.image_area[i, j],
+                        calculate_image_area(height, width),
+                    )
+                    self.assertAlmostEqual(geometry.aspect_ratio[i, j], width / height)
+
+    def test_scalar_drops(self):
+        geometry = calculate_geometry(1.5, 0.2, self.image_def)
+        height = calculate_image_height(1.5, 0.2, self.image_def)
+        self.assertAlmostEqual(float(geometry.image_height), height)
+        self.assertTrue(geometry.image_is_visible)
+        geometry = calculate_geometry(0.1, 0.0, self.image_def)
+        self.assertFalse(geometry.image_is_visible)
+
+    def test_solve(self):
+        for target in (2.35, 2.0, 1.85):
+            with self.subTest(target=target):
+                solution = self.solver.solve(target)
+                assert solution is not None
+                self.assertAlmostEqual(solution.aspect_ratio, target, delta=0.01)
+                self.assertEqual(solution.screen_pos, 0)
+                self.assertEqual(
+                    solution.mask_pos, hex_pos_to_pos(solution.mask_hex_pos)
+                )
+                height = calculate_image_height(
+                    2.0, (1000 - solution.mask_pos) * 0.8 / 1000, self.image_def
+                )
+                assert height is not None
+                self.assertAlmostEqual(solution.image_height, height)
+
+    def test_solve_native_aspect_ratio(self):
+        solution = self.solver.solve(16 / 9)
+        assert solution is not None
+        self.assertAlmostEqual(solution.aspect_ratio, 16 / 9)
+        self.assertEqual((solution.screen_hex_pos, solution.mask_hex_pos), (0, 255))
+
+    def test_solve_least_movement(self):
+        solution = self.solver.solve(2.35, current=(1000, 1000))
+        assert solution is not None
+        self.assertAlmostEqual(solution.aspect_ratio, 2.35, delta=0.01)
+        # Only the screen needs to move
+        self.assertEqual(solution.mask_pos, 1000)
+
+    def test_solve_many(self):
+        solutions = self.solver.solve_many([2.35, 2.0])
+        self.assertEqual(solutions, [self.solver.solve(2.35), self.solver.solve(2.0)])
+
+    def test_no_visible_image(self):
+        solver = CIWSolver(0.1, 0.8, self.image_def)
+        self.assertIsNone(solver.solve(2.35))
+
+    def test_invalid_aspect_ratio(self):
+        with self.assertRaises(ValueError):
+            self.solver.solve(10.0)
+
+    def test_custom_positions(self):
+        solver = CIWSolver(2.0, 0.8, self.image_def, np.arange(0, 256, 16))
+        solution = solver.solve(2.35)
+        assert solution is not None
+        self.assertEqual(solution.screen_hex_pos % 16, 0)
+        self.assertEqual(solution.mask_hex_pos % 16, 0)
+
+    def test_agrees_with_aspect_ratio_table(self):
+        for screen_max_drop, mask_max_drop in ((2.0, 0.8), (2.5, 1.2)):
+            solver = CIWSolver(screen_max_drop, mask_max_drop, self.image_def)
+            table = AspectRatioTable.build(
+                screen_max_drop, mask_max_drop, self.image_def
+            )
+            for target in np.arange(1.5, 3.5, 0.0031):
+                with self.subTest(max_drops=(screen_max_drop, mask_max_drop)):
+                    entry = table.lookup(float(target))
+                    solution = solver.solve(float(target), table.tolerance)
+                    assert entry is not None and solution is not None
+                    self.assertEqual(
+                        (entry.screen_pos, entry.mask_pos),
+                        (solution.screen_pos, solution.mask_pos),
+                    )
+                    self.assertEqual(entry.aspect_ratio, solution.aspect_ratio)
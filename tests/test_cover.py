@@ -1,9 +1,19 @@
 import logging
+from asyncio import create_task
+from asyncio import sleep as asyncio_sleep
+from asyncio import wait_for
 from dataclasses import dataclass
 from unittest import IsolatedAsyncioTestCase
 from unittest.mock import patch
 
-from nicett6.cover import Cover, PostMovementNotifier, wait_for_motion_to_complete
+from nicett6.cover import (
+    Cover,
+    CoverState,
+    CoverStateObserver,
+    IdleScheduler,
+    PostMovementNotifier,
+    wait_for_motion_to_complete,
+)
 from tests import MockSleepInstant, MockSleepManual
 
 
@@ -11,11 +21,9 @@ class TestCover(IsolatedAsyncioTestCase):
     def setUp(self):
         self.sleeper = MockSleepInstant()
         pc_patcher = patch("nicett6.cover.perf_counter", self.sleeper.perf_counter)
-        sleep_patcher = patch("nicett6.cover.asyncio_sleep", self.sleeper.sleep)
         self.mock_perf_counter = pc_patcher.start()
-        self.mock_sleep = sleep_patcher.start()
         self.addCleanup(pc_patcher.stop)
-        self.addCleanup(sleep_patcher.stop)
+        self.mock_sleep = self.sleeper.sleep
         self.cover = Cover("Test", 0.8)
 
     async def test1(self):
@@ -234,46 +242,236 @@ class TestCover(IsolatedAsyncioTestCase):
         )
 
 
+class TestCoverState(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.sleeper = MockSleepInstant()
+        pc_patcher = patch("nicett6.cover.perf_counter", self.sleeper.perf_counter)
+        pc_patcher.start()
+        self.addCleanup(pc_patcher.stop)
+        self.cover = Cover("Test", 0.8)
+
+    async def asyncTearDown(self):
+        await self.cover.stop_notifier()
+
+    async def test_initial_state(self):
+        self.assertEqual(
+            self.cover.state,
+            CoverState(
+                pos=1000,
+                prev_pos=1000,
+                drop=0.0,
+                is_moving=False,
+                is_going_up=False,
+                is_going_down=False,
+                is_fully_up=True,
+                is_fully_down=False,
+            ),
+        )
+
+    async def test_state_changes(self):
+        state = self.cover.state
+        await self.cover.set_pos(500)
+        self.assertIsNot(self.cover.state, state)
+        state = self.cover.state
+        self.assertIs(self.cover.state, state)
+        self.assertEqual(state.pos, 500)
+        self.assertEqual(state.prev_pos, 1000)
+        self.assertAlmostEqual(state.drop, 0.4)
+        self.assertTrue(state.is_moving)
+        self.assertTrue(state.is_going_down)
+        self.assertFalse(state.is_going_up)
+        await self.cover.set_pos(0)
+        await self.cover.set_idle()
+        state = self.cover.state
+        self.assertFalse(state.is_moving)
+        self.assertFalse(state.is_going_down)
+        self.assertTrue(state.is_fully_down)
+        self.assertEqual(state.prev_pos, 0)
+
+    async def test_state_matches_properties(self):
+        for pos in (900, 1000, 3, 3):
+            await self.cover.set_pos(pos)
+            state = self.cover.state
+            self.assertEqual(state.is_moving, self.cover.is_moving)
+            self.assertEqual(state.is_going_up, self.cover.is_going_up)
+            self.assertEqual(state.is_going_down, self.cover.is_going_down)
+            self.assertAlmostEqual(state.drop, self.cover.drop)
+
+    async def test_state_observer(self):
+        class Recorder(CoverStateObserver):
+            def __init__(self):
+                self.states = []
+
+            async def update_state(self, cover, state):
+                self.states.append((cover, state))
+
+        recorder = Recorder()
+        self.cover.attach(recorder)
+        await self.cover.set_pos(800)
+        await self.cover.set_idle()
+        self.assertEqual(len(recorder.states), 2)
+        self.assertIs(recorder.states[0][0], self.cover)
+        self.assertTrue(recorder.states[0][1].is_moving)
+        self.assertFalse(recorder.states[1][1].is_moving)
+
+    async def test_log_disabled(self):
+        logger = logging.getLogger("nicett6.cover")
+        level = logger.level
+        logger.setLevel(logging.INFO)
+        self.addCleanup(logger.setLevel, level)
+        with patch.object(logger, "_log") as mock_log:
+            self.cover.log("Test", logging.DEBUG)
+            mock_log.assert_not_called()
+            self.cover.log("Test", logging.INFO)
+            mock_log.assert_called_once()
+
+
+class TestMotionModel(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.sleeper = MockSleepInstant()
+        pc_patcher = patch("nicett6.cover.perf_counter", self.sleeper.perf_counter)
+        pc_patcher.start()
+        self.addCleanup(pc_patcher.stop)
+        self.cover = Cover("Test", 2.0)
+
+    async def asyncTearDown(self):
+        await self.cover.stop_notifier()
+
+    async def move(self, pos: int, secs: float = 1.0) -> None:
+        self.sleeper.offset += secs
+        await self.cover.set_pos(pos)
+
+    async def test_idle(self):
+        self.assertEqual(self.cover.estimated_pos, 1000)
+        self.assertAlmostEqual(self.cover.estimated_drop, 0.0)
+        self.assertIsNone(self.cover.speed)
+        self.assertIsNone(self.cover.eta)
+
+    async def test_speed_unknown(self):
+        await self.cover.set_target_pos_hint(0)
+        self.assertEqual(self.cover.target_pos, 0)
+        self.sleeper.offset += 0.5
+        self.assertEqual(self.cover.estimated_pos, 1000)
+        self.assertIsNone(self.cover.eta)
+
+    async def test_estimate(self):
+        await self.cover.set_target_pos_hint(0)
+        await self.move(900)
+        await self.move(800)
+        self.assertAlmostEqual(self.cover.speed, 100.0)
+        self.sleeper.offset += 0.5
+        self.assertAlmostEqual(self.cover.estimated_pos, 750.0)
+        self.assertAlmostEqual(self.cover.estimated_drop, 0.5)
+        self.assertAlmostEqual(self.cover.eta, 7.5)
+        # Never overshoots the target
+        await self.move(100)
+        self.sleeper.offset += 2.0
+        self.assertEqual(self.cover.estimated_pos, 0)
+        self.assertAlmostEqual(self.cover.eta, 0.0)
+
+    async def test_smoothing(self):
+        await self.move(900)
+        await self.move(800)
+        await self.move(600)
+        expected = 100.0 + Cover.SPEED_SMOOTHING * (200.0 - 100.0)
+        self.assertAlmostEqual(self.cover.speed, expected)
+
+    async def test_direction_without_target(self):
+        await self.move(900)
+        await self.move(800)
+        self.assertIsNone(self.cover.target_pos)
+        self.assertIsNone(self.cover.eta)
+        self.sleeper.offset += 0.25
+        self.assertAlmostEqual(self.cover.estimated_pos, 775.0)
+
+    async def test_stopped(self):
+        await self.cover.set_target_pos_hint(1000)
+        self.assertIsNone(self.cover.target_pos)  # Already there
+        await self.cover.set_going_down()
+        self.assertEqual(self.cover.target_pos, 0)
+        await self.move(900)
+        await self.move(800)
+        await self.cover.set_idle()
+        self.assertIsNone(self.cover.target_pos)
+        self.sleeper.offset += 0.5
+        self.assertEqual(self.cover.estimated_pos, 800)
+        self.assertAlmostEqual(self.cover.speed, 100.0)
+
+    async def test_extrapolation_capped(self):
+        await self.move(900)
+        await self.move(800)
+        self.sleeper.offset += 2.0
+        self.assertTrue(self.cover.is_moving)
+        self.assertAlmostEqual(
+            self.cover.estimated_pos, 800 - 100.0 * Cover.MAX_EXTRAPOLATION_INTERVAL
+        )
+
+    async def test_stopping(self):
+        await self.cover.set_target_pos_hint(0)
+        await self.move(900)
+        await self.move(800)
+        await self.cover.set_stopping()
+        self.assertIsNone(self.cover.target_pos)
+        self.assertTrue(self.cover.is_moving)
+        self.sleeper.offset += 0.5
+        self.assertEqual(self.cover.estimated_pos, 800)
+        await self.move(790)  # Final POS after the stop
+        self.sleeper.offset += 0.5
+        self.assertEqual(self.cover.estimated_pos, 790)
+        await self.cover.set_target_pos_hint(0)
+        self.sleeper.offset += 0.5
+        self.assertLess(self.cover.estimated_pos, 790)
+
+    async def test_speed_not_learned_from_start_up_lag(self):
+        await self.cover.set_target_pos_hint(0)
+        await self.move(950, secs=2.0)  # Includes the start-up lag
+        self.assertIsNone(self.cover.speed)
+        await self.move(850)
+        self.assertAlmostEqual(self.cover.speed, 100.0)
+
+    async def test_speed_not_learned_from_rest(self):
+        await self.move(900)
+        await self.move(800, secs=10.0)
+        self.assertIsNone(self.cover.speed)
+
+
 class TestCoverNotifer(IsolatedAsyncioTestCase):
     async def test1(self):
         """Test the notifier"""
 
         sleeper = MockSleepInstant()
         manual_sleeper = MockSleepManual()
-        with patch("nicett6.cover.asyncio_sleep", sleeper.sleep) as mock_sleep, patch(
-            "nicett6.cover.perf_counter", sleeper.perf_counter
-        ), patch("nicett6.cover.notifier_asyncio_sleep", manual_sleeper.sleep):
+        mock_sleep = sleeper.sleep
+        with patch("nicett6.cover.perf_counter", sleeper.perf_counter), patch(
+            "nicett6.cover.notifier_asyncio_sleep", manual_sleeper.sleep
+        ):
             cover = Cover("Test", 0.8)
 
             self.assertTrue(cover.is_fully_up)
             self.assertFalse(cover.is_moving)
             self.assertFalse(cover.is_going_down)
             self.assertFalse(cover.is_going_up)
-            self.assertIsNone(cover._notifier._task)
+            self.assertFalse(cover._notifier.is_pending)
 
-            # moved() should start task; we also know direction immediately
+            # moved() should schedule set_idle; we also know direction immediately
             await cover.set_pos(800)
             self.assertEqual(cover._prev_pos, 1000)
             self.assertFalse(cover.is_fully_up)
             self.assertTrue(cover.is_moving)
             self.assertTrue(cover.is_going_down)
             self.assertFalse(cover.is_going_up)
-            self.assertIsNotNone(cover._notifier._task)
-            if cover._notifier._task is not None:
-                self.assertFalse(cover._notifier._task.done())
+            self.assertTrue(cover._notifier.is_pending)
 
-            # wait for motion to to complete but task still running
+            # wait for motion to to complete but set_idle still pending
             await mock_sleep(Cover.MOVEMENT_THRESHOLD_INTERVAL + 0.01)
             self.assertEqual(cover._prev_pos, 1000)  # set_idle() not called yet
             self.assertFalse(cover.is_fully_up)
             self.assertFalse(cover.is_moving)
             self.assertFalse(cover.is_going_down)
             self.assertFalse(cover.is_going_up)
-            self.assertIsNotNone(cover._notifier._task)
-            if cover._notifier._task is not None:
-                self.assertFalse(cover._notifier._task.done())
+            self.assertTrue(cover._notifier.is_pending)
 
-            # tell notifier sleep to complete so that task completes
+            # tell notifier sleep to complete so that set_idle is called
             await mock_sleep(PostMovementNotifier.POST_MOVEMENT_ALLOWANCE + 0.02)
             await manual_sleeper.wake()
             await cover.idle_event.wait()
@@ -282,11 +480,9 @@ class TestCoverNotifer(IsolatedAsyncioTestCase):
             self.assertFalse(cover.is_moving)
             self.assertFalse(cover.is_going_down)
             self.assertFalse(cover.is_going_up)
-            self.assertIsNotNone(cover._notifier._task)
-            if cover._notifier._task is not None:
-                self.assertTrue(cover._notifier._task.done())
+            self.assertFalse(cover._notifier.is_pending)
 
-            # Flag that we are moving - however, we don't know the direction yet (restarts background task)
+            # Flag that we are moving - however, we don't know the direction yet (schedules set_idle again)
             await cover.moved()
             self.assertEqual(cover._prev_pos, 800)
             self.assertFalse(cover.is_fully_up)
@@ -294,26 +490,215 @@ class TestCoverNotifer(IsolatedAsyncioTestCase):
             self.assertFalse(cover.is_going_down)
             self.assertFalse(cover.is_going_up)
 
-            self.assertIsNotNone(cover._notifier._task)
-            if cover._notifier._task is not None:
-                self.assertFalse(cover._notifier._task.done())
+            self.assertTrue(cover._notifier.is_pending)
             await cover.stop_notifier()
-            self.assertIsNotNone(cover._notifier._task)
-            if cover._notifier._task is not None:
-                self.assertTrue(cover._notifier._task.done())
+            self.assertFalse(cover._notifier.is_pending)
+
+
+class TestIdleScheduler(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.sleeper = MockSleepInstant()
+        pc_patcher = patch("nicett6.cover.perf_counter", self.sleeper.perf_counter)
+        pc_patcher.start()
+        self.addCleanup(pc_patcher.stop)
+        sleep_patcher = patch(
+            "nicett6.cover.notifier_asyncio_sleep", self.sleeper.sleep
+        )
+        sleep_patcher.start()
+        self.addCleanup(sleep_patcher.stop)
+        self.scheduler = IdleScheduler()
+        self.addCleanup(self.scheduler.stop)
+
+    def make_cover(self, name: str) -> Cover:
+        cover = Cover(name, 0.8)
+        cover.set_idle_scheduler(self.scheduler)
+        return cover
+
+    async def test_shared_task(self):
+        covers = [self.make_cover(f"Test{i}") for i in range(3)]
+        await covers[0].set_pos(800)
+        task = self.scheduler._task
+        self.assertIsNotNone(task)
+        for cover in covers:
+            await cover.set_pos(500)
+            await cover.set_pos(400)
+        self.assertIs(self.scheduler._task, task)
+        self.assertEqual(len(self.scheduler), 3)
+        self.assertEqual(len(self.scheduler._heap), 3)
+        await wait_for_motion_to_complete(covers)
+        self.assertEqual(len(self.scheduler), 0)
+        for cover in covers:
+            self.assertEqual(cover._prev_pos, 400)
+
+    async def test_deadline_pushed_back(self):
+        cover = self.make_cover("Test")
+        await cover.set_pos(800)
+        first_deadline = self.scheduler.deadline(cover)
+        await self.sleeper.sleep(1.0)
+        await cover.set_pos(700)
+        second_deadline = self.scheduler.deadline(cover)
+        assert first_deadline is not None and second_deadline is not None
+        self.assertGreater(second_deadline, first_deadline)
+        await cover.wait_idle()
+        self.assertGreaterEqual(self.sleeper.perf_counter(), second_deadline)
+
+    async def test_earlier_deadline(self):
+        manual_sleeper = MockSleepManual()
+        slow = self.make_cover("Slow")
+        fast = self.make_cover("Fast")
+        with patch("nicett6.cover.notifier_asyncio_sleep", manual_sleeper.sleep):
+            await slow.moved()
+            self.scheduler.schedule(slow, 10.0)
+            await asyncio_sleep(0)
+            slow_task = self.scheduler._task
+            await fast.moved()
+            self.scheduler.schedule(fast, 1.0)
+            self.assertIsNot(self.scheduler._task, slow_task)
+            await self.sleeper.sleep(1.0)
+            await manual_sleeper.wake()
+            await fast.wait_idle()
+            self.assertNotIn(fast, self.scheduler)
+            self.assertIn(slow, self.scheduler)
+            self.assertFalse(slow.idle_event.is_set())
+            assert slow_task is not None
+            self.assertTrue(slow_task.cancelled())
+
+    async def test_cancel(self):
+        covers = [self.make_cover(f"Test{i}") for i in range(2)]
+        for cover in covers:
+            await cover.set_pos(800)
+        await covers[0].stop_notifier()
+        self.assertNotIn(covers[0], self.scheduler)
+        self.assertIsNotNone(self.scheduler._task)
+        await covers[1].stop_notifier()
+        self.assertIsNone(self.scheduler._task)
+
+    async def test_observer_error(self):
+        class FailingObserver:
+            async def update(self, observable):
+                if observable.idle_event.is_set():
+                    raise ValueError("Bang")
+
+        covers = [self.make_cover(f"Test{i}") for i in range(2)]
+        covers[0].attach(FailingObserver())
+        for cover in covers:
+            await cover.set_pos(800)
+        with self.assertLogs("nicett6.cover", level="ERROR"):
+            await covers[1].wait_idle()
+        self.assertTrue(covers[0].idle_event.is_set())
+
+    async def test_throttled_observer_sees_idle(self):
+        class IdleRecorder:
+            def __init__(self):
+                self.states = []
+
+            async def update(self, observable):
+                self.states.append(observable.idle_event.is_set())
+
+        cover = self.make_cover("Test")
+        recorder = IdleRecorder()
+        cover.attach(recorder, min_interval=0.01)
+        for pos in range(900, 500, -50):
+            await cover.set_pos(pos)
+        await cover.wait_idle()
+        await cover.flush_observers()
+        self.assertEqual(recorder.states, [False, True])
+
+    async def test_move_to_new_scheduler(self):
+        cover = Cover("Test", 0.8)
+        await cover.set_pos(800)
+        deadline = cover._notifier.scheduler.deadline(cover)
+        prev_scheduler = cover._notifier.scheduler
+        cover.set_idle_scheduler(self.scheduler)
+        self.assertNotIn(cover, prev_scheduler)
+        self.assertFalse(cover.idle_event.is_set())
+        self.assertEqual(self.scheduler.deadline(cover), deadline)
+        await cover.wait_idle()
 
 
 class TestWaitForMotionToComplete(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.sleeper = MockSleepInstant()
+        pc_patcher = patch("nicett6.cover.perf_counter", self.sleeper.perf_counter)
+        pc_patcher.start()
+        self.addCleanup(pc_patcher.stop)
+
     async def test_wait_for_motion_to_complete(self):
-        sleeper = MockSleepInstant()
-        with patch("nicett6.cover.asyncio_sleep", sleeper.sleep), patch(
-            "nicett6.cover.perf_counter", sleeper.perf_counter
-        ):
+        with patch("nicett6.cover.notifier_asyncio_sleep", self.sleeper.sleep):
             cover = Cover("Test", 0.8)
             self.assertFalse(cover.is_moving)
             await cover.moved()
             self.assertTrue(cover.is_moving)
-            self.assertAlmostEqual(sleeper.offset, 0.0)
-            await wait_for_motion_to_complete([cover])
-            self.assertAlmostEqual(sleeper.offset, 2.8)
+            self.assertAlmostEqual(self.sleeper.offset, 0.0)
+            result = await wait_for_motion_to_complete([cover])
+            self.assertAlmostEqual(self.sleeper.offset, 2.75)
             self.assertFalse(cover.is_moving)
+            self.assertEqual(result, {cover: True})
+
+    async def test_already_idle(self):
+        cover = Cover("Test", 0.8)
+        self.assertEqual(await wait_for_motion_to_complete([cover]), {cover: True})
+
+    async def test_moving_again(self):
+        manual_sleeper = MockSleepManual()
+        with patch("nicett6.cover.notifier_asyncio_sleep", manual_sleeper.sleep):
+            cover1 = Cover("Test1", 0.8)
+            cover2 = Cover("Test2", 0.8)
+            await cover1.moved()
+            await cover2.moved()
+            task = create_task(wait_for_motion_to_complete([cover1, cover2]))
+            await asyncio_sleep(0)
+            await cover2.set_idle()
+            await cover2.moved()  # Starts moving again before cover1 is idle
+            await cover1.set_idle()
+            await asyncio_sleep(0)
+            self.assertFalse(task.done())
+            await cover2.set_idle()
+            self.assertEqual(await task, {cover1: True, cover2: True})
+            await cover1.stop_notifier()
+            await cover2.stop_notifier()
+
+    async def test_timeout(self):
+        manual_sleeper = MockSleepManual()
+        with patch("nicett6.cover.notifier_asyncio_sleep", manual_sleeper.sleep):
+            cover1 = Cover("Test1", 0.8)
+            cover2 = Cover("Test2", 0.8)
+            await cover1.moved()
+            result = await wait_for_motion_to_complete([cover1, cover2], 0.01)
+            self.assertEqual(result, {cover1: False, cover2: True})
+            await cover1.stop_notifier()
+
+    async def test_stop_notifier_releases_waiters(self):
+        manual_sleeper = MockSleepManual()
+        with patch("nicett6.cover.notifier_asyncio_sleep", manual_sleeper.sleep):
+            cover = Cover("Test", 0.8)
+            await cover.set_pos(500)
+            task = create_task(wait_for_motion_to_complete([cover]))
+            await asyncio_sleep(0)
+            self.assertFalse(task.done())
+            await cover.stop_notifier()
+            result = await wait_for(task, 1.0)
+            self.assertEqual(result, {cover: False})
+            self.assertTrue(cover.state.is_moving)
+            # A later movement and set_idle completes normally
+            await cover.set_pos(400)
+            task = create_task(wait_for_motion_to_complete([cover]))
+            await asyncio_sleep(0)
+            await cover.set_idle()
+            self.assertEqual(await wait_for(task, 1.0), {cover: True})
+            await cover.stop_notifier()
+
+    async def test_scheduler_stop_releases_waiters(self):
+        manual_sleeper = MockSleepManual()
+        with patch("nicett6.cover.notifier_asyncio_sleep", manual_sleeper.sleep):
+            scheduler = IdleScheduler()
+            covers = [Cover(f"Test{i}", 0.8) for i in range(2)]
+            for cover in covers:
+                cover.set_idle_scheduler(scheduler)
+                await cover.set_pos(500)
+            task = create_task(wait_for_motion_to_complete(covers))
+            await asyncio_sleep(0)
+            scheduler.stop()
+            result = await wait_for(task, 1.0)
+            self.assertEqual(result, {cover: False for cover in covers})
+            self.assertEqual(len(scheduler), 0)
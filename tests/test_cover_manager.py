@@ -2,6 +2,7 @@ from logging import WARNING
 from unittest import IsolatedAsyncioTestCase
 from unittest.mock import AsyncMock, MagicMock, patch
 
+from nicett6.calibration import CalibrationStore, SpeedProfile
 from nicett6.cover import Cover
 from nicett6.cover_manager import CoverManager
 from nicett6.decode import PctPosResponse
@@ -94,12 +95,44 @@ class TestCoverManagerMessageTracker(IsolatedAsyncioTestCase):
         msg = PctPosResponse(tt_addr, 250)
         mgr = CoverManager("DUMMY_SERIAL_PORT")
         mgr._message_tracker_reader = MagicMock()
-        mgr._message_tracker_reader.__aiter__.return_value = [msg]
+        mgr._message_tracker_reader.batches.return_value.__aiter__.return_value = [
+            [msg]
+        ]
         mgr._writer = AsyncMock()
         with patch("nicett6.cover_manager.TT6Cover", new=AsyncMock) as tt6_cover:
             tt6_cover.send_pos_request = AsyncMock()
             tt6_cover.handle_response_message = AsyncMock()
             mock_cover = AsyncMock()
+            mock_cover.set_idle_scheduler = MagicMock()
             await mgr.add_cover(tt_addr, mock_cover)
             await mgr.message_tracker()
             tt6_cover.handle_response_message.assert_awaited_once_with(msg)
+
+
+class TestCoverManagerCalibration(IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.conn = make_mock_conn(TEST_READER_POS_RESPONSE)
+        patcher = patch(
+            "nicett6.cover_manager.open_tt6",
+            return_value=self.conn,
+        )
+        self.addCleanup(patcher.stop)
+        patcher.start()
+        self.tt_addr = TTBusDeviceAddress(0x02, 0x04)
+
+    async def test1(self):
+        calibration = CalibrationStore()
+        calibration.profiles[self.tt_addr.id] = SpeedProfile(100.0, 100.0)
+        cover = Cover("Cover", 2.0)
+        async with CoverManager("DUMMY_SERIAL_PORT", calibration) as mgr:
+            self.assertIs(mgr.calibration, calibration)
+            await mgr.add_cover(self.tt_addr, cover)
+            self.assertAlmostEqual(cover.speed, 100.0)
+            self.assertEqual(len(cover.observers), 1)
+
+    async def test_save_on_close(self):
+        calibration = CalibrationStore("DUMMY_PATH")
+        with patch.object(calibration, "save") as save:
+            async with CoverManager("DUMMY_SERIAL_PORT", calibration):
+                save.assert_not_called()
+            save.assert_called_once_with()
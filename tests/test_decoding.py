@@ -1,4 +1,5 @@
 import unittest
+from unittest.mock import patch
 
 from nicett6.command_code import CommandCode
 from nicett6.decode import (
@@ -111,6 +112,117 @@ class TestDecoding(unittest.TestCase):
                 res.error, "POS ! FF FF FFFF FFFF FF 01" + self.TEST_EOL.decode("utf-8")
             )
 
+    def test_responses_are_slotted(self):
+        res = Decode.decode_line_bytes(b"POS * 03 04 0500 FFFF FF" + self.TEST_EOL)
+        with self.assertRaises(AttributeError):
+            res.extra = 600  # type: ignore[attr-defined]
+        self.assertFalse(hasattr(res, "__dict__"))
+        self.assertEqual(
+            repr(res), "PctPosResponse(TTBusDeviceAddress(0x03, 0x04), 500)"
+        )
+
+    def test_decode_many(self):
+        lines = [
+            b"RSP 3 4 11" + self.TEST_EOL,
+            b"POS * 03 04 0500 FFFF FF" + self.TEST_EOL,
+            b"WEB COMMANDS ON" + self.TEST_EOL,
+        ]
+        self.assertEqual(
+            Decode.decode_many(lines),
+            [Decode.decode_line_bytes(line) for line in lines],
+        )
+
+    def test_decode_many_error(self):
+        with self.assertRaises(InvalidResponseError):
+            Decode.decode_many(
+                [
+                    b"RSP 3 4 11" + self.TEST_EOL,
+                    b"POS x 03 04 0500 FFFF FF" + self.TEST_EOL,
+                ]
+            )
+
+
+class TestDecodingConformance(unittest.TestCase):
+    """The fast path must produce the same results as the reference decoder"""
+
+    LINES = [
+        b"RSP 3 4 11\r",
+        b"RSP 03 04 11\r",
+        b"RSP 3 4 40 7E\r",
+        b"RSP 3 4 45 7e\r",
+        b"RSP a 4 3\r",
+        b"\nRSP 2 4 5\r",
+        b"RSP 3 4 4 7E\r",
+        b"RSP 3 4 FE\r",
+        b"RSP 113 4 11\r",
+        b"RSP 3 4\r",
+        b"RSP  3 4 11\r",
+        b"RSP 3 4 11\r\r",
+        b"RSP 3 4 11",
+        b"POS * 03 04 0500 FFFF FF\r",
+        b"\nPOS * 03 04 0500 FFFF FF\r",
+        b"POS # 03 04 0500 FFFF FF\r",
+        b"POS # A 04 1000 FFFF FF\r",
+        b"POS * 03 04 1001 FFFF FF\r",
+        b"POS * 03 4 0500 FFFF FF\r",
+        b"POS * 03 04 500 FFFF FF\r",
+        b"POS * 03 04 0500 FFFF FE\r",
+        b"POS * 03 04 0500 ffff FF\r",
+        b"POS x 03 04 0500 FFFF FF\r",
+        b"POS ! FF FF FFFF FFFF FF 01\r",
+        b"WEB COMMANDS ON\r",
+        b"ERROR - NOT INVALID COMMAND\r",
+        b"\r",
+        b"\n\r",
+        b"GARBAGE\r",
+    ]
+
+    def test_conformance(self):
+        # Run through twice as lines are decoded differently once an address is known
+        for line in self.LINES + self.LINES:
+            with self.subTest(line=line):
+                try:
+                    expected = Decode.decode_line_bytes_reference(line)
+                except Exception as e:
+                    with self.assertRaises(type(e)):
+                        Decode.decode_line_bytes(line)
+                else:
+                    actual = Decode.decode_line_bytes(line)
+                    self.assertIs(type(actual), type(expected))
+                    self.assertEqual(actual, expected)
+
+    def test_buffer_types(self):
+        for line in self.LINES[:2] + self.LINES[13:16]:
+            expected = Decode.decode_line_bytes_reference(line)
+            for buf in (bytearray(line), memoryview(line), memoryview(bytearray(line))):
+                with self.subTest(buf=buf):
+                    self.assertEqual(Decode.decode_line_bytes(buf), expected)
+
+    def test_repeated_line_is_new_message(self):
+        line = b"POS * 03 04 0600 FFFF FF\r"
+        res1 = Decode.decode_line_bytes(line)
+        res2 = Decode.decode_line_bytes(bytes(bytearray(line)))
+        self.assertEqual(res1, res2)
+        self.assertIsNot(res1, res2)
+
+    def test_line_table_is_bounded(self):
+        with patch("nicett6.decode._LINE_TABLE_MAX_SIZE", 0), patch.dict(
+            "nicett6.decode._LINE_TABLE", clear=True
+        ) as line_table:
+            res = Decode.decode_line_bytes(b"POS * 03 04 0700 FFFF FF\r")
+            self.assertEqual(res, PctPosResponse(TTBusDeviceAddress(3, 4), 700))
+            self.assertEqual(line_table, {})
+
+    def test_cache_clear(self):
+        line = b"POS * 03 04 0800 FFFF FF\r"
+        with patch.dict("nicett6.decode._LINE_TABLE") as line_table:
+            Decode.decode_line_bytes(line)
+            self.assertIn(line, line_table)
+            Decode.cache_clear()
+            self.assertEqual(line_table, {})
+        res = Decode.decode_line_bytes(line)
+        self.assertEqual(res, PctPosResponse(TTBusDeviceAddress(3, 4), 800))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -70,6 +70,26 @@ class TestEncoding(unittest.TestCase):
             b"POS < 03 04 FFFF FFFF FF" + self.TEST_EOL,
         )
 
+    def test_encode_cache(self):
+        Encode.cache_clear()
+        for _ in range(3):
+            self.assertEqual(
+                Encode.web_move_command(self.mask_motor, 600),
+                b"POS > 03 04 0600 FFFF FF" + self.TEST_EOL,
+            )
+        info = Encode.cache_info()["web_move_command"]
+        self.assertEqual(info.hits, 2)
+        self.assertEqual(info.misses, 1)
+        self.assertEqual(info.currsize, 1)
+        Encode.cache_clear()
+        self.assertEqual(Encode.cache_info()["web_move_command"].currsize, 0)
+
+    def test_encode_cache_logs_capped_pos(self):
+        Encode.web_move_command(self.mask_motor, 5000)
+        with self.assertLogs("nicett6.encode", level="INFO") as cm:
+            Encode.web_move_command(self.mask_motor, 5000)
+        self.assertEqual(len(cm.output), 1)
+
 
 if __name__ == "__main__":
     unittest.main()
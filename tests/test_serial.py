@@ -1,11 +1,20 @@
 import asyncio
+import gc
 from logging import WARNING
-from typing import List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 from unittest import IsolatedAsyncioTestCase
 from unittest.mock import AsyncMock, MagicMock, call, patch
 
 from nicett6.consts import RCV_EOL, SEND_EOL
-from nicett6.serial import SerialConnection, SerialProtocol, SerialReader, SerialWriter
+from nicett6.serial import (
+    ConflatingReader,
+    SerialConnection,
+    SerialProtocol,
+    OverflowPolicy,
+    SerialReader,
+    SerialWriter,
+    WritePacer,
+)
 
 
 class MessageAccumulator:
@@ -139,6 +148,61 @@ class TestReaderAndWriter(IsolatedAsyncioTestCase):
         messages1 = [msg async for msg in readers[1]]
         self.assertEqual(messages1, self.EXPECTED_MESSAGES12)
 
+    async def test_batch_delivered_once(self):
+        reader = self.conn.add_reader()
+        with patch.object(
+            reader, "messages_received", wraps=reader.messages_received
+        ) as mock_messages_received:
+            self.protocol.data_received(self.DATA_RECEIVED12)
+        mock_messages_received.assert_called_once_with(self.EXPECTED_MESSAGES12)
+        self.conn.close()
+        messages = [msg async for msg in reader]
+        self.assertEqual(messages, self.EXPECTED_MESSAGES12)
+
+    async def test_batch_decode_error(self):
+        def decoder(msg: bytes) -> bytes:
+            if msg.startswith(b"BAD"):
+                raise ValueError("Bad message")
+            return msg
+
+        self.conn._readers.decoder = decoder
+        reader = self.conn.add_reader()
+        with self.assertRaises(ValueError):
+            self.protocol.data_received(
+                b"TEST MESSAGE 1" + RCV_EOL + b"BAD" + RCV_EOL + b"TEST MESSAGE 2"
+            )
+        self.conn.close()
+        messages = [msg async for msg in reader]
+        self.assertEqual(messages, [b"TEST MESSAGE 1" + RCV_EOL])
+
+    async def test_block_producer(self):
+        reader = self.conn.add_reader(maxsize=4, overflow=OverflowPolicy.BLOCK_PRODUCER)
+        self.protocol.data_received(self.DATA_RECEIVED12)
+        self.mocktransport.pause_reading.assert_not_called()
+        self.protocol.data_received(self.DATA_RECEIVED56 + self.DATA_RECEIVED12)
+        self.mocktransport.pause_reading.assert_called_once_with()
+        self.assertEqual(len(reader.queue), 6)
+        self.assertEqual(reader.dropped, 0)
+        for _ in range(3):
+            await reader.__anext__()
+        self.mocktransport.resume_reading.assert_not_called()
+        await reader.__anext__()
+        self.mocktransport.resume_reading.assert_called_once_with()
+
+    async def test_block_producer_reader_removed(self):
+        reader = self.conn.add_reader(maxsize=1, overflow=OverflowPolicy.BLOCK_PRODUCER)
+        self.protocol.data_received(self.DATA_RECEIVED12)
+        self.mocktransport.pause_reading.assert_called_once_with()
+        self.conn.remove_reader(reader)
+        self.mocktransport.resume_reading.assert_called_once_with()
+
+    async def test_block_producer_reader_released(self):
+        reader = self.conn.add_reader(maxsize=1, overflow=OverflowPolicy.BLOCK_PRODUCER)
+        self.protocol.data_received(self.DATA_RECEIVED12)
+        self.mocktransport.pause_reading.assert_called_once_with()
+        del reader
+        self.mocktransport.resume_reading.assert_called_once_with()
+
     async def test_reconnect(self):
         msgs = MessageAccumulator()
         task = asyncio.create_task(msgs.accumulate(self.conn))
@@ -199,6 +263,112 @@ class TestReaderAndWriter(IsolatedAsyncioTestCase):
             ]
         )
 
+    async def test_write_nowait(self):
+        writer = self.conn.get_writer()
+        future1 = writer.write_nowait(self.TEST_MESSAGE + b"1")
+        future2 = writer.write_nowait(self.TEST_MESSAGE + b"2")
+        self.assertTrue(await future1)
+        self.mocktransport.write.assert_called_once_with(self.TEST_MESSAGE + b"1")
+        self.assertFalse(future2.done())  # Waiting for post_write_delay
+        self.assertTrue(await future2)
+        self.mocktransport.write.assert_called_with(self.TEST_MESSAGE + b"2")
+
+    async def test_write_withdrawn(self):
+        writer = self.conn.get_writer()
+        future1 = writer.write_nowait(self.TEST_MESSAGE + b"1")
+        future2 = writer.write_nowait(self.TEST_MESSAGE + b"2")
+        future3 = writer.write_nowait(self.TEST_MESSAGE + b"3")
+        future2.cancel()
+        self.assertTrue(await future1)
+        self.assertTrue(await future3)
+        self.assertEqual(
+            self.mocktransport.write.call_args_list,
+            [call(self.TEST_MESSAGE + b"1"), call(self.TEST_MESSAGE + b"3")],
+        )
+
+    async def test_write_coalesced(self):
+        writer = self.conn.get_writer()
+        future1 = writer.write_nowait(self.TEST_MESSAGE + b"1", "key")
+        future2 = writer.write_nowait(self.TEST_MESSAGE + b"2", "key")
+        future3 = writer.write_nowait(self.TEST_MESSAGE + b"3", "key")
+        self.assertTrue(await future1)
+        self.assertTrue(await future2)
+        self.assertTrue(await future3)
+        self.mocktransport.write.assert_called_once_with(self.TEST_MESSAGE + b"3")
+        self.assertEqual(self.conn.write_stats.written, 1)
+        self.assertEqual(self.conn.write_stats.coalesced, 2)
+
+    async def test_write_coalesced_after_written(self):
+        writer = self.conn.get_writer()
+        self.assertTrue(await writer.write_nowait(self.TEST_MESSAGE + b"1", "key"))
+        self.assertTrue(await writer.write_nowait(self.TEST_MESSAGE + b"2", "key"))
+        self.assertEqual(
+            self.mocktransport.write.call_args_list,
+            [call(self.TEST_MESSAGE + b"1"), call(self.TEST_MESSAGE + b"2")],
+        )
+        self.assertEqual(self.conn.write_stats.coalesced, 0)
+
+    async def test_write_coalesced_barrier(self):
+        writer = self.conn.get_writer()
+        writer.write_nowait(self.TEST_MESSAGE + b"1", "key")
+        writer.write_nowait(self.TEST_MESSAGE + b"2", "other")
+        writer.write_nowait(self.TEST_MESSAGE + b"3", "key")
+        writer.write_nowait(self.TEST_MESSAGE + b"4")
+        future = writer.write_nowait(self.TEST_MESSAGE + b"5", "key")
+        self.assertTrue(await future)
+        self.assertEqual(
+            self.mocktransport.write.call_args_list,
+            [
+                call(self.TEST_MESSAGE + b"3"),
+                call(self.TEST_MESSAGE + b"2"),
+                call(self.TEST_MESSAGE + b"4"),
+                call(self.TEST_MESSAGE + b"5"),
+            ],
+        )
+        self.assertEqual(self.conn.write_stats.written, 4)
+        self.assertEqual(self.conn.write_stats.coalesced, 1)
+
+    async def test_write_coalesced_withdrawn(self):
+        writer = self.conn.get_writer()
+        future1 = writer.write_nowait(self.TEST_MESSAGE + b"1", "key")
+        future2 = writer.write_nowait(self.TEST_MESSAGE + b"2", "key")
+        future1.cancel()
+        self.assertTrue(await future2)
+        self.mocktransport.write.assert_called_once_with(self.TEST_MESSAGE + b"2")
+
+    async def test_pacer(self):
+        pacer = MagicMock(spec=WritePacer)
+        pacer.post_write_delay = 0.01
+        conn = SerialConnection[bytes](
+            lambda x: x,
+            RCV_EOL,
+            SerialReader[bytes],
+            SerialWriter,
+            0.05,
+            pacer=pacer,
+        )
+        await conn.connect()
+        protocol = conn._protocol
+        assert protocol is not None
+        writer = conn.get_writer()
+        with patch("asyncio.sleep") as mock_sleep:
+            self.assertTrue(await writer.write_nowait(self.TEST_MESSAGE))
+        mock_sleep.assert_called_once_with(0.01)
+        pacer.message_written.assert_called_once_with(self.TEST_MESSAGE)
+        protocol.data_received(b"RESPONSE" + RCV_EOL)
+        pacer.messages_received.assert_called_once_with([b"RESPONSE" + RCV_EOL])
+        conn.close()
+
+    async def test_pending_writes_on_disconnect(self):
+        transport = self.mocktransport
+        writer = self.conn.get_writer()
+        future1 = writer.write_nowait(self.TEST_MESSAGE + b"1")
+        future2 = writer.write_nowait(self.TEST_MESSAGE + b"2")
+        self.assertTrue(await future1)
+        self.conn.disconnect()
+        self.assertFalse(await future2)
+        transport.write.assert_called_once_with(self.TEST_MESSAGE + b"1")
+
     async def test_disconnected_writer(self):
         self.conn.disconnect()
         writer = self.conn.get_writer()
@@ -211,6 +381,64 @@ class TestReaderAndWriter(IsolatedAsyncioTestCase):
             ],
         )
 
+    async def test_request(self):
+        request = b"REQUEST" + SEND_EOL
+        response = b"RESPONSE" + RCV_EOL
+        writer = self.conn.get_writer()
+        task = asyncio.create_task(writer.request(request, response))
+        await asyncio.sleep(0)
+        self.protocol.data_received(b"OTHER STUFF" + RCV_EOL + response)
+        self.assertEqual(await task, response)
+        self.mocktransport.write.assert_called_once_with(request)
+        self.assertEqual(self.conn._readers.requests.pending, {})
+
+    async def test_requests_overlap(self):
+        response1 = b"RESPONSE 1" + RCV_EOL
+        response2 = b"RESPONSE 2" + RCV_EOL
+        task1 = asyncio.create_task(self.conn.request(b"REQUEST 1", response1))
+        task2 = asyncio.create_task(self.conn.request(b"REQUEST 2", response2))
+        task3 = asyncio.create_task(self.conn.request(b"REQUEST 3", response1))
+        await asyncio.sleep(0)
+        self.protocol.data_received(response2)
+        self.assertEqual(await task2, response2)
+        self.assertFalse(task1.done())
+        self.protocol.data_received(response1)
+        self.assertEqual(await task1, response1)
+        self.assertEqual(await task3, response1)
+
+    async def test_request_timeout(self):
+        with self.assertRaises(asyncio.TimeoutError):
+            await self.conn.request(b"REQUEST", b"RESPONSE" + RCV_EOL, 0.1)
+        self.assertEqual(self.conn._readers.requests.pending, {})
+
+    async def test_request_closed(self):
+        task = asyncio.create_task(self.conn.request(b"REQUEST", b"RESPONSE"))
+        await asyncio.sleep(0)
+        self.conn.close()
+        with self.assertRaises(ConnectionError):
+            await task
+
+    async def test_request_closed_future_retrieved(self):
+        contexts: List[Dict[str, Any]] = []
+        loop = asyncio.get_running_loop()
+        loop.set_exception_handler(lambda loop, context: contexts.append(context))
+        self.addCleanup(loop.set_exception_handler, None)
+        task = asyncio.create_task(self.conn.request(b"REQUEST", b"RESPONSE"))
+        await asyncio.sleep(0)
+        self.conn.close()
+        with self.assertRaises(ConnectionError):
+            await task
+        del task
+        gc.collect()
+        self.assertEqual(contexts, [])
+
+    async def test_request_not_connected(self):
+        self.conn.disconnect()
+        with self.assertLogs("nicett6.serial", level=WARNING):
+            with self.assertRaises(ConnectionError):
+                await self.conn.request(b"REQUEST", b"RESPONSE")
+        self.assertEqual(self.conn._readers.requests.pending, {})
+
     async def test_process_request(self):
         dummy_request = b"DUMMY MESSAGE" + SEND_EOL
         data1 = b"RESPONSE" + RCV_EOL
@@ -226,3 +454,163 @@ class TestReaderAndWriter(IsolatedAsyncioTestCase):
         messages = await task
         self.mocktransport.write.assert_called_once_with(dummy_request)
         self.assertEqual(messages, [data1, data2, data3])
+
+
+class TestBoundedReader(IsolatedAsyncioTestCase):
+    MESSAGES = [b"A1", b"B1", b"A2", b"C1", b"A3", b"B2"]
+
+    @staticmethod
+    def first_letter(msg: bytes) -> Optional[bytes]:
+        return msg[:1] if msg != b"C1" else None
+
+    async def read_all(self, reader: SerialReader[bytes]) -> List[bytes]:
+        reader.stop()
+        return [msg async for msg in reader]
+
+    async def test_unbounded(self):
+        reader = SerialReader[bytes]()
+        reader.messages_received(self.MESSAGES)
+        self.assertEqual(reader.high_water_mark, 6)
+        self.assertEqual(await self.read_all(reader), self.MESSAGES)
+        self.assertEqual(reader.dropped, 0)
+
+    async def test_drop_oldest(self):
+        reader = SerialReader[bytes](4, OverflowPolicy.DROP_OLDEST)
+        reader.messages_received(self.MESSAGES[:3])
+        reader.messages_received(self.MESSAGES[3:])
+        self.assertEqual(await self.read_all(reader), self.MESSAGES[2:])
+        self.assertEqual(reader.dropped, 2)
+        self.assertEqual(reader.high_water_mark, 4)
+
+    async def test_drop_newest(self):
+        reader = SerialReader[bytes](4, OverflowPolicy.DROP_NEWEST)
+        reader.messages_received(self.MESSAGES[:3])
+        for msg in self.MESSAGES[3:]:
+            reader.message_received(msg)
+        self.assertEqual(await self.read_all(reader), self.MESSAGES[:4])
+        self.assertEqual(reader.dropped, 2)
+        self.assertEqual(reader.high_water_mark, 4)
+
+    async def test_keep_latest_per_key(self):
+        reader = SerialReader[bytes](
+            4, OverflowPolicy.KEEP_LATEST_PER_KEY, self.first_letter
+        )
+        reader.messages_received(self.MESSAGES)
+        self.assertEqual(await self.read_all(reader), [b"C1", b"A3", b"B2"])
+        self.assertEqual(reader.dropped, 3)
+
+    async def test_keep_latest_per_key_then_oldest(self):
+        reader = SerialReader[bytes](
+            2, OverflowPolicy.KEEP_LATEST_PER_KEY, self.first_letter
+        )
+        reader.messages_received(self.MESSAGES)
+        self.assertEqual(await self.read_all(reader), [b"A3", b"B2"])
+        self.assertEqual(reader.dropped, 4)
+
+    async def test_keep_latest_per_key_requires_key(self):
+        with self.assertRaises(ValueError):
+            SerialReader[bytes](2, OverflowPolicy.KEEP_LATEST_PER_KEY)
+
+
+class TestReaderBatches(IsolatedAsyncioTestCase):
+    async def test_batches(self):
+        reader = SerialReader[bytes]()
+        reader.messages_received([b"1", b"2"])
+        reader.message_received(b"3")
+        batches = reader.batches()
+        self.assertEqual(await batches.__anext__(), [b"1", b"2", b"3"])
+        task = asyncio.create_task(batches.__anext__())
+        await asyncio.sleep(0)
+        self.assertFalse(task.done())
+        reader.message_received(b"4")
+        self.assertEqual(await task, [b"4"])
+        reader.message_received(b"5")
+        reader.stop()
+        self.assertEqual([batch async for batch in batches], [[b"5"]])
+        with self.assertRaises(RuntimeError):
+            await reader.__anext__()
+
+    async def test_max_items(self):
+        reader = SerialReader[bytes]()
+        reader.messages_received([b"1", b"2", b"3"])
+        reader.stop()
+        batches = [batch async for batch in reader.batches(max_items=2)]
+        self.assertEqual(batches, [[b"1", b"2"], [b"3"]])
+
+    async def test_max_latency(self):
+        reader = SerialReader[bytes]()
+
+        async def produce():
+            for msg in (b"1", b"2", b"3"):
+                reader.message_received(msg)
+                await asyncio.sleep(0.01)
+
+        producer = asyncio.create_task(produce())
+        batches = reader.batches(max_latency=0.5)
+        self.assertEqual(await batches.__anext__(), [b"1", b"2", b"3"])
+        await producer
+
+    async def test_max_latency_max_items(self):
+        reader = SerialReader[bytes]()
+        reader.messages_received([b"1"])
+        batches = reader.batches(max_items=2, max_latency=10.0)
+        task = asyncio.create_task(batches.__anext__())
+        await asyncio.sleep(0)
+        reader.messages_received([b"2", b"3"])
+        self.assertEqual(await asyncio.wait_for(task, 1.0), [b"1", b"2"])
+
+    async def test_max_latency_timeout(self):
+        reader = SerialReader[bytes]()
+        reader.messages_received([b"1"])
+        batches = reader.batches(max_latency=0.01)
+        self.assertEqual(await batches.__anext__(), [b"1"])
+
+    async def test_conflating_batches(self):
+        reader = ConflatingReader[bytes](TestConflatingReader.position_key)
+        reader.messages_received([b"POS A 1", b"ACK 1", b"POS B 1", b"POS A 2"])
+        reader.stop()
+        batches = [batch async for batch in reader.batches(max_items=2)]
+        self.assertEqual(batches, [[b"ACK 1", b"POS A 2"], [b"POS B 1"]])
+
+    async def test_block_producer_batches(self):
+        reader = SerialReader[bytes](2, OverflowPolicy.BLOCK_PRODUCER)
+        flow_control = MagicMock()
+        reader.flow_control = flow_control
+        reader.messages_received([b"1", b"2", b"3"])
+        self.assertTrue(reader.is_blocking)
+        self.assertEqual(await reader.batches().__anext__(), [b"1", b"2", b"3"])
+        self.assertFalse(reader.is_blocking)
+        self.assertEqual(flow_control.call_count, 2)
+
+
+class TestConflatingReader(IsolatedAsyncioTestCase):
+    @staticmethod
+    def position_key(msg: bytes) -> Optional[bytes]:
+        return msg[4:5] if msg.startswith(b"POS ") else None
+
+    async def test_conflation(self):
+        reader = ConflatingReader[bytes](self.position_key)
+        reader.messages_received([b"POS A 1", b"ACK 1", b"POS B 1", b"POS A 2"])
+        reader.message_received(b"ERR 1")
+        reader.messages_received([b"POS B 2", b"POS A 3"])
+        reader.stop()
+        messages = [msg async for msg in reader]
+        self.assertEqual(messages, [b"ACK 1", b"ERR 1", b"POS A 3", b"POS B 2"])
+        self.assertEqual(reader.conflated, 3)
+
+    async def test_wakeup(self):
+        reader = ConflatingReader[bytes](self.position_key)
+        task = asyncio.create_task(reader.__anext__())
+        await asyncio.sleep(0)
+        self.assertFalse(task.done())
+        reader.messages_received([b"POS A 1", b"POS A 2"])
+        self.assertEqual(await task, b"POS A 2")
+        self.assertFalse(reader.has_messages())
+
+    async def test_bounded_lane(self):
+        reader = ConflatingReader[bytes](self.position_key, 1)
+        reader.messages_received([b"ACK 1", b"POS A 1", b"ACK 2"])
+        reader.stop()
+        messages = [msg async for msg in reader]
+        self.assertEqual(messages, [b"ACK 2", b"POS A 1"])
+        self.assertEqual(reader.dropped, 1)
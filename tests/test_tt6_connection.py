@@ -1,13 +1,27 @@
 import asyncio
 from typing import Tuple
-from unittest import IsolatedAsyncioTestCase
-from unittest.mock import AsyncMock, patch
+from unittest import IsolatedAsyncioTestCase, TestCase
+from unittest.mock import AsyncMock, call, patch
 
 from nicett6.command_code import CommandCode
 from nicett6.consts import RCV_EOL
-from nicett6.decode import AckResponse, ResponseMessageType
-from nicett6.serial import SerialProtocol
-from nicett6.tt6_connection import TT6Connection, TT6Writer, open_connection
+from nicett6.decode import (
+    AckResponse,
+    Decode,
+    ErrorResponse,
+    HexPosResponse,
+    PctAckResponse,
+    PctPosResponse,
+    ResponseMessageType,
+)
+from nicett6.serial import OverflowPolicy, ReaderFilter, SerialProtocol
+from nicett6.tt6_connection import (
+    TT6AdaptivePacer,
+    TT6ConflatingReader,
+    TT6Connection,
+    TT6Writer,
+    open_connection,
+)
 from nicett6.ttbus_device import TTBusDeviceAddress
 
 
@@ -58,6 +72,109 @@ class TestReaderAndWriter(IsolatedAsyncioTestCase):
             self.assertEqual(res.tt_addr, TTBusDeviceAddress(0x03, 0x04))
             self.assertEqual(res.cmd_code, CommandCode.MOVE_POS_6)
 
+    async def test_reader_keep_latest_position(self):
+        async with open_connection() as conn:
+            reader = conn.add_reader(
+                maxsize=2, overflow=OverflowPolicy.KEEP_LATEST_PER_KEY
+            )
+            self.get_protocol(conn).data_received(
+                b"POS * 02 04 0500 FFFF FF"
+                + RCV_EOL
+                + b"RSP 3 4 3"
+                + RCV_EOL
+                + b"POS * 02 04 0490 FFFF FF"
+                + RCV_EOL
+            )
+            conn.close()
+            messages = [msg async for msg in reader]
+            tt_addr = TTBusDeviceAddress(0x02, 0x04)
+            self.assertEqual(
+                messages,
+                [
+                    AckResponse(TTBusDeviceAddress(0x03, 0x04), CommandCode.STOP),
+                    PctPosResponse(tt_addr, 490),
+                ],
+            )
+            self.assertEqual(reader.dropped, 1)
+
+    async def test_filtered_readers(self):
+        tt_addr2 = TTBusDeviceAddress(0x02, 0x04)
+        tt_addr3 = TTBusDeviceAddress(0x03, 0x04)
+        async with open_connection() as conn:
+            reader_all = conn.add_reader()
+            reader2 = conn.add_reader(ReaderFilter(address=tt_addr2))
+            reader_pos3 = conn.add_reader(
+                ReaderFilter(types=(PctPosResponse,), address=tt_addr3)
+            )
+            reader_errors = conn.add_reader(ReaderFilter(types=(ErrorResponse,)))
+            self.get_protocol(conn).data_received(
+                b"POS * 02 04 0500 FFFF FF"
+                + RCV_EOL
+                + b"RSP 3 4 3"
+                + RCV_EOL
+                + b"POS * 03 04 0490 FFFF FF"
+                + RCV_EOL
+                + b"ERROR - NOT VALID COMMAND"
+                + RCV_EOL
+            )
+            conn.close()
+            pos2 = PctPosResponse(tt_addr2, 500)
+            ack3 = AckResponse(tt_addr3, CommandCode.STOP)
+            pos3 = PctPosResponse(tt_addr3, 490)
+            error = Decode.decode_line_bytes(b"ERROR - NOT VALID COMMAND" + RCV_EOL)
+            self.assertEqual(
+                [msg async for msg in reader_all], [pos2, ack3, pos3, error]
+            )
+            self.assertEqual([msg async for msg in reader2], [pos2])
+            self.assertEqual([msg async for msg in reader_pos3], [pos3])
+            self.assertEqual([msg async for msg in reader_errors], [error])
+
+    async def test_filtered_reader_added_later(self):
+        tt_addr = TTBusDeviceAddress(0x02, 0x04)
+        data = b"POS * 02 04 0500 FFFF FF" + RCV_EOL
+        async with open_connection() as conn:
+            reader1 = conn.add_reader(ReaderFilter(address=tt_addr))
+            self.get_protocol(conn).data_received(data)
+            reader2 = conn.add_reader(ReaderFilter(address=tt_addr))
+            self.get_protocol(conn).data_received(data)
+            del reader1
+            self.get_protocol(conn).data_received(data)
+            conn.close()
+            self.assertEqual(len([msg async for msg in reader2]), 2)
+
+    async def test_filtered_reader_removed(self):
+        tt_addr = TTBusDeviceAddress(0x02, 0x04)
+        async with open_connection() as conn:
+            reader = conn.add_reader(ReaderFilter(address=tt_addr))
+            conn.remove_reader(reader)
+            self.assertEqual(conn._readers._index, {})
+
+    async def test_conflating_reader(self):
+        tt_addr2 = TTBusDeviceAddress(0x02, 0x04)
+        tt_addr3 = TTBusDeviceAddress(0x03, 0x04)
+        async with open_connection() as conn:
+            reader = conn.add_reader(reader_factory=TT6ConflatingReader)
+            self.assertIsInstance(reader, TT6ConflatingReader)
+            self.get_protocol(conn).data_received(
+                b"POS * 02 04 0500 FFFF FF"
+                + RCV_EOL
+                + b"POS * 03 04 0800 FFFF FF"
+                + RCV_EOL
+                + b"RSP 3 4 3"
+                + RCV_EOL
+                + b"POS * 02 04 0490 FFFF FF"
+                + RCV_EOL
+            )
+            conn.close()
+            self.assertEqual(
+                [msg async for msg in reader],
+                [
+                    AckResponse(tt_addr3, CommandCode.STOP),
+                    PctPosResponse(tt_addr2, 490),
+                    PctPosResponse(tt_addr3, 800),
+                ],
+            )
+
     async def test_writer(self):
         async with open_connection() as conn:
             writer = conn.get_writer()
@@ -67,6 +184,207 @@ class TestReaderAndWriter(IsolatedAsyncioTestCase):
                 b"WEB_ON" + RCV_EOL
             )
 
+    async def test_writer_coalesces_moves(self):
+        tt_addr = TTBusDeviceAddress(0x02, 0x04)
+        async with open_connection() as conn:
+            writer = conn.get_writer()
+            assert isinstance(writer, TT6Writer)
+            await asyncio.gather(
+                writer.send_web_move_command(tt_addr, 100),
+                writer.send_web_pos_request(tt_addr),
+                writer.send_web_move_command(tt_addr, 200),
+                writer.send_web_pos_request(tt_addr),
+                writer.send_simple_command(tt_addr, "STOP"),
+                writer.send_web_move_command(tt_addr, 300),
+            )
+            self.assertEqual(
+                self.get_mocktransport(conn).write.call_args_list,
+                [
+                    call(b"POS > 02 04 0200 FFFF FF" + RCV_EOL),
+                    call(b"POS < 02 04 FFFF FFFF FF" + RCV_EOL),
+                    call(b"CMD 02 04 03" + RCV_EOL),
+                    call(b"POS > 02 04 0300 FFFF FF" + RCV_EOL),
+                ],
+            )
+            self.assertEqual(conn.write_stats.coalesced, 2)
+
+    async def test_request_web_pos(self):
+        tt_addr1 = TTBusDeviceAddress(0x02, 0x04)
+        tt_addr2 = TTBusDeviceAddress(0x03, 0x04)
+        async with open_connection() as conn:
+            writer = conn.get_writer()
+            assert isinstance(writer, TT6Writer)
+            task1 = asyncio.create_task(writer.request_web_pos(tt_addr1))
+            task2 = asyncio.create_task(writer.request_hex_pos(tt_addr2))
+            await asyncio.sleep(0.1)
+            self.get_protocol(conn).data_received(
+                b"POS # 02 04 0500 FFFF FF"
+                + RCV_EOL
+                + b"RSP 3 4 45 A0"
+                + RCV_EOL
+                + b"POS * 02 04 0250 FFFF FF"
+                + RCV_EOL
+            )
+            self.assertEqual(await task1, PctPosResponse(tt_addr1, 250))
+            self.assertEqual(
+                await task2, HexPosResponse(tt_addr2, CommandCode.READ_POS, 0xA0)
+            )
+
+    async def test_request_simple_command(self):
+        tt_addr = TTBusDeviceAddress(0x02, 0x04)
+        async with open_connection() as conn:
+            writer = conn.get_writer()
+            assert isinstance(writer, TT6Writer)
+            task = asyncio.create_task(writer.request_simple_command(tt_addr, "STOP"))
+            await asyncio.sleep(0)
+            self.get_protocol(conn).data_received(
+                b"RSP 2 4 4" + RCV_EOL + b"RSP 2 4 3" + RCV_EOL
+            )
+            self.assertEqual(await task, AckResponse(tt_addr, CommandCode.STOP))
+
+    async def test_adaptive_pacing(self):
+        async with open_connection(adaptive_pacing=True) as conn:
+            self.assertIsInstance(conn.pacer, TT6AdaptivePacer)
+        async with open_connection() as conn:
+            self.assertNotIsInstance(conn.pacer, TT6AdaptivePacer)
+            self.assertEqual(conn.pacer.post_write_delay, 0.05)
+
+
+class TestAdaptivePacer(TestCase):
+    TT_ADDR = TTBusDeviceAddress(0x02, 0x04)
+
+    def setUp(self):
+        patcher = patch("nicett6.tt6_connection.perf_counter")
+        self.addCleanup(patcher.stop)
+        self.mock_perf_counter = patcher.start()
+        self.pacer = TT6AdaptivePacer(0.05)
+
+    def round_trip(self, msg: bytes, ack: ResponseMessageType, rtt: float) -> None:
+        self.mock_perf_counter.return_value = 100.0
+        self.pacer.message_written(msg)
+        self.mock_perf_counter.return_value = 100.0 + rtt
+        self.pacer.messages_received([ack])
+
+    def test_initial_delay(self):
+        self.assertEqual(self.pacer.post_write_delay, 0.05)
+
+    def test_samples(self):
+        ack = AckResponse(self.TT_ADDR, CommandCode.STOP)
+        self.round_trip(b"CMD 02 04 03" + RCV_EOL, ack, 0.01)
+        self.assertAlmostEqual(self.pacer.srtt, 0.01)
+        self.assertAlmostEqual(self.pacer.post_write_delay, 0.03)
+        for _ in range(50):
+            self.round_trip(b"CMD 02 04 03" + RCV_EOL, ack, 0.01)
+        self.assertAlmostEqual(self.pacer.srtt, 0.01)
+        self.assertAlmostEqual(self.pacer.post_write_delay, 0.01, places=3)
+
+    def test_web_commands(self):
+        self.round_trip(
+            b"POS > 02 04 0500 FFFF FF" + RCV_EOL,
+            PctAckResponse(self.TT_ADDR, 500),
+            0.02,
+        )
+        self.round_trip(
+            b"POS < 02 04 FFFF FFFF FF" + RCV_EOL,
+            PctPosResponse(self.TT_ADDR, 500),
+            0.02,
+        )
+        self.assertAlmostEqual(self.pacer.srtt, 0.02)
+
+    def test_moving_cover_pos_stream(self):
+        pos_request = b"POS < 02 04 FFFF FFFF FF" + RCV_EOL
+        self.round_trip(pos_request, PctPosResponse(self.TT_ADDR, 500), 0.02)
+        self.assertAlmostEqual(self.pacer.srtt, 0.02)
+        # The cover moves and reports its position every 0.5s
+        # A POS < written just before each report must not be sampled
+        now = 100.0
+        for pos in range(490, 300, -10):
+            now += 0.5
+            self.mock_perf_counter.return_value = now - 0.001
+            self.pacer.message_written(pos_request)
+            self.mock_perf_counter.return_value = now
+            self.pacer.messages_received([PctPosResponse(self.TT_ADDR, pos)])
+        self.assertAlmostEqual(self.pacer.srtt, 0.02)
+        # Once the cover has been idle for a while the POS * is the ack again
+        self.mock_perf_counter.return_value = now + 10.0
+        self.pacer.message_written(pos_request)
+        self.mock_perf_counter.return_value = now + 10.01
+        self.pacer.messages_received([PctPosResponse(self.TT_ADDR, 300)])
+        self.assertLess(self.pacer.srtt, 0.02)
+
+    def test_commands_matched_by_code(self):
+        self.mock_perf_counter.return_value = 100.0
+        self.pacer.message_written(b"CMD 02 04 40 7E" + RCV_EOL)
+        self.mock_perf_counter.return_value = 100.3
+        self.pacer.message_written(b"CMD 02 04 03" + RCV_EOL)
+        self.mock_perf_counter.return_value = 100.31
+        self.pacer.messages_received(
+            [HexPosResponse(self.TT_ADDR, CommandCode.MOVE_POS, 0x7E)]
+        )
+        self.assertAlmostEqual(self.pacer.srtt, 0.31)
+        self.mock_perf_counter.return_value = 100.32
+        self.pacer.messages_received([AckResponse(self.TT_ADDR, CommandCode.STOP)])
+        self.assertEqual(self.pacer._written, {})
+
+    def test_repeated_command(self):
+        ack = AckResponse(self.TT_ADDR, CommandCode.STOP)
+        for now in (100.0, 100.02):
+            self.mock_perf_counter.return_value = now
+            self.pacer.message_written(b"CMD 02 04 03" + RCV_EOL)
+        self.mock_perf_counter.return_value = 100.03
+        self.pacer.messages_received([ack])
+        self.assertAlmostEqual(self.pacer.srtt, 0.03)
+        self.mock_perf_counter.return_value = 100.05
+        self.pacer.messages_received([ack])
+        self.assertAlmostEqual(self.pacer.srtt, 0.03)
+
+    def test_unacknowledged_writes_forgotten(self):
+        self.mock_perf_counter.return_value = 100.0
+        self.pacer.message_written(b"CMD 02 04 03" + RCV_EOL)
+        self.mock_perf_counter.return_value = 102.0
+        self.pacer.message_written(b"CMD 02 04 03" + RCV_EOL)
+        self.mock_perf_counter.return_value = 102.01
+        self.pacer.messages_received([AckResponse(self.TT_ADDR, CommandCode.STOP)])
+        self.assertAlmostEqual(self.pacer.srtt, 0.01)
+
+    def test_unmatched(self):
+        self.round_trip(
+            b"POS > 02 04 0500 FFFF FF" + RCV_EOL,
+            PctPosResponse(self.TT_ADDR, 500),
+            0.02,
+        )
+        self.round_trip(
+            b"CMD 03 04 03" + RCV_EOL,
+            AckResponse(self.TT_ADDR, CommandCode.STOP),
+            0.02,
+        )
+        self.round_trip(b"WEB_ON" + RCV_EOL, AckResponse(self.TT_ADDR, 3), 0.02)
+        self.assertIsNone(self.pacer.srtt)
+
+    def test_ack_timeout(self):
+        ack = AckResponse(self.TT_ADDR, CommandCode.STOP)
+        self.round_trip(b"CMD 02 04 03" + RCV_EOL, ack, 2.0)
+        self.assertIsNone(self.pacer.srtt)
+
+    def test_bounds(self):
+        ack = AckResponse(self.TT_ADDR, CommandCode.STOP)
+        self.round_trip(b"CMD 02 04 03" + RCV_EOL, ack, 0.0)
+        self.assertEqual(self.pacer.post_write_delay, self.pacer.min_delay)
+        self.round_trip(b"CMD 02 04 03" + RCV_EOL, ack, 0.9)
+        self.assertEqual(self.pacer.post_write_delay, self.pacer.max_delay)
+
+    def test_error_backoff(self):
+        ack = AckResponse(self.TT_ADDR, CommandCode.STOP)
+        self.round_trip(b"CMD 02 04 03" + RCV_EOL, ack, 0.01)
+        delay = self.pacer.post_write_delay
+        self.pacer.messages_received([ErrorResponse("ERROR - NOT VALID COMMAND")])
+        self.assertAlmostEqual(self.pacer.post_write_delay, delay * 2)
+        self.pacer.messages_received([ErrorResponse("ERROR - NOT VALID COMMAND")])
+        self.assertAlmostEqual(self.pacer.post_write_delay, delay * 4)
+        for _ in range(10):
+            self.round_trip(b"CMD 02 04 03" + RCV_EOL, ack, 0.01)
+        self.assertEqual(self.pacer.backoff, 1.0)
+
 
 class TestOpenConnection(IsolatedAsyncioTestCase):
     async def test1(self):
@@ -52,6 +52,12 @@ class TestHandleResponsesMessage(IsolatedAsyncioTestCase):
         )
         self.cover.moved.assert_awaited_once_with()
 
+    async def test8(self):
+        await self.tt6_cover.handle_response_message(
+            AckResponse(self.tt_addr, CommandCode.STOP)
+        )
+        self.cover.set_stopping.assert_awaited_once_with()
+
 
 class TestHandleSendingMessage(IsolatedAsyncioTestCase):
     async def asyncSetUp(self):
@@ -1,3 +1,5 @@
+import copy
+import pickle
 import unittest
 
 from nicett6.ttbus_device import TTBusDeviceAddress
@@ -27,3 +29,21 @@ class TestDevice(unittest.TestCase):
         self.assertIn(tt_addr2, s)
         s.add(tt_addr2)
         self.assertEqual(len(s), 1)
+
+    def test_interned(self):
+        self.assertIs(TTBusDeviceAddress(0x02, 0x04), TTBusDeviceAddress(0x02, 0x04))
+        self.assertIsNot(TTBusDeviceAddress(0x02, 0x04), TTBusDeviceAddress(0x03, 0x04))
+
+    def test_immutable(self):
+        tt_addr = TTBusDeviceAddress(0x02, 0x04)
+        with self.assertRaises(AttributeError):
+            tt_addr.address = 0x03  # type: ignore[misc]
+        with self.assertRaises(AttributeError):
+            tt_addr.other = 0x03  # type: ignore[attr-defined]
+        self.assertEqual(tt_addr.as_tuple, (0x02, 0x04))
+
+    def test_copy_and_pickle(self):
+        tt_addr = TTBusDeviceAddress(0x02, 0x04)
+        self.assertIs(copy.copy(tt_addr), tt_addr)
+        self.assertIs(copy.deepcopy(tt_addr), tt_addr)
+        self.assertIs(pickle.loads(pickle.dumps(tt_addr)), tt_addr)
@@ -1,6 +1,11 @@
+import asyncio
+from typing import List
 from unittest import IsolatedAsyncioTestCase, TestCase
 
 from nicett6.utils import (
+    AsyncObservable,
+    AsyncObserver,
+    NotificationMode,
     async_get_platform_serial_port,
     check_aspect_ratio,
     get_platform_serial_port,
@@ -59,3 +64,183 @@ class TestGetSerial(IsolatedAsyncioTestCase):
     async def test1(self):
         serial_port = await async_get_platform_serial_port()
         self.assertEqual(serial_port, self.serial_port)
+
+
+class RecordingObserver(AsyncObserver):
+    def __init__(self, name: str, log: List[str], delay: float = 0.0) -> None:
+        self.name = name
+        self.log = log
+        self.delay = delay
+
+    async def update(self, observable: AsyncObservable) -> None:
+        self.log.append(f"{self.name} start")
+        await asyncio.sleep(self.delay)
+        self.log.append(f"{self.name} end")
+
+
+class FailingObserver(AsyncObserver):
+    async def update(self, observable: AsyncObservable) -> None:
+        raise ValueError("Bang")
+
+
+class BlockingObserver(AsyncObserver):
+    def __init__(self) -> None:
+        self.release = asyncio.Event()
+        self.updates = 0
+
+    async def update(self, observable: AsyncObservable) -> None:
+        await self.release.wait()
+        self.updates += 1
+
+
+class TestAsyncObservable(IsolatedAsyncioTestCase):
+    async def test_sequential(self):
+        log: List[str] = []
+        observable = AsyncObservable()
+        observable.attach(RecordingObserver("a", log, 0.01))
+        observable.attach(RecordingObserver("b", log))
+        await observable.notify_observers()
+        self.assertEqual(log, ["a start", "a end", "b start", "b end"])
+
+    async def test_sequential_error(self):
+        observable = AsyncObservable()
+        observable.attach(FailingObserver())
+        with self.assertRaises(ValueError):
+            await observable.notify_observers()
+
+    async def test_concurrent(self):
+        log: List[str] = []
+        observable = AsyncObservable(NotificationMode.CONCURRENT)
+        observable.attach(RecordingObserver("a", log, 0.01))
+        observable.attach(RecordingObserver("b", log))
+        await observable.notify_observers()
+        self.assertEqual(log, ["a start", "b start", "b end", "a end"])
+
+    async def test_concurrent_isolation(self):
+        log: List[str] = []
+        observable = AsyncObservable(NotificationMode.CONCURRENT)
+        observable.attach(FailingObserver())
+        observable.attach(RecordingObserver("slow", log, 1.0), timeout=0.01)
+        observable.attach(RecordingObserver("b", log))
+        with self.assertLogs("nicett6.utils", level="ERROR") as cm:
+            await observable.notify_observers()
+        self.assertEqual(len(cm.output), 2)
+        self.assertCountEqual(log, ["slow start", "b start", "b end"])
+
+    async def test_background(self):
+        observer = BlockingObserver()
+        observable = AsyncObservable(NotificationMode.BACKGROUND)
+        observable.attach(observer, maxsize=2)
+        await observable.notify_observers()
+        await asyncio.sleep(0)
+        for _ in range(4):
+            await observable.notify_observers()
+        self.assertEqual(observer.updates, 0)
+        observer.release.set()
+        await observable.flush_observers()
+        # 1 update in progress + 2 queued; the rest are dropped
+        self.assertEqual(observer.updates, 3)
+        self.assertEqual(observable.observers[observer].dropped, 2)
+        observable.detach(observer)
+
+    async def test_background_isolation(self):
+        log: List[str] = []
+        observable = AsyncObservable(NotificationMode.BACKGROUND)
+        observable.attach(FailingObserver())
+        observable.attach(RecordingObserver("a", log))
+        with self.assertLogs("nicett6.utils", level="ERROR"):
+            await observable.notify_observers()
+            await observable.flush_observers()
+        self.assertEqual(log, ["a start", "a end"])
+        await observable.notify_observers()
+        await observable.flush_observers()
+        self.assertEqual(len(log), 4)
+        for observer in list(observable.observers):
+            observable.detach(observer)
+
+    async def test_detach_cancels(self):
+        observer = BlockingObserver()
+        observable = AsyncObservable(NotificationMode.BACKGROUND)
+        observable.attach(observer)
+        await observable.notify_observers()
+        task = observable.observers[observer].task
+        self.assertIsNotNone(task)
+        observable.detach(observer)
+        await asyncio.sleep(0)
+        assert task is not None
+        self.assertTrue(task.cancelled())
+
+
+class CountingObserver(AsyncObserver):
+    def __init__(self) -> None:
+        self.values: List[int] = []
+
+    async def update(self, observable: AsyncObservable) -> None:
+        self.values.append(observable.value)  # type: ignore[attr-defined]
+
+
+class ValueObservable(AsyncObservable):
+    def __init__(
+        self, notification_mode: NotificationMode = NotificationMode.SEQUENTIAL
+    ) -> None:
+        super().__init__(notification_mode)
+        self.value = 0
+
+    async def set_value(self, value: int) -> None:
+        self.value = value
+        await self.notify_observers()
+
+
+class TestThrottledObserver(IsolatedAsyncioTestCase):
+    async def check_throttled(self, mode: NotificationMode) -> None:
+        observable = ValueObservable(mode)
+        throttled = CountingObserver()
+        unthrottled = CountingObserver()
+        observable.attach(throttled, min_interval=0.05)
+        observable.attach(unthrottled)
+        for value in range(1, 21):
+            await observable.set_value(value)
+        await observable.flush_observers()
+        # Leading edge plus a single trailing update with the final value
+        self.assertEqual(len(throttled.values), 2)
+        self.assertEqual(throttled.values[-1], 20)
+        self.assertEqual(observable.observers[throttled].throttled, 19)
+        self.assertEqual(unthrottled.values[-1], 20)
+        if mode is not NotificationMode.BACKGROUND:
+            self.assertEqual(throttled.values, [1, 20])
+            self.assertEqual(unthrottled.values, list(range(1, 21)))
+        for observer in list(observable.observers):
+            observable.detach(observer)
+
+    async def test_sequential(self):
+        await self.check_throttled(NotificationMode.SEQUENTIAL)
+
+    async def test_concurrent(self):
+        await self.check_throttled(NotificationMode.CONCURRENT)
+
+    async def test_background(self):
+        await self.check_throttled(NotificationMode.BACKGROUND)
+
+    async def test_interval_elapsed(self):
+        observable = ValueObservable()
+        observer = CountingObserver()
+        observable.attach(observer, min_interval=0.01)
+        await observable.set_value(1)
+        await asyncio.sleep(0.02)
+        await observable.set_value(2)
+        self.assertEqual(observer.values, [1, 2])
+        self.assertIsNone(observable.observers[observer].trailing)
+
+    async def test_detach_cancels_trailing(self):
+        observable = ValueObservable()
+        observer = CountingObserver()
+        observable.attach(observer, min_interval=1.0)
+        await observable.set_value(1)
+        await observable.set_value(2)
+        trailing = observable.observers[observer].trailing
+        self.assertIsNotNone(trailing)
+        observable.detach(observer)
+        await asyncio.sleep(0)
+        assert trailing is not None
+        self.assertTrue(trailing.cancelled())
+        self.assertEqual(observer.values, [1])